@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import User, Product, Category, Transaction, TransactionItem
+from django.urls import reverse
+from .services import delete_transactions
+from .models import (
+    User, Product, Category, Transaction, TransactionItem, StockMovement, StockCheckpoint,
+    PeriodClose, ArchivedTransaction, ArchivedTransactionItem, ReportJob,
+    FiscalPeriod,
+)
 
 
 @admin.register(Category)
@@ -49,6 +55,10 @@ class TransactionAdmin(admin.ModelAdmin):
     ordering = ('-date',)
     inlines = [TransactionItemInline]
 
+    def delete_queryset(self, request, queryset):
+        # The bulk "delete selected" action must reverse stock and debt too
+        delete_transactions(queryset)
+
 
 @admin.register(TransactionItem)
 class TransactionItemAdmin(admin.ModelAdmin):
@@ -58,3 +68,111 @@ class TransactionItemAdmin(admin.ModelAdmin):
     list_filter = ('transaction__type',)
     search_fields = ('product__name',)
     ordering = ('-transaction__date',)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only admin for the append-only stock movement ledger."""
+    
+    list_display = ('id', 'product', 'quantity', 'reason', 'transaction', 'date')
+    list_filter = ('reason',)
+    search_fields = ('product__name',)
+    ordering = ('-date',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    """Admin configuration for StockCheckpoint model."""
+    
+    list_display = ('product', 'date', 'stock')
+    search_fields = ('product__name',)
+    ordering = ('-date',)
+
+
+@admin.register(PeriodClose)
+class PeriodCloseAdmin(admin.ModelAdmin):
+    """Read-only admin for closed periods."""
+    
+    list_display = ('cutoff', 'transactions', 'items', 'closed_at')
+    ordering = ('-cutoff',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedTransactionItemInline(admin.TabularInline):
+    """Inline admin for the items of an archived transaction."""
+    
+    model = ArchivedTransactionItem
+    extra = 0
+    can_delete = False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    """Read-only admin for archived transactions."""
+    
+    list_display = ('id', 'user', 'type', 'amount', 'date', 'period')
+    list_filter = ('type', 'period')
+    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    ordering = ('-date',)
+    inlines = [ArchivedTransactionItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """Admin for background reports; each row links to the stored report."""
+    
+    list_display = ('start_day', 'end_day', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+    readonly_fields = ('start_day', 'end_day', 'version', 'task_id', 'status', 'progress', 'error', 'created_at', 'finished_at')
+    exclude = ('result',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def view_on_site(self, obj):
+        return reverse('base:report_job', args=[obj.pk])
+
+
+@admin.register(FiscalPeriod)
+class FiscalPeriodAdmin(admin.ModelAdmin):
+    """Read-only admin for the fiscal calendar; rebuild it with the fiscal_calendar command."""
+    
+    list_display = ('__str__', 'start', 'end')
+    list_filter = ('year',)
+    ordering = ('-start',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
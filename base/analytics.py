@@ -0,0 +1,253 @@
+"""Period-over-period analytics and chart series computed on columnar frames.
+
+The rollup rows of all compared windows are read once per source, loaded
+into pandas frames, and every entity's period sums, growth rates and ranks
+are derived with vectorized group-bys instead of one query per entity and
+period.
+
+Chart series are gap-filled to one row per day and bucketed server-side,
+so the number of points sent to the browser is bounded whatever the range.
+"""
+
+import calendar
+import math
+
+import numpy as np
+import pandas as pd
+from django.db.models import Q
+
+from base.fiscal import periods_between
+from base.models import DailyProductRollup, DailyTransactionRollup, DailyUserRollup, Product, User
+from base.reporting import TYPES, cached_report
+
+PERIODS = ('current', 'previous', 'year_ago')
+
+# Bucket sizes of the chart series; 'month' follows the fiscal calendar
+RESOLUTIONS = ('day', 'week', 'month')
+
+# Default upper bound on the points of one series
+MAX_POINTS = 120
+
+
+def _shift_months(day, months, month_end=False):
+    """Move a date by whole months, clamping to the length of the target month."""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    last_day = calendar.monthrange(year, month + 1)[1]
+    return day.replace(year=year, month=month + 1, day=last_day if month_end else min(day.day, last_day))
+
+
+def comparison_windows(start_day, end_day):
+    """
+    Get the windows a report window is compared against.
+
+    'previous' is the same window moved back by the number of calendar
+    months it spans (this month vs last month, this quarter vs last
+    quarter); 'year_ago' is the same window one year earlier.
+
+    Returns:
+        Dict mapping each of PERIODS to a (start_day, end_day) tuple
+    """
+    months = (end_day.year - start_day.year) * 12 + end_day.month - start_day.month + 1
+    end_of_month = end_day.day == calendar.monthrange(end_day.year, end_day.month)[1]
+    return {
+        'current': (start_day, end_day),
+        'previous': (_shift_months(start_day, -months), _shift_months(end_day, -months, end_of_month)),
+        'year_ago': (_shift_months(start_day, -12), _shift_months(end_day, -12, end_of_month)),
+    }
+
+
+def _growth(current, base):
+    """Percentage change from base to current; NaN where base is zero."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(base != 0, (current - base) / np.abs(base) * 100, np.nan)
+
+
+def _compare(frame, windows, key):
+    """
+    Sum frame['value'] per key for every window, then add growth rates and ranks.
+
+    Returns:
+        DataFrame indexed by key, ordered by the current period's value
+    """
+    days = frame['day'].to_numpy()
+    sums = {}
+    for period, (start, end) in windows.items():
+        mask = (days >= np.datetime64(start)) & (days <= np.datetime64(end))
+        sums[period] = frame.loc[mask].groupby(key)['value'].sum()
+
+    table = pd.DataFrame(sums, columns=list(PERIODS)).fillna(0.0)
+    table['growth'] = _growth(table['current'].to_numpy(), table['previous'].to_numpy())
+    table['yoy'] = _growth(table['current'].to_numpy(), table['year_ago'].to_numpy())
+    table['rank'] = table['current'].rank(method='min', ascending=False).astype(int)
+    table['previous_rank'] = table['previous'].rank(method='min', ascending=False).astype(int)
+    return table.sort_values(['current', 'previous'], ascending=False)
+
+
+def _frame(rows, columns):
+    frame = pd.DataFrame.from_records(list(rows), columns=columns)
+    frame['day'] = pd.to_datetime(frame['day']).to_numpy(dtype='datetime64[D]')
+    frame['value'] = frame['value'].astype(float)
+    return frame
+
+
+def _records(table, names):
+    """Turn a comparison table into JSON-ready rows, skipping entities that no longer exist."""
+    table = table[table.index.isin(list(names))].round(2)
+    records = []
+    for key, row in zip(table.index.tolist(), table.to_dict('records')):
+        records.append({
+            'id': key,
+            'name': names[key],
+            **{period: row[period] for period in PERIODS},
+            'growth': None if np.isnan(row['growth']) else row['growth'],
+            'yoy': None if np.isnan(row['yoy']) else row['yoy'],
+            'rank': row['rank'],
+            'previous_rank': row['previous_rank'],
+        })
+    return records
+
+
+def period_comparison(start_day, end_day, versions=None):
+    """
+    Compare sales per product, category and merchant against the previous period and last year.
+
+    Product and category figures are item revenue from the product rollup,
+    merchant figures the amount taken from the partner rollup; each source
+    is read once for all three windows.
+
+    Args:
+        start_day: First local day of the current window
+        end_day: Last local day of the current window
+        versions: DataVersion.current() already read for this request, or None
+
+    Returns:
+        Dict with the 'windows' compared and 'products', 'categories' and
+        'merchants' lists holding, per entity, the value of each period,
+        growth and yoy percentages (None when the base is zero) and the
+        current and previous ranks, ordered by the current value
+    """
+    return cached_report(
+        'comparison', None, start_day, end_day, lambda: _period_comparison(start_day, end_day), versions
+    )
+
+
+def _period_comparison(start_day, end_day):
+    windows = comparison_windows(start_day, end_day)
+    in_windows = Q()
+    for start, end in windows.values():
+        in_windows |= Q(day__gte=start, day__lte=end)
+
+    products = _frame(
+        DailyProductRollup.objects.filter(in_windows, type='take').values_list('product_id', 'day', 'total'),
+        ['product_id', 'day', 'value'],
+    )
+    merchants = _frame(
+        DailyUserRollup.objects.filter(
+            in_windows, type='take', user__user_type='merchant'
+        ).values_list('user_id', 'day', 'amount'),
+        ['user_id', 'day', 'value'],
+    )
+
+    catalog = pd.DataFrame.from_records(
+        list(Product.objects.filter(pk__in=products['product_id'].unique().tolist()).values_list(
+            'pk', 'name', 'category_id', 'category__name'
+        )),
+        columns=['product_id', 'name', 'category_id', 'category_name'],
+    )
+    products = products.merge(catalog[['product_id', 'category_id']], on='product_id', how='inner')
+
+    merchant_names = {
+        pk: f'{first_name} {last_name}'.strip() or username
+        for pk, username, first_name, last_name in User.objects.filter(
+            user_type='merchant', pk__in=merchants['user_id'].unique().tolist()
+        ).values_list('pk', 'username', 'first_name', 'last_name')
+    }
+
+    return {
+        'windows': {period: {'start': start, 'end': end} for period, (start, end) in windows.items()},
+        'products': _records(
+            _compare(products, windows, 'product_id'),
+            dict(zip(catalog['product_id'].tolist(), catalog['name'].tolist())),
+        ),
+        'categories': _records(
+            _compare(products, windows, 'category_id'),
+            dict(zip(catalog['category_id'].tolist(), catalog['category_name'].tolist())),
+        ),
+        'merchants': _records(_compare(merchants, windows, 'user_id'), merchant_names),
+    }
+
+
+def time_series(start_day, end_day, resolution='day', max_points=MAX_POINTS):
+    """
+    Dense per-type totals and counts over a window, bucketed for charting.
+
+    Every day of the window is present (days without transactions count as
+    zero), grouped into days, weeks (starting Monday) or fiscal periods.
+    When that still gives more than max_points buckets, consecutive buckets
+    are merged in equal runs until it fits.
+
+    Args:
+        start_day: First local day of the window
+        end_day: Last local day of the window
+        resolution: One of RESOLUTIONS
+        max_points: Maximum number of buckets returned
+
+    Returns:
+        Dict with the 'resolution', the 'step' (buckets merged per point),
+        the 'buckets' as {start, end} dicts clipped to the window, and
+        'series' mapping each type to equal-length 'totals' and 'counts' lists
+    """
+    return cached_report(
+        f'series-{resolution}-{max_points}', None, start_day, end_day,
+        lambda: _time_series(start_day, end_day, resolution, max_points),
+    )
+
+
+def _time_series(start_day, end_day, resolution, max_points):
+    days = pd.date_range(start_day, end_day, freq='D')
+    rows = pd.DataFrame.from_records(
+        list(DailyTransactionRollup.objects.filter(
+            day__gte=start_day, day__lte=end_day
+        ).values_list('day', 'type', 'amount', 'count')),
+        columns=['day', 'type', 'total', 'count'],
+    )
+    rows['day'] = pd.to_datetime(rows['day'])
+    rows['total'] = rows['total'].astype(float)
+
+    # Gap-fill to one row per day with a column per type
+    dense = {
+        measure: rows.pivot_table(index='day', columns='type', values=measure, aggfunc='sum')
+        .reindex(index=days, columns=TYPES).fillna(0)
+        for measure in ('total', 'count')
+    }
+
+    offsets = np.arange(len(days))
+    if resolution == 'week':
+        codes = (offsets + start_day.weekday()) // 7
+    elif resolution == 'month':
+        starts = np.array([max(period.start, start_day) for period in periods_between(start_day, end_day)],
+                          dtype='datetime64[D]')
+        codes = np.searchsorted(starts, days.to_numpy(dtype='datetime64[D]'), side='right') - 1
+    else:
+        codes = offsets
+    step = max(1, math.ceil((codes[-1] + 1) / max_points)) if len(codes) else 1
+    codes = codes // step
+
+    grouped = {measure: frame.groupby(codes).sum() for measure, frame in dense.items()}
+    bounds = pd.Series(days).groupby(codes).agg(['min', 'max'])
+    return {
+        'resolution': resolution,
+        'step': step,
+        'buckets': [
+            {'start': first.date(), 'end': last.date()}
+            for first, last in zip(bounds['min'], bounds['max'])
+        ],
+        'series': {
+            code: {
+                'totals': grouped['total'][code].round(2).tolist(),
+                'counts': grouped['count'][code].astype(int).tolist(),
+            }
+            for code in TYPES
+        },
+    }
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        from base.db import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid='base.configure_sqlite')
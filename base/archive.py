@@ -0,0 +1,139 @@
+"""Period close: moving old transactions into the archive tables."""
+
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from base.models import (
+    ArchivedTransaction,
+    ArchivedTransactionItem,
+    DataVersion,
+    PeriodClose,
+    ProductCarryForward,
+    Transaction,
+    TransactionItem,
+    UserCarryForward,
+)
+
+PRODUCT_TYPES = ('take', 'restore')
+
+
+def period_start(cutoff):
+    """Aware local midnight that starts the day `cutoff`."""
+    return timezone.make_aware(datetime.combine(cutoff, time.min))
+
+
+def latest_close():
+    """The most recent PeriodClose, or None if no period was ever closed."""
+    return PeriodClose.objects.order_by('-cutoff').first()
+
+
+def with_carry_forward(live, carried, key, fields):
+    """
+    Add carried-forward totals to grouped live rows.
+
+    Args:
+        live: Iterable of dicts grouped by `key`
+        carried: Iterable of dicts with the same key and fields
+        key: Name of the grouping field
+        fields: Names of the summed fields; rows are sorted by the first, descending
+
+    Returns:
+        List of merged dicts
+    """
+    merged = {}
+    for row in chain(live, carried):
+        target = merged.setdefault(row[key], dict(row, **{field: 0 for field in fields}))
+        for field in fields:
+            target[field] += row[field] or 0
+    return sorted(merged.values(), key=lambda row: row[fields[0]], reverse=True)
+
+
+def close_period(cutoff, batch_size=2000):
+    """
+    Move every transaction dated before `cutoff` into the archive tables.
+
+    Stock, debts, products_count and the daily rollups already include these
+    transactions and are left untouched. Report totals that read raw history
+    add the per-user and per-product carry-forward rows written here.
+    Take/restore transactions whose partner was deleted stay live, since
+    their items cannot be attributed to a carry-forward row.
+
+    Args:
+        cutoff: First day that stays in the live tables
+        batch_size: Transactions moved per batch
+
+    Returns:
+        The created PeriodClose
+
+    Raises:
+        ValueError: If cutoff is not after the latest closed period
+    """
+    latest = latest_close()
+    if latest and cutoff <= latest.cutoff:
+        raise ValueError(f'Period up to {latest.cutoff} is already closed')
+
+    closed = Transaction.objects.filter(date__lt=period_start(cutoff)).exclude(
+        user__isnull=True, type__in=PRODUCT_TYPES
+    )
+    items = TransactionItem.objects.filter(transaction__in=closed.values('pk'))
+
+    with db_transaction.atomic():
+        period = PeriodClose.objects.create(cutoff=cutoff)
+
+        user_totals = {
+            (row['user_id'], row['type']): {
+                'count': row['count'], 'amount': row['amount'] or 0, 'quantity': 0,
+            }
+            for row in closed.filter(user__isnull=False).values('user_id', 'type').annotate(
+                count=Count('id'), amount=Sum('amount')
+            ).order_by()
+        }
+        for row in items.values('transaction__user_id', 'transaction__type').annotate(
+            quantity=Sum('quantity')
+        ).order_by():
+            user_totals[(row['transaction__user_id'], row['transaction__type'])]['quantity'] = (
+                row['quantity'] or 0
+            )
+
+        product_totals = {
+            (row['product_id'], row['transaction__user_id'], row['transaction__type']): {
+                'count': row['count'], 'quantity': row['quantity'] or 0, 'total': row['total'] or 0,
+            }
+            for row in items.filter(product__isnull=False).values(
+                'product_id', 'transaction__user_id', 'transaction__type'
+            ).annotate(
+                count=Count('transaction', distinct=True), quantity=Sum('quantity'), total=Sum('total')
+            ).order_by()
+        }
+
+        UserCarryForward.objects.increment(('user_id', 'type'), user_totals)
+        ProductCarryForward.objects.increment(('product_id', 'user_id', 'type'), product_totals)
+
+        ids = list(closed.values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            ArchivedTransaction.objects.bulk_create([
+                ArchivedTransaction(period=period, **row)
+                for row in Transaction.objects.filter(pk__in=batch).values(
+                    'id', 'user_id', 'amount', 'type', 'date'
+                )
+            ])
+            archived_items = ArchivedTransactionItem.objects.bulk_create([
+                ArchivedTransactionItem(**row)
+                for row in TransactionItem.objects.filter(transaction_id__in=batch).values(
+                    'id', 'transaction_id', 'product_id', 'quantity', 'price', 'total'
+                )
+            ])
+            period.items += len(archived_items)
+            # A plain queryset delete skips Transaction.delete(), so nothing is reversed
+            Transaction.objects.filter(pk__in=batch).delete()
+
+        period.transactions = len(ids)
+        period.save(update_fields=['transactions', 'items'])
+        DataVersion.bump(cutoff - timedelta(days=1))
+
+    return period
@@ -1,17 +1,5 @@
 """Application constants and configuration."""
 
-
-class FirstDayOfMonth:
-    """Configurable first day of the month for reports."""
-    
-    _first_day = 1
-
-    @classmethod
-    def set(cls, value):
-        """Set the first day of the month."""
-        cls._first_day = value
-
-    @classmethod
-    def get(cls):
-        """Get the first day of the month."""
-        return cls._first_day
\ No newline at end of file
+# Day of the month fiscal periods start on when the calendar is first built;
+# the persisted calendar (base.fiscal) is the source of truth afterwards
+FISCAL_MONTH_START = 1
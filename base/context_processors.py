@@ -1,5 +1,7 @@
 """Custom context processors for template rendering."""
 
+from django.db.models import Count, Q
+
 from base.models import Product, Category, User
 
 
@@ -9,9 +11,13 @@ def sidebar_stats(request):
     
     Provides counts for products, categories, merchants, and representatives.
     """
+    partners = User.objects.filter(user_type__in=['merchant', 'representative']).aggregate(
+        merchants=Count('pk', filter=Q(user_type='merchant')),
+        representatives=Count('pk', filter=Q(user_type='representative')),
+    )
     return {
         'products_count': Product.objects.count(),
         'categories_count': Category.objects.count(),
-        'merchants_count': User.objects.filter(user_type='merchant').count(),
-        'representatives_count': User.objects.filter(user_type='representative').count(),
+        'merchants_count': partners['merchants'],
+        'representatives_count': partners['representatives'],
     }
@@ -0,0 +1,24 @@
+"""SQLite connection tuning."""
+
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Apply the configured PRAGMAs to every new SQLite connection.
+
+    Connected to `connection_created` in BaseConfig.ready(). A database entry
+    may override the project-wide SQLITE_PRAGMAS with its own key of the
+    same name.
+
+    Args:
+        sender: Database wrapper class
+        connection: The new database wrapper
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = connection.settings_dict.get('SQLITE_PRAGMAS', getattr(settings, 'SQLITE_PRAGMAS', {}))
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
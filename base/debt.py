@@ -0,0 +1,103 @@
+"""Merchant debt statements served from the running-balance ledger."""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import Sum, Q
+
+from base.models import DebtEntry
+
+# Ledger lines per statement page
+STATEMENT_PAGE_SIZE = 25
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def balance_as_of(user, when):
+    """Get a merchant's debt balance at a point in time from one indexed read."""
+    return DebtEntry.objects.filter(user=user, date__lte=when).order_by(
+        '-date', '-id'
+    ).values_list('balance', flat=True).first() or Decimal('0.00')
+
+
+def debt_statement(user, start, end):
+    """
+    Build a debt statement for a merchant over [start, end].
+
+    Args:
+        user: The merchant
+        start: Aware datetime the period starts at (inclusive)
+        end: Aware datetime the period ends at (inclusive)
+
+    Returns:
+        Dict with opening and closing balances, period totals and the
+        ledger entries queryset for the period
+    """
+    entries = DebtEntry.objects.filter(user=user, date__gte=start, date__lte=end)
+    opening = DebtEntry.objects.filter(user=user, date__lt=start).order_by(
+        '-date', '-id'
+    ).values_list('balance', flat=True).first() or Decimal('0.00')
+
+    totals = entries.aggregate(
+        taken=Sum('amount', filter=Q(reason='take')),
+        paid=Sum('amount', filter=Q(reason='payment')),
+        reversed=Sum('amount', filter=Q(reason='reversal')),
+        adjusted=Sum('amount', filter=Q(reason='adjustment')),
+    )
+    totals = {key: value or Decimal('0.00') for key, value in totals.items()}
+
+    return {
+        'opening_balance': opening,
+        'closing_balance': balance_as_of(user, end),
+        'total_taken': totals['taken'],
+        'total_paid': -totals['paid'],
+        'total_reversed': totals['reversed'],
+        'total_adjusted': totals['adjusted'],
+        'entries': entries.select_related('transaction').order_by('date', 'id'),
+    }
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor for a row with `date` and `id`."""
+    return f'{(row.date - _EPOCH) // timedelta(microseconds=1)}-{row.id}'
+
+
+def decode_cursor(cursor):
+    """(date, id) position of a cursor from encode_cursor(), or None if it is missing or malformed."""
+    try:
+        # Dates before the epoch give a negative offset, so split on the last dash only
+        microseconds, row_id = map(int, cursor.rsplit('-', 1))
+        return _EPOCH + timedelta(microseconds=microseconds), row_id
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def statement_page(user, start, end, cursor=None, size=STATEMENT_PAGE_SIZE):
+    """
+    Get one page of a merchant's ledger lines over [start, end], oldest first.
+
+    Pages are keyed on (date, id) so each one is a short range read of the
+    (user, date, id) index, however long the merchant's history is.
+
+    Args:
+        user: The merchant
+        start: Aware datetime the period starts at (inclusive)
+        end: Aware datetime the period ends at (inclusive)
+        cursor: Opaque cursor from the previous page, or None for the first page
+        size: Lines per page
+
+    Returns:
+        Tuple (entries, next_cursor); next_cursor is None on the last page
+    """
+    entries = DebtEntry.objects.filter(user=user, date__gte=start, date__lte=end)
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        date, entry_id = position
+        entries = entries.filter(date__gte=date).exclude(date=date, id__lte=entry_id)
+
+    entries = list(entries.select_related('transaction').order_by('date', 'id')[:size + 1])
+    if len(entries) <= size:
+        return entries, None
+    entries = entries[:size]
+    return entries, encode_cursor(entries[-1])
@@ -0,0 +1,222 @@
+"""Persisted fiscal calendar.
+
+Fiscal months start on a configurable day of the month. Their boundaries
+are stored once in FiscalPeriod and every calendar day is mapped to its
+period in FiscalDay, so all processes share one calendar and report
+queries group rollup rows by fiscal period through a primary-key lookup
+instead of re-deriving the boundaries on every request.
+"""
+
+from datetime import date, timedelta
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Min, OuterRef, Subquery
+from django.utils import timezone
+
+from base.constants import FISCAL_MONTH_START
+from base.models import FiscalDay, FiscalPeriod
+
+# Years generated past the current one when the calendar is built
+HORIZON_YEARS = 5
+
+
+def _next_start(start, first_day):
+    """Start of the fiscal period following the one starting on `start`."""
+    if start.month == 12:
+        return date(start.year + 1, 1, first_day)
+    return date(start.year, start.month + 1, first_day)
+
+
+def _period_start(day, first_day):
+    """Start of the fiscal period containing `day`."""
+    if day.day >= first_day:
+        return day.replace(day=first_day)
+    if day.month == 1:
+        return date(day.year - 1, 12, first_day)
+    return date(day.year, day.month - 1, first_day)
+
+
+def period_bounds(first_day, start_day, end_day):
+    """
+    Generate the fiscal periods overlapping a window.
+
+    Args:
+        first_day: Day of the month fiscal periods start on (1-28)
+        start_day: First day of the window
+        end_day: Last day of the window
+
+    Returns:
+        List of (start, end, year, number) tuples in date order
+    """
+    if not 1 <= first_day <= 28:
+        raise ValueError('يجب أن يكون يوم بداية الفترة بين 1 و 28')
+
+    periods = []
+    start = _period_start(start_day, first_day)
+    while start <= end_day:
+        following = _next_start(start, first_day)
+        end = following - timedelta(days=1)
+        # Named after the calendar month holding most of the period
+        named = start if first_day <= 15 else end
+        periods.append((start, end, named.year, named.month))
+        start = following
+    return periods
+
+
+def _create_periods(periods, apps):
+    """Insert FiscalPeriod rows and the FiscalDay rows of every day they cover."""
+    FiscalPeriod = apps.get_model('base', 'FiscalPeriod')
+    FiscalDay = apps.get_model('base', 'FiscalDay')
+    if not periods:
+        return 0
+
+    FiscalPeriod.objects.bulk_create([
+        FiscalPeriod(start=start, end=end, year=year, number=number)
+        for start, end, year, number in periods
+    ])
+    ids = dict(FiscalPeriod.objects.filter(
+        start__gte=periods[0][0], start__lte=periods[-1][0]
+    ).values_list('start', 'pk'))
+
+    days = []
+    for start, end, _, _ in periods:
+        for offset in range((end - start).days + 1):
+            days.append(FiscalDay(day=start + timedelta(days=offset), period_id=ids[start]))
+    FiscalDay.objects.bulk_create(days, batch_size=1000)
+    return len(periods)
+
+
+def default_years(apps=global_apps):
+    """
+    Get the year range a fresh calendar covers: from the oldest transaction to HORIZON_YEARS ahead.
+
+    Returns:
+        (start_year, end_year) tuple
+    """
+    this_year = timezone.localdate().year
+    oldest = []
+    for name in ('Transaction', 'ArchivedTransaction'):
+        try:
+            model = apps.get_model('base', name)
+        except LookupError:
+            continue
+        first = model.objects.aggregate(first=Min('date'))['first']
+        if first is not None:
+            oldest.append(timezone.localdate(first).year)
+    return min(oldest + [this_year]), this_year + HORIZON_YEARS
+
+
+def build_calendar(first_day=FISCAL_MONTH_START, start_year=None, end_year=None, apps=global_apps):
+    """
+    Replace the fiscal calendar with periods starting on `first_day` of each month.
+
+    Args:
+        first_day: Day of the month fiscal periods start on (1-28)
+        start_year: First calendar year covered (defaults to default_years())
+        end_year: Last calendar year covered (defaults to default_years())
+        apps: App registry to load models from (historical registry in migrations)
+
+    Returns:
+        Number of periods written
+
+    Raises:
+        ValueError: If first_day is outside 1-28 or the years are reversed
+    """
+    default_start, default_end = default_years(apps)
+    start_year = start_year or default_start
+    end_year = end_year or default_end
+    if start_year > end_year:
+        raise ValueError('سنة البداية بعد سنة النهاية')
+    periods = period_bounds(first_day, date(start_year, 1, 1), date(end_year, 12, 31))
+
+    FiscalPeriod = apps.get_model('base', 'FiscalPeriod')
+    FiscalDay = apps.get_model('base', 'FiscalDay')
+    with db_transaction.atomic():
+        FiscalDay.objects.all().delete()
+        FiscalPeriod.objects.all().delete()
+        return _create_periods(periods, apps)
+
+
+def _extend_calendar(start_day, end_day):
+    """Add the periods needed for the calendar to cover the window, keeping its first day."""
+    first = FiscalPeriod.objects.order_by('start').first()
+    if first is None:
+        build_calendar()
+        first = FiscalPeriod.objects.order_by('start').first()
+        if first.start <= start_day and first.end >= end_day:
+            return
+    last = FiscalPeriod.objects.order_by('-start').first()
+
+    missing = []
+    if start_day < first.start:
+        missing += period_bounds(first.start.day, start_day, first.start - timedelta(days=1))
+    if end_day > last.end:
+        # Extend a year past what was asked so the calendar is not grown one period at a time
+        missing += period_bounds(first.start.day, last.end + timedelta(days=1), end_day + timedelta(days=365))
+    try:
+        with db_transaction.atomic():
+            _create_periods(sorted(missing), global_apps)
+    except IntegrityError:
+        # Another process extended the calendar first
+        pass
+
+
+def fiscal_year_start(period):
+    """
+    First day of the fiscal year a period belongs to, i.e. the start of its period number 1.
+
+    Follows the naming rule of period_bounds(): with a first day after the
+    15th, period 1 starts in the previous December.
+    """
+    first_day = period.start.day
+    if first_day <= 15:
+        return date(period.year, 1, first_day)
+    return date(period.year - 1, 12, first_day)
+
+
+def period_for(day):
+    """
+    Get the fiscal period a day belongs to, extending the calendar if it does not reach it.
+
+    Args:
+        day: Local date
+
+    Returns:
+        The FiscalPeriod containing day
+    """
+    row = FiscalDay.objects.select_related('period').filter(day=day).first()
+    if row is None:
+        _extend_calendar(day, day)
+        row = FiscalDay.objects.select_related('period').get(day=day)
+    return row.period
+
+
+def periods_between(start_day, end_day):
+    """
+    Get the fiscal periods overlapping a window, in date order.
+
+    Returns:
+        List of FiscalPeriod
+    """
+    def overlapping():
+        return list(FiscalPeriod.objects.filter(start__lte=end_day, end__gte=start_day).order_by('start'))
+
+    periods = overlapping()
+    if not periods or periods[0].start > start_day or periods[-1].end < end_day:
+        _extend_calendar(start_day, end_day)
+        periods = overlapping()
+    return periods
+
+
+def fiscal_period(day_field='day'):
+    """
+    Expression resolving a date column to its FiscalPeriod id, for annotate()/values() GROUP BY.
+
+    Each row costs one primary-key lookup in FiscalDay; call periods_between()
+    for the window first so every day is covered.
+
+    Args:
+        day_field: Name of the date field on the outer query
+    """
+    return Subquery(FiscalDay.objects.filter(day=OuterRef(day_field)).values('period_id')[:1])
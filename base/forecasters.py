@@ -0,0 +1,276 @@
+"""Demand forecasting backends.
+
+A backend turns a DemandMatrix, the daily demand of many products on one
+shared calendar, into daily demand forecasts with bands, stacked as arrays
+for the vectorized stock-out search in base.forecasting. FORECAST_BACKEND
+selects the backend by name:
+
+- 'prophet' fits one Prophet model per product; heavy, but models trend
+  and seasonality.
+- 'croston', 'sba' and 'ses' are pure NumPy smoothing methods that fit
+  every product of a batch at once. Croston and its bias-corrected SBA
+  variant smooth the size of non-zero demands and the intervals between
+  them separately, which suits sparse, lumpy per-product demand; simple
+  exponential smoothing ('ses') smooths the daily series directly.
+
+Backends never touch the database, so they run in any worker process.
+"""
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Two-sided 80% normal quantile, the interval width Prophet uses by default
+BAND_Z = 1.2816
+
+
+class DemandMatrix:
+    """
+    Daily demand of many products on one shared calendar.
+
+    Row i holds the demand of product_ids[i] on each day from `start`. The
+    series a backend fits for a row runs from its first to its last day
+    with demand, zero days included; rows without demand are not fitted.
+    """
+
+    def __init__(self, product_ids, start, quantities):
+        self.product_ids = list(product_ids)
+        self.start = np.datetime64(start, 'D')
+        self.quantities = np.asarray(quantities, dtype=float)
+
+    @classmethod
+    def from_rows(cls, product_ids, rows):
+        """
+        Build a matrix from (product_id, day, quantity) rows.
+
+        Quantities of the same product and day are summed and negative daily
+        totals (more restored than taken) are clipped to zero demand.
+
+        Args:
+            product_ids: Products in row order; products without rows get zero demand
+            rows: Iterable of (product_id, date, quantity)
+        """
+        product_ids = list(product_ids)
+        frame = pd.DataFrame(list(rows), columns=['product_id', 'day', 'quantity'])
+        if frame.empty:
+            return cls(product_ids, 'NaT', np.zeros((len(product_ids), 0)))
+
+        index = {product_id: row for row, product_id in enumerate(product_ids)}
+        days = frame['day'].to_numpy(dtype='datetime64[D]')
+        start = days.min()
+        quantities = np.zeros((len(product_ids), int((days.max() - start).astype(int)) + 1))
+        np.add.at(
+            quantities,
+            (frame['product_id'].map(index).to_numpy(), (days - start).astype(int)),
+            frame['quantity'].to_numpy(dtype=float),
+        )
+        return cls(product_ids, start, np.clip(quantities, 0, None))
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    @property
+    def days(self):
+        """datetime64[D] array of the calendar days, one per column."""
+        return self.start + np.arange(self.quantities.shape[1])
+
+    def bounds(self):
+        """(first, last) int arrays with each row's first and last column with demand, -1 when it has none."""
+        width = self.quantities.shape[1]
+        if width == 0:
+            return np.full(len(self), -1), np.full(len(self), -1)
+        has_demand = self.quantities > 0
+        found = has_demand.any(axis=1)
+        first = np.where(found, has_demand.argmax(axis=1), -1)
+        last = np.where(found, width - 1 - has_demand[:, ::-1].argmax(axis=1), -1)
+        return first, last
+
+    def active(self):
+        """Bool mask of the columns inside each row's series."""
+        first, last = self.bounds()
+        columns = np.arange(self.quantities.shape[1])[None, :]
+        return (columns >= first[:, None]) & (columns <= last[:, None])
+
+    def series(self, row):
+        """(days, quantities) arrays of one row's series."""
+        first, last = self.bounds()
+        return self.days[first[row]:last[row] + 1], self.quantities[row, first[row]:last[row] + 1]
+
+    def take(self, product_ids):
+        """Matrix of a subset of the products, on the same calendar."""
+        index = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        rows = [index[product_id] for product_id in product_ids]
+        return DemandMatrix([self.product_ids[row] for row in rows], self.start, self.quantities[rows])
+
+
+class Forecaster:
+    """
+    Interface of a forecasting backend.
+
+    Subclasses implement forecast() and are registered in FORECASTERS.
+    """
+
+    name = None
+
+    def forecast(self, demand, days):
+        """
+        Forecast daily demand after the last demand day of each row.
+
+        Args:
+            demand: DemandMatrix whose rows all have demand on at least two days
+            days: Number of days to forecast ahead
+
+        Returns:
+            (ds, forecasts) where ds is a datetime64 array of shape
+            (products, days) with each row's forecast days and forecasts an
+            array of shape (products, days, 3) of yhat, yhat_lower and yhat_upper
+        """
+        raise NotImplementedError
+
+
+class ProphetForecaster(Forecaster):
+    """One Prophet model per product, fitted on its daily series."""
+
+    name = 'prophet'
+
+    def history(self, demand, row):
+        """Prophet input frame of one DemandMatrix row: timezone-naive days 'ds' and demand 'y'."""
+        ds, quantities = demand.series(row)
+        return pd.DataFrame({'ds': ds.astype('datetime64[ns]'), 'y': quantities})
+
+    def fit(self, history, days):
+        """
+        Fit Prophet on one daily demand series.
+
+        Args:
+            history: DataFrame returned by history()
+
+        Returns:
+            DataFrame with ds, yhat, yhat_lower and yhat_upper columns over
+            the history and the `days` following it
+        """
+        # Import Prophet here to avoid loading it unnecessarily
+        from prophet import Prophet
+
+        model = Prophet()
+        model.fit(history)
+
+        future = model.make_future_dataframe(periods=days)
+        forecast = model.predict(future)
+        return forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+
+    def forecast(self, demand, days):
+        horizons = [self.fit(self.history(demand, row), days).tail(days) for row in range(len(demand))]
+        ds = np.array([horizon['ds'].to_numpy(dtype='datetime64[ns]') for horizon in horizons])
+        forecasts = np.array([
+            horizon[['yhat', 'yhat_lower', 'yhat_upper']].to_numpy(dtype=float) for horizon in horizons
+        ])
+        return ds.reshape(len(demand), days), forecasts.reshape(len(demand), days, 3)
+
+
+class SmoothingForecaster(Forecaster):
+    """
+    Croston, SBA or simple exponential smoothing over all products at once.
+
+    The recursion runs once per calendar day of the matrix, each step
+    updating every product whose series covers that day with array
+    operations. Bands are the point
+    forecast plus or minus BAND_Z times the standard deviation of the
+    in-sample one-step-ahead errors.
+    """
+
+    alpha = 0.1
+    method = None
+
+    def smooth(self, demand, active):
+        """
+        Run the smoothing recursion.
+
+        Returns:
+            (rate, error_std) arrays of shape (products,): the forecast daily
+            demand and the standard deviation of the one-step-ahead errors
+        """
+        rows, width = demand.shape
+        alpha = self.alpha
+        size = np.full(rows, np.nan)       # smoothed non-zero demand size (Croston)
+        interval = np.full(rows, np.nan)   # smoothed interval between demands (Croston)
+        since = np.zeros(rows)             # days since the last non-zero demand
+        level = np.full(rows, np.nan)      # smoothed daily demand (SES)
+        squared = np.zeros(rows)
+        errors = np.zeros(rows)
+
+        for day in range(width):
+            value = demand[:, day]
+            live = active[:, day]
+
+            predicted = self._rate(size, interval, level)
+            scored = live & ~np.isnan(predicted)
+            squared += np.where(scored, (value - np.nan_to_num(predicted)) ** 2, 0)
+            errors += scored
+
+            if self.method == 'ses':
+                level = np.where(live, np.where(np.isnan(level), value, level + alpha * (value - level)), level)
+                continue
+
+            since = np.where(live, since + 1, since)
+            hit = live & (value > 0)
+            first = hit & np.isnan(size)
+            size = np.where(first, value, np.where(hit, size + alpha * (value - size), size))
+            interval = np.where(first, since, np.where(hit, interval + alpha * (since - interval), interval))
+            since = np.where(hit, 0, since)
+
+        rate = np.nan_to_num(self._rate(size, interval, level))
+        return rate, np.sqrt(squared / np.maximum(errors, 1))
+
+    def _rate(self, size, interval, level):
+        if self.method == 'ses':
+            return level
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = size / interval
+        if self.method == 'sba':
+            rate = rate * (1 - self.alpha / 2)
+        return rate
+
+    def forecast(self, demand, days):
+        rate, error_std = self.smooth(demand.quantities, demand.active())
+
+        _, last = demand.bounds()
+        ds = (demand.days[last][:, None] + np.arange(1, days + 1)).astype('datetime64[ns]')
+        band = BAND_Z * error_std
+        forecasts = np.stack([rate, np.maximum(rate - band, 0), rate + band], axis=1)
+        return ds, np.repeat(forecasts[:, None, :], days, axis=1)
+
+
+class CrostonForecaster(SmoothingForecaster):
+    name = method = 'croston'
+
+
+class SBAForecaster(SmoothingForecaster):
+    name = method = 'sba'
+
+
+class SESForecaster(SmoothingForecaster):
+    name = method = 'ses'
+
+
+FORECASTERS = {
+    forecaster.name: forecaster
+    for forecaster in (ProphetForecaster, CrostonForecaster, SBAForecaster, SESForecaster)
+}
+
+
+def get_forecaster(name=None):
+    """
+    Get the forecasting backend named by `name` or the FORECAST_BACKEND setting.
+
+    Raises:
+        ImproperlyConfigured: If no backend has that name
+    """
+    name = name or settings.FORECAST_BACKEND
+    try:
+        return FORECASTERS[name]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f'Unknown FORECAST_BACKEND {name!r}; choose one of {", ".join(FORECASTERS)}'
+        )
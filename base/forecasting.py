@@ -0,0 +1,439 @@
+"""Stock-out forecasting.
+
+Demand is read in one query per load into a products x days DemandMatrix
+from the daily product rollups, so database round-trips do not grow with
+the number of products. Each product's series is fitted independently, so
+a forecast run is split into shards of products: the CPU-bound fitting of a shard runs in a worker process (a
+local process pool, or a Celery worker through base.tasks), and the
+results of all shards are written back in one final step.
+
+Runs are incremental. ProductForecast keeps, per product, the high-water
+mark and fingerprint of the series its stored forecast was fitted on;
+only products whose series changed are refitted, and the stock-out dates
+of every product are then recomputed from the stored forecast horizons
+against current stock levels in one vectorized pass.
+"""
+
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from base.forecasters import DemandMatrix, ProphetForecaster, get_forecaster
+from base.models import STOCK_SIGN, DailyProductRollup, Product, ProductForecast
+
+# Forecast columns stacked for the stock-out search: point estimate, then bands
+FORECAST_BANDS = ('yhat', 'yhat_lower', 'yhat_upper')
+
+# Days forecast ahead of each product's last sale
+FORECAST_DAYS = 30
+
+
+def shards(product_ids, size=None):
+    """Split product ids into lists of at most `size` (FORECAST_SHARD_SIZE by default)."""
+    size = size or settings.FORECAST_SHARD_SIZE
+    product_ids = list(product_ids)
+    return [product_ids[i:i + size] for i in range(0, len(product_ids), size)]
+
+
+def demand_types(net_restores=None):
+    """Rollup types that make up demand: takes, plus restores when FORECAST_NET_RESTORES (or `net_restores`) is set."""
+    if net_restores is None:
+        net_restores = settings.FORECAST_NET_RESTORES
+    return ('take', 'restore') if net_restores else ('take',)
+
+
+def _marks(rollups):
+    """
+    Group rollup rows into {product_id: mark} for products with demand on at least 2 days.
+
+    A mark joins the last demand day, the number of demand rows, their
+    total quantity and the FORECAST_NET_RESTORES setting, so it moves with
+    any posting or reversal and when the setting is toggled.
+    """
+    net_restores = settings.FORECAST_NET_RESTORES
+    return {
+        product_id: f'{last_day}:{days}:{quantity}:{"net" if net_restores else "takes"}'
+        for product_id, last_day, days, quantity in rollups.filter(
+            type__in=demand_types(net_restores)
+        ).values('product_id').annotate(
+            last_day=Max('day'), days=Count('day', distinct=True), quantity=Sum('quantity')
+        ).filter(days__gte=2).order_by('product_id').values_list('product_id', 'last_day', 'days', 'quantity')
+    }
+
+
+def demand_marks(product_id=-1):
+    """
+    Get the high-water mark of every product with enough history to fit, in one grouped query.
+
+    Marks are read from DailyProductRollup, so the history of archived
+    periods still counts.
+
+    Args:
+        product_id: Restrict to one product, or -1 for all products
+
+    Returns:
+        Dict mapping product_id to its mark for products with demand on at
+        least 2 days
+    """
+    rollups = DailyProductRollup.objects.all()
+    if product_id != -1:
+        rollups = rollups.filter(product_id=product_id)
+    return _marks(rollups)
+
+
+def stale_products(marks):
+    """
+    Get the products whose high-water mark moved since their stored forecast.
+
+    Args:
+        marks: Dict returned by demand_marks()
+
+    Returns:
+        Sorted list of product ids to reload, including never-fitted products
+    """
+    stored = dict(ProductForecast.objects.values_list('product_id', 'mark'))
+    return sorted(product_id for product_id, mark in marks.items() if stored.get(product_id) != mark)
+
+
+def demand_matrix(product_ids, net_restores=None):
+    """
+    Load the daily demand of products into a DemandMatrix in one query.
+
+    Reads DailyProductRollup, which already holds each product's taken and
+    restored quantity per local day, archived periods included.
+
+    Args:
+        product_ids: Products in row order
+        net_restores: Subtract restored quantities from the day's demand
+            (FORECAST_NET_RESTORES by default); otherwise only takes count
+
+    Returns:
+        DemandMatrix
+    """
+    product_ids = list(product_ids)
+    rows = DailyProductRollup.objects.filter(
+        product_id__in=product_ids, type__in=demand_types(net_restores)
+    ).values_list('product_id', 'day', 'type', 'quantity')
+    # Demand moves stock down, so it takes the opposite sign of the stock movement
+    return DemandMatrix.from_rows(product_ids, (
+        (product_id, day, -STOCK_SIGN[type] * quantity) for product_id, day, type, quantity in rows
+    ))
+
+
+def series_fingerprint(days, quantities, horizon=FORECAST_DAYS, backend=None):
+    """Hash of a daily demand series, the horizon and the backend (FORECAST_BACKEND by default) it is fitted with."""
+    digest = hashlib.sha256(f'{backend or settings.FORECAST_BACKEND}:{horizon}'.encode())
+    for day, quantity in zip(days, quantities):
+        digest.update(f'|{day},{quantity:g}'.encode())
+    return digest.hexdigest()
+
+
+def load_shard(product_ids, marks=None):
+    """
+    Load the demand of a shard of products in two queries, or one given their marks.
+
+    Args:
+        product_ids: Products to load
+        marks: demand_marks() of these products, when the caller already has them
+
+    Returns:
+        Dict with 'demand', the shard's DemandMatrix, and 'products', mapping
+        product_id to {mark, fingerprint}; plain picklable
+        data a worker process can fit without the database
+    """
+    if marks is None:
+        marks = _marks(DailyProductRollup.objects.filter(product_id__in=list(product_ids)))
+    product_ids = [product_id for product_id in product_ids if product_id in marks]
+    demand = demand_matrix(product_ids)
+
+    first, last = demand.bounds()
+    days = demand.days
+    products = {}
+    for row, product_id in enumerate(product_ids):
+        # Rows without demand hash as an empty series
+        span = slice(first[row], last[row] + 1) if last[row] >= 0 else slice(0, 0)
+        products[product_id] = {
+            'mark': marks[product_id],
+            'fingerprint': series_fingerprint(days[span], demand.quantities[row, span]),
+        }
+    return {'products': products, 'demand': demand}
+
+
+def slice_shard(shard, product_ids):
+    """Part of a loaded shard holding only `product_ids`."""
+    product_ids = list(product_ids)
+    return {
+        'products': {product_id: shard['products'][product_id] for product_id in product_ids},
+        'demand': shard['demand'].take(product_ids),
+    }
+
+
+def drop_unchanged(shard):
+    """
+    Remove the products whose series matches their stored fingerprint.
+
+    Their stored forecast is still valid, so only its high-water mark is
+    moved forward (e.g. after a take and its reversal) so the next run
+    skips them without loading their demand.
+
+    Returns:
+        The shard without the unchanged products
+    """
+    products = shard['products']
+    fingerprints = dict(ProductForecast.objects.filter(
+        product_id__in=list(products)
+    ).values_list('product_id', 'fingerprint'))
+
+    unchanged = [
+        ProductForecast(product_id=product_id, mark=entry['mark'])
+        for product_id, entry in products.items() if fingerprints.get(product_id) == entry['fingerprint']
+    ]
+    ProductForecast.objects.bulk_update(unchanged, ['mark'], batch_size=500)
+    return slice_shard(shard, [
+        product_id for product_id, entry in products.items()
+        if fingerprints.get(product_id) != entry['fingerprint']
+    ])
+
+
+def stock_out_indices(demand, stocks):
+    """
+    Find, per row, the first day by which cumulative demand reaches the stock level.
+
+    Demand is clipped at zero and accumulated along each row; every row is
+    then lifted above the previous one so the flattened totals stay sorted
+    and a single searchsorted answers all rows at once.
+
+    Args:
+        demand: Array of shape (products, horizon) of daily demand
+        stocks: Array of shape (products,) of stock levels
+
+    Returns:
+        Int array of shape (products,); 0 where stock is zero or negative,
+        horizon where stock outlasts the forecast
+    """
+    demand = np.asarray(demand, dtype=float)
+    # Oversold (negative) stock is already out, like zero stock
+    stocks = np.maximum(np.asarray(stocks, dtype=float), 0)
+    rows, horizon = demand.shape
+    if rows == 0 or horizon == 0:
+        return np.full(rows, horizon, dtype=int)
+
+    totals = np.cumsum(np.clip(demand, 0, None), axis=1)
+    span = totals[:, -1].max() + stocks.max() + 1
+    offsets = np.arange(rows) * span
+    index = np.searchsorted((totals + offsets[:, None]).ravel(), stocks + offsets, side='left')
+    return np.minimum(index - np.arange(rows) * horizon, horizon)
+
+
+def stock_out_dates(ds, forecasts, stocks):
+    """
+    Stock-out dates of many products from their stacked forecast horizons.
+
+    Args:
+        ds: datetime64 array of shape (products, horizon) with each row's forecast days
+        forecasts: Array of shape (products, horizon, 3) holding yhat, yhat_lower
+            and yhat_upper in that order (FORECAST_BANDS)
+        stocks: Array of shape (products,) of stock levels
+
+    Returns:
+        Dict with 'date', 'lower' and 'upper' datetime64 arrays of shape
+        (products,): the stock-out day under each band, NaT where stock
+        outlasts the horizon. The lower band means less demand, so its
+        date is the latest of the three.
+    """
+    ds = np.asarray(ds, dtype='datetime64[ns]')
+    rows, horizon = ds.shape
+    # One padding column of NaT stands for "not within the horizon"
+    padded = np.concatenate([ds, np.full((rows, 1), np.datetime64('NaT'), dtype=ds.dtype)], axis=1)
+    return {
+        name: padded[np.arange(rows), stock_out_indices(forecasts[:, :, band], stocks)]
+        for band, name in enumerate(('date', 'lower', 'upper'))
+    }
+
+
+def forecast_shard(shard, days=FORECAST_DAYS):
+    """
+    Fit every product of a shard loaded by load_shard() with the FORECAST_BACKEND backend.
+
+    Runs without database access so it can execute in any worker process.
+
+    Returns:
+        Dict mapping product_id to {mark, fingerprint, forecast}, where forecast holds the future horizon of the fit as
+        JSON-ready lists keyed 'ds' and FORECAST_BANDS
+    """
+    first, last = shard['demand'].bounds()
+    # A series needs demand on at least two days to be fitted
+    fitted = [
+        product_id for row, product_id in enumerate(shard['demand'].product_ids) if last[row] > first[row]
+    ]
+    if not fitted:
+        return {}
+    demand = shard['demand'].take(fitted)
+    # The whole shard goes to the backend at once so batch backends fit it in one pass
+    ds, forecasts = get_forecaster().forecast(demand, days)
+
+    results = {}
+    for row, product_id in enumerate(fitted):
+        entry = shard['products'][product_id]
+        results[product_id] = {
+            'mark': entry['mark'],
+            'fingerprint': entry['fingerprint'],
+            'forecast': {
+                'ds': [pd.Timestamp(value).isoformat() for value in ds[row]],
+                **{band: np.round(forecasts[row, :, index], 4).tolist() for index, band in enumerate(FORECAST_BANDS)},
+            },
+        }
+    return results
+
+
+def save_forecasts(results):
+    """
+    Store the fits returned by forecast_shard() on ProductForecast in one upsert.
+
+    Args:
+        results: Dict mapping product_id (int or str) to forecast_shard() entries
+
+    Returns:
+        Number of forecasts stored
+    """
+    fitted_at = timezone.now()
+    ProductForecast.objects.bulk_create([
+        ProductForecast(
+            product_id=int(product_id),
+            fitted_at=fitted_at,
+            mark=result['mark'],
+            fingerprint=result['fingerprint'],
+            forecast=result['forecast'],
+        )
+        for product_id, result in results.items()
+    ], batch_size=500, update_conflicts=True, unique_fields=['product'],
+        update_fields=['fitted_at', 'mark', 'fingerprint', 'forecast'])
+    return len(results)
+
+
+def refresh_stock_out(product_ids):
+    """
+    Recompute stock-out dates from the stored forecasts and current stock levels.
+
+    Needs no refit, so it runs over every product on each refresh; the
+    search itself is one vectorized pass over all stored horizons.
+
+    Args:
+        product_ids: Products to refresh
+
+    Returns:
+        Number of products with a stock-out date within their horizon
+    """
+    rows = list(ProductForecast.objects.filter(product_id__in=list(product_ids)).values_list(
+        'product_id', 'product__stock', 'forecast'
+    ))
+    if not rows:
+        return 0
+
+    # Stored horizons may differ in length; pad with zero demand on NaT days
+    horizon = max(len(forecast.get('ds', [])) for _, _, forecast in rows)
+    ds = np.full((len(rows), horizon), np.datetime64('NaT'), dtype='datetime64[ns]')
+    forecasts = np.zeros((len(rows), horizon, len(FORECAST_BANDS)))
+    for row, (_, _, forecast) in enumerate(rows):
+        days = len(forecast.get('ds', []))
+        ds[row, :days] = np.array(forecast.get('ds', []), dtype='datetime64[ns]')
+        for band, name in enumerate(FORECAST_BANDS):
+            forecasts[row, :days, band] = forecast[name]
+    dates = stock_out_dates(ds, forecasts, np.array([stock for _, stock, _ in rows]))
+
+    def value(name, row):
+        # Forecast days are local days; store them as local midnight
+        if np.isnat(dates[name][row]):
+            return None
+        return timezone.make_aware(pd.Timestamp(dates[name][row]).to_pydatetime(), timezone.get_current_timezone())
+
+    products, stored = [], []
+    for row, (product_id, _, _) in enumerate(rows):
+        # Products without a forecast stock-out keep their previous estimate
+        if value('date', row) is not None:
+            products.append(Product(pk=product_id, estimated_stock_out=value('date', row)))
+        stored.append(ProductForecast(
+            product_id=product_id,
+            stock_out_lower=value('lower', row),
+            stock_out_upper=value('upper', row),
+        ))
+    Product.objects.bulk_update(products, ['estimated_stock_out'], batch_size=500)
+    ProductForecast.objects.bulk_update(stored, ['stock_out_lower', 'stock_out_upper'], batch_size=500)
+    return len(products)
+
+
+def run_forecasts(payloads, workers=1):
+    """
+    Fit loaded shards, fanning them out over a local process pool.
+
+    Args:
+        payloads: Shards returned by load_shard()
+        workers: Number of worker processes; 1 fits every shard in this process
+
+    Returns:
+        Dict mapping product_id to its forecast_shard() entry
+    """
+    payloads = [payload for payload in payloads if payload['products']]
+    results = {}
+    if workers <= 1 or len(payloads) <= 1:
+        for payload in payloads:
+            results.update(forecast_shard(payload))
+        return results
+
+    # Workers only fit the loaded shards and never touch the database; django.setup
+    # makes the models importable when the platform spawns rather than forks them
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        for shard_results in executor.map(forecast_shard, payloads):
+            results.update(shard_results)
+    return results
+
+
+def forecast_stock(product_id, days=FORECAST_DAYS):
+    """
+    Forecast stock using Prophet time series prediction.
+
+    Args:
+        product_id: ID of the product to forecast
+        days: Number of days to forecast ahead
+
+    Returns:
+        DataFrame with forecast data or None if insufficient data
+    """
+    demand = load_shard([product_id])['demand']
+    first, last = demand.bounds()
+    # Need demand on at least 2 days for Prophet
+    if not len(demand) or last[0] <= first[0]:
+        return None
+    forecaster = ProphetForecaster()
+    return forecaster.fit(forecaster.history(demand, 0), days)
+
+
+def estimate_stock_out(product_id=-1, forecast_df=None, workers=None):
+    """
+    Estimate when products will run out of stock, refitting only products whose demand changed.
+
+    Args:
+        product_id: Specific product ID or -1 for all products
+        forecast_df: Pre-computed forecast DataFrame
+        workers: Worker processes to fit shards on (defaults to FORECAST_WORKERS)
+
+    Returns:
+        Dict with the number of products 'refitted' and the number with a
+        stock-out date ('updated')
+    """
+    if product_id != -1 and forecast_df is not None:
+        return None
+
+    workers = workers or settings.FORECAST_WORKERS
+    marks = demand_marks(product_id)
+    # One load for every stale product, sliced into shards for the workers
+    shard = drop_unchanged(load_shard(stale_products(marks), marks))
+    payloads = [slice_shard(shard, ids) for ids in shards(shard['products'])]
+    refitted = save_forecasts(run_forecasts(payloads, workers))
+    return {'refitted': refitted, 'updated': refresh_stock_out(marks)}
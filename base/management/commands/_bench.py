@@ -0,0 +1,136 @@
+"""Shared helpers for the benchmark management commands."""
+
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction as db_transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from base.models import Category, Product, User, Transaction, TransactionItem
+
+
+@contextmanager
+def rolled_back():
+    """Run the block inside a transaction that is always rolled back."""
+    with db_transaction.atomic():
+        yield
+        db_transaction.set_rollback(True)
+
+
+def measure(func, repeat=1):
+    """Run func repeat times and return (seconds per call, queries per call)."""
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = time.perf_counter() - start
+    return elapsed / repeat, len(ctx.captured_queries) / repeat
+
+
+def seed_catalog(products=50, stock=1_000_000):
+    """Create a benchmark category with the given number of products."""
+    category = Category.objects.create(name='bench', description='bench')
+    Product.objects.bulk_create([
+        Product(
+            name=f'bench-{i}',
+            description='',
+            price=Decimal(random.randint(10, 500)),
+            stock=stock,
+            category=category,
+        )
+        for i in range(products)
+    ])
+    return list(Product.objects.filter(category=category))
+
+
+def seed_user(user_type='representative'):
+    """Create a benchmark partner."""
+    return User.objects.create(
+        username=f'bench_{user_type}_{random.randint(0, 10**9)}',
+        user_type=user_type,
+    )
+
+
+def seed_history(user, products, items, items_per_transaction=5, types=('take', 'restore')):
+    """Bulk insert raw item history for user without touching stock or counters."""
+    if items <= 0:
+        return []
+    transactions = Transaction.objects.bulk_create([
+        Transaction(user=user, type=random.choice(types), amount=Decimal('0.00'))
+        for _ in range(max(items // items_per_transaction, 1))
+    ])
+    TransactionItem.objects.bulk_create([
+        TransactionItem(
+            transaction=transactions[i % len(transactions)],
+            date=transactions[i % len(transactions)].date,
+            product=random.choice(products),
+            quantity=random.randint(1, 5),
+            price=Decimal('1.00'),
+            total=Decimal('1.00'),
+        )
+        for i in range(items)
+    ], batch_size=5000)
+    return transactions
+
+
+def seed_dataset(products=200, merchants=20, representatives=20, transactions=20000, days=365):
+    """
+    Bulk insert a realistic dataset spread over the last `days` days.
+
+    Stock, debt and counters are not maintained; rollups are rebuilt at the end.
+
+    Returns:
+        Dict with the created products, merchants and representatives
+    """
+    from base.rollups import rebuild_rollups
+
+    catalog = seed_catalog(products)
+    partners = User.objects.bulk_create(
+        [User(username=f'bench_m_{random.randint(0, 10**9)}_{i}', user_type='merchant')
+         for i in range(merchants)]
+        + [User(username=f'bench_r_{random.randint(0, 10**9)}_{i}', user_type='representative')
+           for i in range(representatives)]
+    )
+    partners = list(User.objects.filter(pk__in=[user.pk for user in partners]))
+
+    now = timezone.now()
+    # Insert in chunks so million-item datasets do not live in memory at once
+    for offset in range(0, transactions, 20000):
+        rows = Transaction.objects.bulk_create([
+            Transaction(
+                user=random.choice(partners),
+                type=random.choices(['take', 'payment', 'restore', 'fees'], weights=[60, 20, 15, 5])[0],
+                amount=Decimal(random.randint(100, 5000)),
+            )
+            for _ in range(min(20000, transactions - offset))
+        ], batch_size=5000)
+        rows = list(Transaction.objects.filter(pk__in=[row.pk for row in rows]))
+
+        # auto_now_add ignores explicit dates, so spread them afterwards
+        for row in rows:
+            row.date = now - timedelta(days=random.randint(0, days), seconds=random.randint(0, 86399))
+        Transaction.objects.bulk_update(rows, ['date'], batch_size=5000)
+
+        TransactionItem.objects.bulk_create([
+            TransactionItem(
+                transaction=row,
+                date=row.date,
+                product=product,
+                quantity=random.randint(1, 5),
+                price=product.price,
+                total=product.price,
+            )
+            for row in rows if row.type in ('take', 'restore')
+            for product in random.sample(catalog, random.randint(1, 4))
+        ], batch_size=5000)
+
+    rebuild_rollups()
+    return {
+        'products': catalog,
+        'merchants': [user for user in partners if user.user_type == 'merchant'],
+        'representatives': [user for user in partners if user.user_type == 'representative'],
+    }
@@ -0,0 +1,109 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from base.analytics import _period_comparison, comparison_windows
+from base.models import Category, Product, Transaction, TransactionItem, User
+from ._bench import rolled_back, measure, seed_dataset
+
+
+def per_entity_comparison(start_day, end_day):
+    """Compute the same comparison with one aggregate per entity and window over the raw tables."""
+    windows = {
+        period: (
+            timezone.make_aware(datetime.combine(start, time.min)),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+        )
+        for period, (start, end) in comparison_windows(start_day, end_day).items()
+    }
+
+    def growth(current, base):
+        return None if not base else round(float((current - base) / abs(base) * 100), 2)
+
+    def compare(entities, values):
+        rows = []
+        for entity in entities:
+            sums = {period: values(entity, start, end) or Decimal('0.00') for period, (start, end) in windows.items()}
+            rows.append({
+                'id': entity.pk,
+                **sums,
+                'growth': growth(sums['current'], sums['previous']),
+                'yoy': growth(sums['current'], sums['year_ago']),
+            })
+        return sorted(rows, key=lambda row: row['current'], reverse=True)
+
+    def item_revenue(**filters):
+        return lambda entity, start, end: TransactionItem.objects.filter(
+            transaction__type='take', transaction__date__gte=start, transaction__date__lt=end,
+            **{key: entity for key in filters},
+        ).aggregate(total=Sum('total'))['total']
+
+    return {
+        'products': compare(Product.objects.all(), item_revenue(product=True)),
+        'categories': compare(Category.objects.all(), item_revenue(product__category=True)),
+        'merchants': compare(
+            User.objects.filter(user_type='merchant'),
+            lambda entity, start, end: Transaction.objects.filter(
+                user=entity, type='take', date__gte=start, date__lt=end,
+            ).aggregate(total=Sum('amount'))['total'],
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the vectorized period comparison against per-entity ORM aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=200_000)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--merchants', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Everything runs in one transaction that is rolled back at the end
+        with rolled_back():
+            # Two years of history so the year-ago window has data
+            seed_dataset(
+                products=options['products'],
+                merchants=options['merchants'],
+                transactions=options['transactions'],
+                days=730,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.stdout.write(
+                f'{TransactionItem.objects.count()} items, {Transaction.objects.count()} transactions'
+            )
+
+            end = timezone.localdate()
+            start = end.replace(day=1)
+            vectorized = _period_comparison(start, end)
+            legacy = per_entity_comparison(start, end)
+
+            # Both approaches must agree on every entity's current value and growth
+            checked = mismatched = 0
+            for entity in ('products', 'categories', 'merchants'):
+                expected = {row['id']: row for row in legacy[entity] if row['current'] or row['previous']}
+                for row in vectorized[entity]:
+                    reference = expected.get(row['id'])
+                    if reference is None:
+                        continue
+                    checked += 1
+                    if abs(float(reference['current']) - row['current']) > 0.01 or reference['growth'] != (
+                        None if row['growth'] is None else round(row['growth'], 2)
+                    ):
+                        mismatched += 1
+                        self.stderr.write(f'{entity} {row["id"]} differs: {row} vs {reference}')
+            self.stdout.write(f'{checked} entities compared, {mismatched} mismatched')
+
+            self.stdout.write(f'{"mode":>12} {"ms":>10} {"queries":>8}')
+            for mode, func in (
+                ('per-entity', lambda: per_entity_comparison(start, end)),
+                ('vectorized', lambda: _period_comparison(start, end)),
+            ):
+                seconds, queries = measure(func, options['repeat'])
+                self.stdout.write(f'{mode:>12} {seconds * 1000:>10.1f} {queries:>8.0f}')
@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from base.models import DailyProductRollup, DailyUserRollup, Product, Transaction, User
+from base.services import delete_transactions, post_transaction
+from ._bench import rolled_back, measure, seed_catalog, seed_user
+
+
+class Command(BaseCommand):
+    help = 'Benchmark reversing transactions one by one against the bulk delete_transactions API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=10)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"mode":>10} {"total ms":>10} {"queries":>8}')
+
+        # Everything runs in one transaction that is rolled back at the end
+        with rolled_back():
+            products = seed_catalog()
+            merchant = seed_user('merchant')
+            expected = self.snapshot(merchant, products)
+
+            for mode in ('single', 'bulk'):
+                for _ in range(options['transactions']):
+                    lines = [(product.pk, random.randint(1, 5))
+                             for product in random.sample(products, options['lines'])]
+                    post_transaction(merchant, random.choice(['take', 'restore']), lines)
+                post_transaction(merchant, 'payment', amount=100)
+                queryset = Transaction.objects.filter(user=merchant)
+
+                if mode == 'single':
+                    seconds, queries = measure(lambda: [row.delete() for row in queryset])
+                else:
+                    seconds, queries = measure(lambda: delete_transactions(queryset))
+                self.stdout.write(f'{mode:>10} {seconds * 1000:>10.1f} {queries:>8.0f}')
+
+                if self.snapshot(merchant, products) != expected:
+                    raise CommandError(f'{mode} delete did not restore the original state')
+
+    def snapshot(self, user, products):
+        """Stock, partner totals and rollup sums that a full reversal must restore."""
+        user = User.objects.get(pk=user.pk)
+        rollups = [
+            DailyUserRollup.objects.filter(user=user).aggregate(
+                count=Sum('count'), amount=Sum('amount'), quantity=Sum('quantity')),
+            DailyProductRollup.objects.filter(product__in=products).aggregate(
+                quantity=Sum('quantity'), total=Sum('total')),
+        ]
+        return (
+            list(Product.objects.filter(pk__in=[p.pk for p in products]).order_by('pk').values_list('stock', flat=True)),
+            user.debt,
+            user.products_count,
+            user.debt_entries.aggregate(total=Sum('amount'))['total'] or 0,
+            [{field: value or 0 for field, value in sums.items()} for sums in rollups],
+        )
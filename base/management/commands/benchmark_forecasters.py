@@ -0,0 +1,99 @@
+import io
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.forecasters import FORECASTERS, DemandMatrix, get_forecaster
+from base.forecasting import FORECAST_BANDS, demand_marks, demand_matrix
+from ._bench import rolled_back
+
+
+def split_demand(demand, cutoff, holdout):
+    """
+    Split a DemandMatrix at the `cutoff` day into training rows and held-out daily demand.
+
+    Returns:
+        (train, actual) where train is a DemandMatrix of the days before the
+        cutoff and actual has shape (products, holdout); products with demand
+        on fewer than 2 days before the cutoff are left out
+    """
+    columns = int((np.datetime64(cutoff, 'D') - demand.start).astype(int))
+    train = DemandMatrix(demand.product_ids, demand.start, demand.quantities[:, :columns])
+    first, last = train.bounds()
+    train = train.take([product_id for row, product_id in enumerate(train.product_ids) if last[row] > first[row]])
+
+    actual = np.zeros((len(train), holdout))
+    held_out = demand.take(train.product_ids).quantities[:, columns:columns + holdout]
+    actual[:, :held_out.shape[1]] = held_out
+    return train, actual
+
+
+def held_out_forecast(ds, forecasts, cutoff, holdout):
+    """Place each row's point forecast on the held-out days it covers; uncovered days forecast zero."""
+    predicted = np.zeros((len(ds), holdout))
+    offsets = (ds.astype('datetime64[D]') - np.datetime64(cutoff, 'D')).astype(int)
+    rows, columns = np.nonzero((offsets >= 0) & (offsets < holdout))
+    predicted[rows, offsets[rows, columns]] = forecasts[rows, columns, FORECAST_BANDS.index('yhat')]
+    return predicted
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the forecasting backends for runtime and held-out accuracy on populate_data data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holdout', type=int, default=14, help='Trailing days held out for scoring')
+        parser.add_argument('--rounds', type=int, default=3, help='populate_data runs, one seed each')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--backends', nargs='+', choices=list(FORECASTERS), default=list(FORECASTERS))
+
+    def handle(self, *args, **options):
+        holdout = options['holdout']
+        scores = {name: {'seconds': 0.0, 'errors': [], 'totals': []} for name in options['backends']}
+        skipped = {}
+
+        for round_ in range(options['rounds']):
+            # populate_data wipes the database, so it only ever runs inside a rolled back transaction
+            with rolled_back():
+                random.seed(options['seed'] + round_)
+                call_command('populate_data', stdout=io.StringIO())
+
+                cutoff = timezone.localdate() - timedelta(days=holdout - 1)
+                train, actual = split_demand(demand_matrix(list(demand_marks())), cutoff, holdout)
+                # Long enough for the product whose series ends earliest to reach the last held-out day
+                _, last = train.bounds()
+                horizon = holdout + int((np.datetime64(cutoff, 'D') - train.days[last].min()).astype(int)) \
+                    if len(train) else holdout
+
+            for name in options['backends']:
+                if name in skipped:
+                    continue
+                start = time.perf_counter()
+                try:
+                    ds, forecasts = get_forecaster(name).forecast(train, horizon)
+                except ImportError as error:
+                    skipped[name] = error
+                    continue
+                scores[name]['seconds'] += time.perf_counter() - start
+
+                predicted = held_out_forecast(ds, forecasts, cutoff, holdout)
+                scores[name]['errors'].append(np.abs(predicted - actual).ravel())
+                scores[name]['totals'].append(predicted.sum(axis=1) - actual.sum(axis=1))
+
+            self.stdout.write(f'round {round_ + 1}: {len(train)} products, {holdout} held-out days')
+
+        self.stdout.write(f'{"backend":>10} {"seconds":>9} {"daily MAE":>10} {"total MAE":>10} {"total bias":>11}')
+        for name, score in scores.items():
+            if name in skipped:
+                self.stdout.write(f'{name:>10}  skipped: {skipped[name]}')
+                continue
+            errors = np.concatenate(score['errors']) if score['errors'] else np.zeros(0)
+            totals = np.concatenate(score['totals']) if score['totals'] else np.zeros(0)
+            self.stdout.write(
+                f'{name:>10} {score["seconds"]:>9.3f} {errors.mean() if errors.size else 0:>10.3f} '
+                f'{np.abs(totals).mean() if totals.size else 0:>10.2f} {totals.mean() if totals.size else 0:>11.2f}'
+            )
@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.forecasting import demand_marks, estimate_stock_out, load_shard, run_forecasts, shards, slice_shard
+from base.models import Product, User
+from base.services import post_transaction
+from ._bench import rolled_back, seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the stock-out forecast run on one process against a local process pool, then incremental refreshes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=20_000)
+        parser.add_argument('--workers', type=int, nargs='+',
+                            default=sorted({1, 2, 4, os.cpu_count() or 1}))
+
+    def handle(self, *args, **options):
+        # Everything runs in one transaction that is rolled back at the end;
+        # the workers only receive loaded shards, so they never need to see it
+        with rolled_back():
+            seed_dataset(products=options['products'], transactions=options['transactions'], days=365)
+            marks = demand_marks()
+            loaded = load_shard(list(marks), marks)
+            payloads = [slice_shard(loaded, ids) for ids in shards(marks)]
+            products = len(marks)
+            self.stdout.write(f'{products} products to forecast on {os.cpu_count()} cores')
+
+            baseline = None
+            reference = None
+            self.stdout.write(f'{"workers":>8} {"seconds":>10} {"speedup":>8}')
+            for workers in options['workers']:
+                start = time.perf_counter()
+                results = run_forecasts(payloads, workers)
+                elapsed = time.perf_counter() - start
+
+                baseline = baseline or elapsed
+                if reference is None:
+                    reference = results
+                elif results != reference:
+                    self.stderr.write(f'{workers} workers returned different forecasts')
+                self.stdout.write(f'{workers:>8} {elapsed:>10.2f} {baseline / elapsed:>7.2f}x')
+
+            # Incremental refreshes: everything fitted once, then nothing or a few products changed
+            self.stdout.write(f'{"refresh":>8} {"seconds":>10} {"refitted":>9}')
+            for label, changed in (('full', 0), ('quiet', 0), ('5%', max(1, products // 20))):
+                if changed:
+                    merchant = User.objects.filter(user_type='merchant').first()
+                    post_transaction(merchant, 'take', [
+                        (product, 1) for product in Product.objects.filter(stock__gt=0)[:changed]
+                    ])
+                start = time.perf_counter()
+                run = estimate_stock_out(workers=max(options['workers']))
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{label:>8} {elapsed:>10.2f} {run["refitted"]:>9}')
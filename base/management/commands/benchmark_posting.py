@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from base.services import post_transaction
+from ._bench import rolled_back, measure, seed_catalog, seed_user, seed_history
+
+
+class Command(BaseCommand):
+    help = 'Benchmark transaction posting cost as the user item history grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 10000, 50000])
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--lines', type=int, default=5)
+        parser.add_argument('--user-type', choices=['representative', 'merchant'], default='representative')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"history":>10} {"post ms":>10} {"queries":>8} {"recount ms":>11}')
+
+        # Everything runs in one transaction that is rolled back at the end
+        with rolled_back():
+            products = seed_catalog()
+            lines = [(product.pk, 1) for product in products[:options['lines']]]
+
+            seeded = 0
+            user = seed_user(options['user_type'])
+            for size in sorted(options['sizes']):
+                seed_history(user, products, size - seeded)
+                seeded = size
+
+                seconds, queries = measure(
+                    lambda: post_transaction(user, 'take', lines), options['posts']
+                )
+                recount, _ = measure(user.recalculate_products_count)
+                self.stdout.write(
+                    f'{size:>10} {seconds * 1000:>10.2f} {queries:>8.1f} {recount * 1000:>11.2f}'
+                )
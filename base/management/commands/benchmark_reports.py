@@ -0,0 +1,104 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.shortcuts import render
+from django.test import RequestFactory
+from django.utils import timezone
+
+from base.models import Category, Product, Transaction, TransactionItem, User
+from base.views.reports import reports_view
+from ._bench import rolled_back, measure, seed_dataset
+
+
+def legacy_context(start_date, end_date):
+    """Replay the old per-section queries over the raw transaction tables."""
+    date_filter = {'date__gte': start_date, 'date__lte': end_date}
+    totals = {
+        trans_type: Transaction.objects.filter(type=trans_type, **date_filter).aggregate(
+            total=Sum('amount'))['total'] or Decimal('0.00')
+        for trans_type in ['take', 'payment', 'fees', 'restore']
+    }
+    take_filter = Q(
+        product__transaction_items__transaction__type='take',
+        product__transaction_items__transaction__date__gte=start_date,
+        product__transaction_items__transaction__date__lte=end_date,
+    )
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'total_sales': totals['take'],
+        'total_payments': totals['payment'],
+        'total_fees': totals['fees'],
+        'total_restores': totals['restore'],
+        'net_profit': totals['payment'] - totals['fees'],
+        'total_debt': User.objects.filter(user_type='merchant').aggregate(total=Sum('debt'))['total'],
+        'transaction_counts': {
+            trans_type: Transaction.objects.filter(type=trans_type, **date_filter).count()
+            for trans_type in ['take', 'payment', 'restore', 'fees']
+        },
+        'top_merchants': User.objects.filter(
+            user_type='merchant', transactions__type='take',
+            transactions__date__gte=start_date, transactions__date__lte=end_date,
+        ).annotate(total_sales=Sum('transactions__amount')).order_by('-total_sales')[:5],
+        'top_products': Product.objects.filter(
+            transaction_items__transaction__type='take',
+            transaction_items__transaction__date__gte=start_date,
+            transaction_items__transaction__date__lte=end_date,
+        ).annotate(
+            total_quantity=Sum('transaction_items__quantity'),
+            total_revenue=Sum('transaction_items__total'),
+        ).order_by('-total_quantity')[:10],
+        'daily_trends': Transaction.objects.filter(**date_filter).annotate(day=TruncDate('date')).values(
+            'day', 'type').annotate(total=Sum('amount'), count=Count('id')).order_by('day'),
+        'category_performance': Category.objects.annotate(
+            total_sales=Sum('product__transaction_items__total', filter=take_filter),
+            total_quantity=Sum('product__transaction_items__quantity', filter=take_filter),
+        ).filter(total_sales__isnull=False).order_by('-total_sales'),
+        'low_stock_products': Product.objects.filter(stock__lte=10).order_by('stock')[:10],
+        'top_representatives': User.objects.filter(
+            user_type='representative', transactions__type='take',
+            transactions__date__gte=start_date, transactions__date__lte=end_date,
+        ).annotate(total_products=Sum('transactions__items__quantity')).order_by('-total_products')[:5],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark reports page latency and query count on a large seeded dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1_000_000, help='Approximate number of items')
+        parser.add_argument('--days', type=int, nargs='+', default=[30, 365], help='Report window sizes')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+
+        # Everything runs in one transaction that is rolled back at the end
+        with rolled_back():
+            # take/restore are 75% of transactions with 2.5 items on average
+            seed_dataset(transactions=int(options['items'] / 1.875), days=max(options['days']))
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            items = TransactionItem.objects.count()
+            self.stdout.write(f'{items} items, {Transaction.objects.count()} transactions')
+            self.stdout.write(f'{"window":>8} {"mode":>8} {"page ms":>10} {"queries":>8}')
+
+            for days in options['days']:
+                end = timezone.localdate()
+                start = end - timedelta(days=days)
+                request = factory.get('/reports/', {'start_date': start.isoformat(), 'end_date': end.isoformat()})
+                window = (request.GET['start_date'], request.GET['end_date'])
+
+                def legacy():
+                    start_date, end_date = [
+                        timezone.make_aware(timezone.datetime.fromisoformat(value)) for value in window
+                    ]
+                    render(request, 'reports.html', legacy_context(start_date, end_date))
+
+                for mode, page in (('legacy', legacy), ('current', lambda: reports_view(request))):
+                    seconds, queries = measure(page, options['repeat'])
+                    self.stdout.write(f'{days:>7}d {mode:>8} {seconds * 1000:>10.1f} {queries:>8.0f}')
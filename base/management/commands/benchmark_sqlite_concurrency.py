@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections, OperationalError
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from base.models import Product, Transaction, User
+from base.services import post_transaction
+from ._bench import seed_dataset
+
+PROFILES = {
+    # Django defaults: rollback journal, 5 s driver timeout, one connection per request
+    'default': {'SQLITE_PRAGMAS': {}, 'CONN_MAX_AGE': 0},
+    'production': {'SQLITE_PRAGMAS': None, 'CONN_MAX_AGE': 600},
+}
+
+
+@contextmanager
+def use_database(name, **overrides):
+    """Point the default database at another SQLite file for the duration of the block."""
+    connections.close_all()
+    settings_dict = connections.databases['default']
+    saved = {key: settings_dict.get(key) for key in ('NAME', *overrides)}
+    settings_dict.update(NAME=name, **overrides)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        for key, value in saved.items():
+            if value is None:
+                settings_dict.pop(key, None)
+            else:
+                settings_dict[key] = value
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Compare lock waits of concurrent posting and report reads under the default and production SQLite profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each profile run')
+        parser.add_argument('--history', type=int, default=20000, help='Seeded transactions')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite_concurrency requires SQLite')
+
+        workdir = tempfile.mkdtemp(prefix='sqlite-bench-')
+        try:
+            template = os.path.join(workdir, 'template.sqlite3')
+            with use_database(template, SQLITE_PRAGMAS={}):
+                call_command('migrate', verbosity=0)
+                data = seed_dataset(transactions=options['history'])
+                fixtures = {
+                    'products': [product.pk for product in data['products']],
+                    'users': [user.pk for user in data['merchants'] + data['representatives']],
+                }
+
+            for profile, overrides in PROFILES.items():
+                path = os.path.join(workdir, f'{profile}.sqlite3')
+                shutil.copyfile(template, path)
+                overrides = {
+                    **overrides,
+                    'SQLITE_PRAGMAS': overrides['SQLITE_PRAGMAS']
+                    if overrides['SQLITE_PRAGMAS'] is not None else settings.SQLITE_PRAGMAS,
+                }
+                with use_database(path, **overrides):
+                    result = self.run_profile(fixtures, options)
+                self.report(profile, result, options['seconds'])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_profile(self, fixtures, options):
+        """Run writer and reader processes side by side and collect per-operation latencies."""
+        # Separate processes, like web workers next to a Celery worker, so the
+        # GIL does not serialize the clients and only SQLite locking remains
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        deadline = time.time() + options['seconds']
+        result = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+
+        def write():
+            user = User.objects.get(pk=random.choice(fixtures['users']))
+            lines = [(product_id, random.randint(1, 3))
+                     for product_id in random.sample(fixtures['products'], 3)]
+            post_transaction(user, 'take', lines)
+
+        def read():
+            since = timezone.now() - timedelta(days=30)
+            list(Transaction.objects.filter(date__gte=since).values('type').annotate(
+                total=Sum('amount'), count=Count('id')))
+            list(Transaction.objects.select_related('user').order_by('-date')[:50])
+            Product.objects.filter(stock__lt=10).count()
+
+        def worker(kind, operation):
+            random.seed()
+            latencies, errors = [], 0
+            try:
+                while time.time() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - start)
+                    # Request boundary: reconnects unless CONN_MAX_AGE keeps the connection
+                    close_old_connections()
+            finally:
+                connections.close_all()
+            queue.put((kind, latencies, errors))
+
+        connections.close_all()
+        workers = [context.Process(target=worker, args=('write', write)) for _ in range(options['writers'])]
+        workers += [context.Process(target=worker, args=('read', read)) for _ in range(options['readers'])]
+        for process in workers:
+            process.start()
+        for _ in workers:
+            kind, latencies, errors = queue.get()
+            result[kind].extend(latencies)
+            result[f'{kind}_errors'] += errors
+        for process in workers:
+            process.join()
+        return result
+
+    def report(self, profile, result, seconds):
+        for kind in ('write', 'read'):
+            latencies = result[kind]
+            self.stdout.write(
+                f'{profile:>10} {kind:>5}: {len(latencies) / seconds:8.1f} ops/s, '
+                f'p50 {statistics.median(latencies or [0]) * 1000:7.1f} ms, '
+                f'p95 {percentile(latencies, 0.95) * 1000:7.1f} ms, '
+                f'max {max(latencies or [0]) * 1000:7.1f} ms, '
+                f'{result[f"{kind}_errors"]} locked'
+            )
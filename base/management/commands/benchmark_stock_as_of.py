@@ -0,0 +1,45 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import StockMovement
+from base.stock import stock_as_of, create_stock_checkpoints
+from ._bench import rolled_back, measure, seed_catalog
+
+
+class Command(BaseCommand):
+    help = 'Benchmark point-in-time stock queries with and without checkpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--movements', type=int, default=100, help='Movements per product')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        # Everything runs in one transaction that is rolled back at the end
+        with rolled_back():
+            products = seed_catalog(options['products'])
+            StockMovement.objects.bulk_create([
+                StockMovement(
+                    product=product,
+                    quantity=random.randint(-5, 5),
+                    reason='adjustment',
+                    date=now - timedelta(days=random.randint(1, 365)),
+                )
+                for product in products
+                for _ in range(options['movements'])
+            ], batch_size=5000)
+            product_ids = [product.pk for product in products]
+
+            full, _ = measure(lambda: stock_as_of(product_ids, now))
+            create_stock_checkpoints(now - timedelta(days=7))
+            checkpointed, queries = measure(lambda: stock_as_of(product_ids, now))
+
+            self.stdout.write(
+                f'{len(product_ids)} products x {options["movements"]} movements: '
+                f'full replay {full * 1000:.1f} ms, '
+                f'from checkpoint {checkpointed * 1000:.1f} ms ({queries:.0f} queries)'
+            )
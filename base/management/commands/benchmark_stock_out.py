@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from base.forecasting import FORECAST_BANDS, stock_out_dates
+
+
+def loop_stock_out(forecast, stock):
+    """The previous per-row walk over a forecast frame for one product and band."""
+    total = 0
+    for _, row in forecast.iterrows():
+        total += max(row['yhat'], 0)
+        if total >= stock:
+            return row['ds']
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the vectorized stock-out search against the per-row loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--horizon', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        products, horizon = options['products'], options['horizon']
+
+        yhat = rng.normal(5, 3, size=(products, horizon))
+        spread = rng.uniform(0, 2, size=(products, horizon))
+        forecasts = np.stack([yhat, yhat - spread, yhat + spread], axis=2)
+        stocks = rng.integers(0, int(horizon * 6), size=products)
+        starts = pd.Timestamp.now().normalize() + pd.to_timedelta(rng.integers(0, 60, size=products), unit='D')
+        ds = np.stack([pd.date_range(start, periods=horizon, freq='D').to_numpy() for start in starts])
+
+        frames = [
+            {
+                name: pd.DataFrame({'ds': ds[row], 'yhat': forecasts[row, :, band]})
+                for band, name in enumerate(('date', 'lower', 'upper'))
+            }
+            for row in range(products)
+        ]
+
+        start = time.perf_counter()
+        looped = [
+            {name: loop_stock_out(frame, stocks[row]) for name, frame in bands.items()}
+            for row, bands in enumerate(frames)
+        ]
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorized = stock_out_dates(ds, forecasts, stocks)
+        vector_seconds = time.perf_counter() - start
+
+        mismatched = 0
+        for row, expected in enumerate(looped):
+            for name, date in expected.items():
+                actual = vectorized[name][row]
+                if (date is None) != np.isnat(actual) or (date is not None and pd.Timestamp(actual) != date):
+                    mismatched += 1
+        self.stdout.write(
+            f'{products} products x {horizon} days x {len(FORECAST_BANDS)} bands, {mismatched} mismatched'
+        )
+
+        self.stdout.write(f'{"mode":>12} {"ms":>10}')
+        self.stdout.write(f'{"loop":>12} {loop_seconds * 1000:>10.1f}')
+        self.stdout.write(f'{"vectorized":>12} {vector_seconds * 1000:>10.1f}')
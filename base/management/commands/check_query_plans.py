@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from base.query_plans import find_full_scans
+from ._bench import rolled_back, seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Fail when a hot query falls back to a full table scan on a seeded dataset (SQLite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=20000)
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans uses EXPLAIN QUERY PLAN and requires SQLite')
+
+        def verbose(label, sql):
+            self.stdout.write(f'{label}: {sql[:160]}')
+
+        # Everything runs in one transaction that is rolled back at the end
+        with rolled_back():
+            data = seed_dataset(transactions=options['transactions'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            violations, checked = find_full_scans(data, verbose if options['verbose_plans'] else None)
+
+        for label, table, detail, sql in violations:
+            self.stdout.write(self.style.ERROR(f'{label}: full scan of {table} ({detail})'))
+            self.stdout.write(f'    {sql[:300]}')
+
+        if violations:
+            raise CommandError(f'{len(violations)} full table scans in {checked} queries')
+        self.stdout.write(self.style.SUCCESS(f'No full table scans in {checked} queries'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from base.stock import create_stock_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Write a stock checkpoint row for every product'
+
+    def handle(self, *args, **kwargs):
+        created = create_stock_checkpoints()
+        self.stdout.write(self.style.SUCCESS(f'Created {created} stock checkpoints'))
@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.archive import close_period
+
+
+class Command(BaseCommand):
+    help = 'Move transactions dated before a cutoff into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat,
+                            help='First day that stays live (YYYY-MM-DD)')
+        parser.add_argument('--keep-days', type=int, default=730,
+                            help='Used when --before is omitted: keep this many days live')
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or timezone.localdate() - timedelta(days=options['keep_days'])
+        try:
+            period = close_period(cutoff)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {period.transactions} transactions and {period.items} items before {cutoff}'
+        ))
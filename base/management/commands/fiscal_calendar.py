@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base.fiscal import build_calendar
+from base.models import DataVersion, FiscalPeriod
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the persisted fiscal calendar with periods starting on a given day of the month'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--first-day', type=int, required=True,
+                            help='Day of the month fiscal periods start on (1-28)')
+        parser.add_argument('--from-year', type=int,
+                            help='First calendar year covered (defaults to the oldest transaction)')
+        parser.add_argument('--to-year', type=int,
+                            help='Last calendar year covered (defaults to a few years ahead)')
+
+    def handle(self, *args, **options):
+        try:
+            periods = build_calendar(options['first_day'], options['from_year'], options['to_year'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        # Every cached per-period report was grouped by the old boundaries
+        DataVersion.bump(FiscalPeriod.objects.values_list('start', flat=True).first() or timezone.localdate())
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {periods} fiscal periods starting on day {options["first_day"]}'
+        ))
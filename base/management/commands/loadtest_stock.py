@@ -0,0 +1,124 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, OperationalError
+
+from base.models import Category, Product, Transaction, TransactionItem, StockMovement
+from base.services import delete_transactions, post_transaction, InsufficientStockError
+from ._bench import seed_user
+
+
+def legacy_take(user, product_id):
+    """Replay the old read-check-save take path for comparison."""
+    product = Product.objects.get(pk=product_id)
+    if product.stock < 1:
+        return False
+    transaction = Transaction(user=user, type='take', amount=product.price)
+    transaction.save(update_totals=False)
+    TransactionItem.objects.bulk_create([
+        TransactionItem(transaction=transaction, date=transaction.date, product=product, quantity=1,
+                        price=product.price, total=product.price)
+    ])
+    product.stock -= 1
+    Product.objects.filter(pk=product_id).update(stock=product.stock)
+    return True
+
+
+def conditional_take(user, product_id):
+    """Take one unit through the posting service."""
+    try:
+        post_transaction(user, 'take', [(product_id, 1)])
+    except InsufficientStockError:
+        return False
+    return True
+
+
+TAKES = {
+    'legacy': legacy_take,
+    'conditional': conditional_take,
+}
+
+
+class Command(BaseCommand):
+    help = 'Hammer one hot product with concurrent takes and verify the final stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['legacy', 'conditional', 'both'], default='both')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--takes', type=int, default=100, help='Takes per thread')
+        parser.add_argument('--stock', type=int, default=None,
+                            help='Initial stock (defaults to half the attempted takes)')
+
+    def handle(self, *args, **options):
+        modes = ['legacy', 'conditional'] if options['mode'] == 'both' else [options['mode']]
+        attempts = options['threads'] * options['takes']
+        initial = options['stock'] if options['stock'] is not None else attempts // 2
+
+        failures = []
+        for mode in modes:
+            result = self.run_mode(mode, options['threads'], options['takes'], initial)
+            self.stdout.write(
+                f'{mode:>12}: {result["rate"]:8.1f} takes/s, '
+                f'{result["taken"]}/{attempts} accepted, {result["errors"]} lock errors, '
+                f'final stock {result["final"]} (expected {initial - result["taken"]})'
+            )
+            exact = result['final'] == initial - result['taken'] and result['final'] >= 0
+            if mode == 'conditional' and not (exact and result['ledger'] == result['final']):
+                failures.append(mode)
+
+        if failures:
+            raise CommandError('Final stock does not match accepted takes')
+
+    def run_mode(self, mode, threads, takes, initial):
+        """Run one load test round on fresh data and clean it up afterwards."""
+        category = Category.objects.create(name='loadtest', description='loadtest')
+        product = Product.objects.create(
+            name='loadtest', description='', price=Decimal('1.00'), stock=initial, category=category
+        )
+        user = seed_user()
+        take = TAKES[mode]
+        lock = threading.Lock()
+        counts = {'taken': 0, 'errors': 0}
+
+        def worker():
+            try:
+                for _ in range(takes):
+                    try:
+                        taken = take(user, product.pk)
+                    except OperationalError:
+                        with lock:
+                            counts['errors'] += 1
+                        continue
+                    if taken:
+                        with lock:
+                            counts['taken'] += 1
+            finally:
+                connections.close_all()
+
+        try:
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            product.refresh_from_db()
+            ledger = sum(StockMovement.objects.filter(product=product).values_list('quantity', flat=True))
+            return {
+                **counts,
+                'rate': threads * takes / elapsed,
+                'final': product.stock,
+                'ledger': ledger,
+            }
+        finally:
+            if mode == 'legacy':
+                # Legacy takes never reached the rollups or ledgers, so there is nothing to reverse
+                Transaction.objects.filter(user=user).delete()
+            else:
+                delete_transactions(Transaction.objects.filter(user=user))
+            user.delete()
+            category.delete()
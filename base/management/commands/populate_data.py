@@ -5,6 +5,8 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from faker import Faker
 from base.models import Category, Product, User, Transaction, TransactionItem
+from base.rollups import rebuild_rollups
+from base.services import post_transaction
 
 # Initialize Faker with Arabic locale
 fake = Faker(['ar_AA', 'ar_EG', 'ar_SA'])
@@ -63,6 +65,9 @@ class Command(BaseCommand):
         Product.objects.all().delete()
         Category.objects.all().delete()
         User.objects.exclude(is_superuser=True).delete()
+        # The raw deletes above skip the rollup bookkeeping, so rebuild the
+        # rollups from what is left, which also invalidates every cached report
+        rebuild_rollups()
 
         self.stdout.write('Creating realistic data...')
         
@@ -165,23 +170,14 @@ class Command(BaseCommand):
                         k=1
                     )[0]
                 
-                transaction = Transaction.objects.create(
-                    user=user,
-                    type=tx_type,
-                )
+                lines = []
+                amount = None
                 
                 if tx_type in ['take', 'restore']:
                     # Add items
                     num_items = random.randint(1, 4)
                     selected_products = random.sample(all_products, num_items)
-                    
-                    for product in selected_products:
-                        qty = random.randint(1, 5)
-                        TransactionItem.objects.create(
-                            transaction=transaction,
-                            product=product,
-                            quantity=qty
-                        )
+                    lines = [(product, random.randint(1, 5)) for product in selected_products]
                     
                 elif tx_type in ['payment', 'fees']:
                     # Set random amount (Round numbers)
@@ -189,11 +185,7 @@ class Command(BaseCommand):
                     # Add some variance sometimes
                     if random.random() > 0.7:
                          amount += Decimal(random.choice([50, 100, 250]))
-
-                    transaction.amount = amount
-                    transaction.save()
                 
-                # Force update the date at the very end to ensure it sticks
-                Transaction.objects.filter(pk=transaction.pk).update(date=tx_date)
+                post_transaction(user, tx_type, lines, amount=amount, date=tx_date)
 
         self.stdout.write(self.style.SUCCESS('Successfully populated database with realistic Arabic data'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from base.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily rollup tables from scratch'
+
+    def handle(self, *args, **kwargs):
+        written = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rollups: {written["transactions"]} transaction rows, '
+            f'{written["products"]} product rows, {written["users"]} user rows, '
+            f'{written["categories"]} category rows'
+        ))
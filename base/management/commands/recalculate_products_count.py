@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from base.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuild User.products_count from the full transaction item history and archived carry-forwards'
+
+    def handle(self, *args, **kwargs):
+        fixed = 0
+        for user in User.objects.all():
+            previous = user.products_count
+            if user.recalculate_products_count() != previous:
+                fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Recalculated products_count, {fixed} users corrected'))
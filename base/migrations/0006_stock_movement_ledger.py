@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_stock_movements(apps, schema_editor):
+    """Seed the ledger from existing items plus one opening row per product."""
+    Product = apps.get_model('base', 'Product')
+    TransactionItem = apps.get_model('base', 'TransactionItem')
+    StockMovement = apps.get_model('base', 'StockMovement')
+
+    movements = []
+    moved = {}
+    first_dates = {}
+    items = TransactionItem.objects.filter(
+        product__isnull=False,
+        transaction__type__in=['take', 'restore'],
+    ).values_list('product_id', 'transaction_id', 'transaction__type', 'transaction__date', 'quantity')
+
+    for product_id, transaction_id, transaction_type, date, quantity in items.iterator():
+        delta = -quantity if transaction_type == 'take' else quantity
+        movements.append(StockMovement(
+            product_id=product_id,
+            transaction_id=transaction_id,
+            quantity=delta,
+            reason=transaction_type,
+            date=date,
+        ))
+        moved[product_id] = moved.get(product_id, 0) + delta
+        first_dates[product_id] = min(date, first_dates.get(product_id, date))
+
+    # Opening balance so that the ledger sums to the current stock
+    for product_id, stock, created_at in Product.objects.values_list('id', 'stock', 'created_at'):
+        opening = stock - moved.get(product_id, 0)
+        if opening:
+            movements.append(StockMovement(
+                product_id=product_id,
+                quantity=opening,
+                reason='adjustment',
+                date=min(created_at, first_dates.get(product_id, created_at)),
+            ))
+
+    StockMovement.objects.bulk_create(movements, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_product_estimated_stock_out'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='base.product')),
+            ],
+            options={
+                'verbose_name': 'لقطة مخزون',
+                'verbose_name_plural': 'لقطات المخزون',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('reason', models.CharField(choices=[('take', 'أخذ'), ('restore', 'إرجاع'), ('reversal', 'عكس معاملة'), ('adjustment', 'تعديل يدوي')], max_length=10)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='base.product')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='base.transaction')),
+            ],
+            options={
+                'verbose_name': 'حركة مخزون',
+                'verbose_name_plural': 'حركات المخزون',
+                'indexes': [models.Index(fields=['product', 'date'], name='stockmovement_product_date')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='stockcheckpoint_product_date'),
+        ),
+        migrations.RunPython(backfill_stock_movements, migrations.RunPython.noop),
+    ]
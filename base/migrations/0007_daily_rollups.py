@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from base.rollups import rebuild_rollups
+
+
+def populate_rollups(apps, schema_editor):
+    rebuild_rollups(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_stock_movement_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'ملخص يومي للمنتج',
+                'verbose_name_plural': 'ملخصات يومية للمنتجات',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyTransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'ملخص يومي للمعاملات',
+                'verbose_name_plural': 'ملخصات يومية للمعاملات',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyUserRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantity', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'ملخص يومي للمستخدم',
+                'verbose_name_plural': 'ملخصات يومية للمستخدمين',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailytransactionrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'type'), name='dailytransactionrollup_key'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductrollup',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='base.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyuserrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'user', 'type'), name='dailyuserrollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'type'), name='dailyproductrollup_key'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
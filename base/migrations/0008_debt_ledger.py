@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_debt_entries(apps, schema_editor):
+    """Replay merchant takes and payments into the ledger, opening with the drift."""
+    User = apps.get_model('base', 'User')
+    Transaction = apps.get_model('base', 'Transaction')
+    DebtEntry = apps.get_model('base', 'DebtEntry')
+    signs = {'take': 1, 'payment': -1}
+
+    entries = []
+    for user in User.objects.filter(user_type='merchant'):
+        history = list(Transaction.objects.filter(
+            user=user, type__in=signs
+        ).order_by('date', 'id').values_list('id', 'type', 'amount', 'date'))
+
+        # Opening entry reconciles the replayed history with the stored debt
+        replayed = sum(signs[type] * (amount or 0) for _, type, amount, _ in history)
+        balance = user.debt - replayed
+        first_date = min([user.created_at] + [date for _, _, _, date in history])
+        if balance:
+            entries.append(DebtEntry(
+                user=user, amount=balance, balance=balance, reason='adjustment', date=first_date,
+            ))
+
+        for transaction_id, type, amount, date in history:
+            if not amount:
+                continue
+            balance += signs[type] * amount
+            entries.append(DebtEntry(
+                user=user,
+                transaction_id=transaction_id,
+                amount=signs[type] * amount,
+                balance=balance,
+                reason=type,
+                date=date,
+            ))
+
+    DebtEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebtEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('reason', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('reversal', 'عكس معاملة'), ('adjustment', 'تعديل يدوي')], max_length=10)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='debt_entries', to='base.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debt_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'قيد دين',
+                'verbose_name_plural': 'قيود الديون',
+                'indexes': [models.Index(fields=['user', 'date', 'id'], name='debtentry_user_date')],
+            },
+        ),
+        migrations.RunPython(backfill_debt_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_debt_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock'], name='product_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['estimated_stock_out'], name='product_stock_out'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date'], name='transaction_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'date'], name='transaction_type_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date'], name='transaction_user_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionitem',
+            index=models.Index(fields=['product', 'transaction'], name='transactionitem_product_tx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'debt'], name='user_type_debt'),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('date', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'معاملة مؤرشفة',
+                'verbose_name_plural': 'معاملات مؤرشفة',
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cutoff', models.DateField(unique=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'إغلاق فترة',
+                'verbose_name_plural': 'إغلاقات الفترات',
+                'get_latest_by': 'cutoff',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserCarryForward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantity', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carry_forward', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'رصيد مرحل للمستخدم',
+                'verbose_name_plural': 'أرصدة مرحلة للمستخدمين',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductCarryForward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carry_forward', to='base.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_carry_forward', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'رصيد مرحل للمنتج',
+                'verbose_name_plural': 'أرصدة مرحلة للمنتجات',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransactionItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_items', to='base.product')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='base.archivedtransaction')),
+            ],
+            options={
+                'verbose_name': 'عنصر معاملة مؤرشفة',
+                'verbose_name_plural': 'عناصر معاملات مؤرشفة',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='period',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_transactions', to='base.periodclose'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='usercarryforward',
+            constraint=models.UniqueConstraint(fields=('user', 'type'), name='usercarryforward_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='productcarryforward',
+            constraint=models.UniqueConstraint(fields=('product', 'user', 'type'), name='productcarryforward_key'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransactionitem',
+            index=models.Index(fields=['product', 'transaction'], name='archiveditem_product_tx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['date'], name='archivedtx_date'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['user', 'date'], name='archivedtx_user_date'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+def seed_versions(apps, schema_editor):
+    """Create the counters up front so writes only ever need an UPDATE."""
+    DataVersion = apps.get_model('base', 'DataVersion')
+    for name in ('current', 'history'):
+        DataVersion.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_period_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'إصدار البيانات',
+                'verbose_name_plural': 'إصدارات البيانات',
+            },
+        ),
+        migrations.RunPython(seed_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:19
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_day', models.DateField()),
+                ('end_day', models.DateField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')], default='pending', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'تقرير في الخلفية',
+                'verbose_name_plural': 'تقارير في الخلفية',
+                'indexes': [models.Index(fields=['start_day', 'end_day', 'version'], name='reportjob_window')],
+            },
+        ),
+    ]
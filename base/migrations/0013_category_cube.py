@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:29
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def backfill_category_cube(apps, schema_editor):
+    """Regroup the existing product rollup rows by each product's category."""
+    DailyProductRollup = apps.get_model('base', 'DailyProductRollup')
+    DailyCategoryRollup = apps.get_model('base', 'DailyCategoryRollup')
+    DailyCategoryRollup.objects.bulk_create([
+        DailyCategoryRollup(
+            day=row['day'],
+            category_id=row['product__category_id'],
+            type=row['type'],
+            quantity=row['quantity'] or 0,
+            total=row['total'] or 0,
+        )
+        for row in DailyProductRollup.objects.values('day', 'product__category_id', 'type').annotate(
+            quantity=Sum('quantity'), total=Sum('total')
+        ).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_report_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('take', 'أخذ'), ('payment', 'دفع'), ('restore', 'إرجاع'), ('fees', 'منصرف')], max_length=10)),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'ملخص يومي للفئة',
+                'verbose_name_plural': 'ملخصات يومية للفئات',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductrollup',
+            index=models.Index(fields=['product', 'day'], name='dailyproductrollup_product'),
+        ),
+        migrations.AddField(
+            model_name='dailycategoryrollup',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='base.category'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycategoryrollup',
+            index=models.Index(fields=['category', 'day'], name='dailycategoryrollup_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategoryrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'category', 'type'), name='dailycategoryrollup_key'),
+        ),
+        migrations.RunPython(backfill_category_cube, migrations.RunPython.noop),
+    ]
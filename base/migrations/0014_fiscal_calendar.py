@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from base.constants import FISCAL_MONTH_START
+from base.fiscal import build_calendar
+
+
+def seed_calendar(apps, schema_editor):
+    """Build the calendar from the oldest transaction onwards with the default first day."""
+    build_calendar(FISCAL_MONTH_START, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_category_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FiscalDay',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'verbose_name': 'يوم مالي',
+                'verbose_name_plural': 'الأيام المالية',
+            },
+        ),
+        migrations.CreateModel(
+            name='FiscalPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField(unique=True)),
+                ('end', models.DateField(unique=True)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('number', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'verbose_name': 'فترة مالية',
+                'verbose_name_plural': 'الفترات المالية',
+                'ordering': ['start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='fiscalperiod',
+            constraint=models.UniqueConstraint(fields=('year', 'number'), name='fiscalperiod_key'),
+        ),
+        migrations.AddField(
+            model_name='fiscalday',
+            name='period',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='base.fiscalperiod'),
+        ),
+        migrations.RunPython(seed_calendar, migrations.RunPython.noop),
+    ]
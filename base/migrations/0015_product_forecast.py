@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_fiscal_calendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='base.product')),
+                ('fitted_at', models.DateTimeField()),
+                ('last_item_id', models.PositiveBigIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('forecast', models.JSONField(default=dict)),
+                ('stock_out_lower', models.DateTimeField(blank=True, null=True)),
+                ('stock_out_upper', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'توقع المنتج',
+                'verbose_name_plural': 'توقعات المنتجات',
+            },
+        ),
+    ]
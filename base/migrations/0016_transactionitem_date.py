@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_item_dates(apps, schema_editor):
+    """Copy every item's transaction date onto the item."""
+    Transaction = apps.get_model('base', 'Transaction')
+    TransactionItem = apps.get_model('base', 'TransactionItem')
+    TransactionItem.objects.update(date=Subquery(
+        Transaction.objects.filter(pk=OuterRef('transaction_id')).values('date')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_product_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionitem',
+            name='date',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_item_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='transactionitem',
+            name='date',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='transactionitem',
+            index=models.Index(fields=['product', 'date', 'id'], name='transactionitem_product_date'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_transactionitem_date'),
+    ]
+
+    operations = [
+        # Item based marks never match a rollup mark, so every product is refitted once
+        migrations.RemoveField(
+            model_name='productforecast',
+            name='items',
+        ),
+        migrations.RemoveField(
+            model_name='productforecast',
+            name='last_item_id',
+        ),
+        migrations.AddField(
+            model_name='productforecast',
+            name='mark',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -1,9 +1,111 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models import Sum
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum, F, Q, Case, When, Value
+from django.utils import timezone
 from decimal import Decimal
 
 
+class PostingError(Exception):
+    """Raised when a transaction cannot be posted."""
+
+
+class InsufficientStockError(PostingError):
+    """Raised when a stock decrement exceeds the available stock."""
+
+    def __init__(self, product):
+        self.product = product
+        name = product.name if product else ''
+        super().__init__(f'الكمية المطلوبة من {name} غير متوفرة')
+
+
+class _StockShortage(Exception):
+    """Internal signal used to roll back a partially matched stock update."""
+
+
+# Keys per conditional UPDATE; SQLite caps expression depth at 1000 and every
+# key adds one OR branch to the WHERE clause
+UPDATE_BATCH_SIZE = 200
+
+
+def _batches(mapping, size=UPDATE_BATCH_SIZE):
+    """Split a mapping into dicts of at most size entries."""
+    items = list(mapping.items())
+    for start in range(0, len(items), size):
+        yield dict(items[start:start + size])
+
+
+class RollupManager(models.Manager):
+    """Manager that applies signed deltas to rollup rows identified by key fields."""
+
+    def increment(self, key_fields, deltas):
+        """
+        Add deltas to rollup rows, creating missing rows first.
+
+        Args:
+            key_fields: Names of the fields that identify a rollup row
+            deltas: Mapping of key tuples to {field: signed delta}
+        """
+        deltas = {key: values for key, values in deltas.items() if any(values.values())}
+        if not deltas:
+            return
+
+        def key_filter(key):
+            return Q(**dict(zip(key_fields, key)))
+
+        # Insert any missing rows, then add every delta in a single UPDATE
+        self.bulk_create(
+            [self.model(**dict(zip(key_fields, key))) for key in deltas],
+            ignore_conflicts=True,
+        )
+        for batch in _batches(deltas):
+            condition = Q()
+            for key in batch:
+                condition |= key_filter(key)
+            fields = {field for values in batch.values() for field in values}
+            self.filter(condition).update(**{
+                field: F(field) + Case(
+                    *[When(key_filter(key), then=Value(values.get(field, 0))) for key, values in batch.items()],
+                    default=Value(0),
+                    output_field=self.model._meta.get_field(field),
+                )
+                for field in fields
+            })
+
+
+class ProductRollupManager(RollupManager):
+    """Rollup manager for the product rollup that keeps the category cube in step."""
+
+    def increment(self, key_fields, deltas, categories=None):
+        """
+        Add deltas to product rollup rows and the same deltas to their categories.
+
+        Args:
+            key_fields: Must be ('day', 'product_id', 'type')
+            deltas: Mapping of (day, product_id, type) to {'quantity', 'total'} deltas
+            categories: Mapping of product_id to category_id when the caller
+                already loaded the products (fetched otherwise)
+        """
+        super().increment(key_fields, deltas)
+        if not deltas:
+            return
+
+        if categories is None:
+            categories = dict(Product.objects.filter(
+                pk__in={product_id for _, product_id, _ in deltas}
+            ).values_list('pk', 'category_id'))
+        category_deltas = {}
+        for (day, product_id, type), values in deltas.items():
+            if product_id not in categories:
+                continue
+            totals = category_deltas.setdefault(
+                (day, categories[product_id], type), {'quantity': 0, 'total': Decimal('0.00')}
+            )
+            totals['quantity'] += values.get('quantity', 0)
+            totals['total'] += values.get('total', 0)
+        DailyCategoryRollup.objects.increment(('day', 'category_id', 'type'), category_deltas)
+
+
 class Category(models.Model):
     """Product category model."""
     
@@ -35,11 +137,41 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Save the product, recording manual stock changes in the movement ledger
+        and moving its history in the category cube when the category changes.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'stock', 'category', 'category_id'} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        with db_transaction.atomic():
+            previous = {'stock': 0, 'category_id': self.category_id}
+            if self.pk is not None:
+                previous = Product.objects.filter(pk=self.pk).values(
+                    'stock', 'category_id'
+                ).first() or previous
+            super().save(*args, **kwargs)
+            if self.stock != previous['stock'] and (update_fields is None or 'stock' in update_fields):
+                StockMovement.objects.create(
+                    product=self,
+                    quantity=self.stock - previous['stock'],
+                    reason='adjustment',
+                )
+            if self.category_id != previous['category_id']:
+                DailyCategoryRollup.shift_product(self.pk, previous['category_id'], self.category_id)
+
+    def delete(self, *args, **kwargs):
+        """Delete the product and take its history out of the category cube."""
+        with db_transaction.atomic():
+            DailyCategoryRollup.shift_product(self.pk, self.category_id, None)
+            return super().delete(*args, **kwargs)
+
     @property
     def days_until_stock_out(self):
         """Calculate days until estimated stock out."""
         if self.estimated_stock_out:
-            from django.utils import timezone
             delta = self.estimated_stock_out - timezone.now()
             return max(delta.days, 0)
         return None
@@ -47,6 +179,10 @@ class Product(models.Model):
     class Meta:
         verbose_name = "المنتج"
         verbose_name_plural = "المنتجات"
+        indexes = [
+            models.Index(fields=['stock'], name='product_stock'),
+            models.Index(fields=['estimated_stock_out'], name='product_stock_out'),
+        ]
 
 
 USER_TYPES = (
@@ -75,9 +211,47 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} - {self.user_type}"
 
+    def adjust_debt(self, delta, transaction=None, reason='adjustment', date=None):
+        """Apply a signed change to debt and append it to the debt ledger."""
+        if not delta:
+            return
+        with db_transaction.atomic():
+            # The row update also serializes concurrent ledger writes for this user
+            User.objects.filter(pk=self.pk).update(debt=F('debt') + delta)
+            DebtEntry.record(self, delta, transaction=transaction, reason=reason, date=date)
+        self.debt += delta
+
+    def adjust_products_count(self, delta):
+        """Apply a signed change to products_count without re-reading history."""
+        if not delta:
+            return
+        User.objects.filter(pk=self.pk).update(products_count=F('products_count') + delta)
+        self.products_count += delta
+
+    def recalculate_products_count(self):
+        """Recompute products_count from the full item history (repair path only)."""
+        totals = TransactionItem.objects.filter(transaction__user=self).aggregate(
+            taken=Sum('quantity', filter=Q(transaction__type='take')),
+            restored=Sum('quantity', filter=Q(transaction__type='restore')),
+        )
+        # Quantities of archived periods are kept as carry-forward rows
+        carried = self.carry_forward.aggregate(
+            taken=Sum('quantity', filter=Q(type='take')),
+            restored=Sum('quantity', filter=Q(type='restore')),
+        )
+        self.products_count = (
+            (totals['taken'] or 0) - (totals['restored'] or 0)
+            + (carried['taken'] or 0) - (carried['restored'] or 0)
+        )
+        User.objects.filter(pk=self.pk).update(products_count=self.products_count)
+        return self.products_count
+
     class Meta:
         verbose_name = "المستخدم"
         verbose_name_plural = "المستخدمين"
+        indexes = [
+            models.Index(fields=['user_type', 'debt'], name='user_type_debt'),
+        ]
 
 
 TRANSACTION_TYPES = (
@@ -87,6 +261,24 @@ TRANSACTION_TYPES = (
     ('fees', 'منصرف')
 )
 
+# Sign applied to item quantities when moving Product.stock
+STOCK_SIGN = {
+    'take': -1,
+    'restore': 1,
+}
+
+# Sign applied to transaction amounts when maintaining a merchant's debt
+DEBT_SIGN = {
+    'take': 1,
+    'payment': -1,
+}
+
+# Sign applied to item quantities when maintaining User.products_count
+PRODUCTS_COUNT_SIGN = {
+    'take': 1,
+    'restore': -1,
+}
+
 
 class Transaction(models.Model):
     """Transaction model for tracking product movements and payments."""
@@ -111,12 +303,68 @@ class Transaction(models.Model):
             return f"{self.get_type_display()} - {self.amount}"
         return f"{self.get_type_display()} - {self.user.username if self.user else 'Unknown'}"
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, update_totals=True, **kwargs):
+        is_new = self.pk is None
+        previous_amount = Decimal('0.00')
+        if not is_new and update_totals:
+            previous_amount = Transaction.objects.filter(pk=self.pk).values_list(
+                'amount', flat=True
+            ).first() or Decimal('0.00')
         super().save(*args, **kwargs)
-        self.update_totals()
+        if update_totals:
+            self.update_totals(previous_amount)
+            if is_new:
+                self.update_rollups(count=1, amount=self.amount or Decimal('0.00'))
+            elif self.type not in STOCK_SIGN and (self.amount or Decimal('0.00')) != previous_amount:
+                # Edited payment/fees amounts; take/restore totals move with their items
+                self.update_rollups(amount=(self.amount or Decimal('0.00')) - previous_amount)
+
+    def update_rollups(self, count=0, amount=Decimal('0.00'), lines=(), categories=None):
+        """
+        Add signed deltas to the daily rollups for this transaction's day.
+
+        Args:
+            count: Change in the number of transactions (1 on create, -1 on delete)
+            amount: Change in the transaction amount
+            lines: Iterable of (product_id, quantity, total) signed item deltas
+            categories: Optional mapping of the lines' product_id to category_id
+        """
+        day = timezone.localdate(self.date)
+        quantity = 0
+        product_deltas = {}
+        for product_id, item_quantity, item_total in lines:
+            quantity += item_quantity
+            if product_id:
+                deltas = product_deltas.setdefault(
+                    (day, product_id, self.type), {'quantity': 0, 'total': Decimal('0.00')}
+                )
+                deltas['quantity'] += item_quantity
+                deltas['total'] += item_total or Decimal('0.00')
+
+        DataVersion.bump(day)
+        DailyTransactionRollup.objects.increment(
+            ('day', 'type'), {(day, self.type): {'count': count, 'amount': amount}}
+        )
+        DailyProductRollup.objects.increment(('day', 'product_id', 'type'), product_deltas, categories)
+        if self.user_id:
+            DailyUserRollup.objects.increment(
+                ('day', 'user_id', 'type'),
+                {(day, self.user_id, self.type): {'count': count, 'amount': amount, 'quantity': quantity}},
+            )
+
+    def update_totals(self, previous_amount=None):
+        """
+        Update transaction amount and apply the resulting change to user debt.
+
+        Args:
+            previous_amount: Amount already reflected in the user's debt
+                (defaults to the amount currently stored for this transaction)
+        """
+        if previous_amount is None:
+            previous_amount = Transaction.objects.filter(pk=self.pk).values_list(
+                'amount', flat=True
+            ).first() or Decimal('0.00')
 
-    def update_totals(self):
-        """Update transaction amount and user debt/product counts."""
         # Update amount by calculating total from TransactionItems for 'take' and 'restore'
         if self.type in ['take', 'restore']:
             total = self.items.aggregate(total=Sum('total'))['total']
@@ -125,64 +373,30 @@ class Transaction(models.Model):
             self.products.set(product_ids)
             Transaction.objects.filter(pk=self.pk).update(amount=self.amount)
 
-        # Update user debt for merchants
-        if self.user and self.user.user_type == 'merchant':
-            if self.type == 'take':
-                self.user.debt += self.amount if self.amount else Decimal('0.00')
-            elif self.type == 'payment':
-                self.user.debt -= self.amount if self.amount else Decimal('0.00')
-            self.user.save()
-
-        # Update products_count for all users based on current transaction items
-        if self.user:
-            self._update_user_products_count()
-
-    def _update_user_products_count(self, exclude_self=False):
-        """Helper method to recalculate user's product count."""
-        base_query = TransactionItem.objects.filter(transaction__user=self.user)
-        
-        if exclude_self:
-            base_query = base_query.exclude(transaction=self)
-        
-        total_products = base_query.filter(
-            transaction__type='take'
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        restored_products = base_query.filter(
-            transaction__type='restore'
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        self.user.products_count = total_products - restored_products
-        self.user.save()
+        # Update user debt for merchants by the change in amount only
+        if self.user and self.user.user_type == 'merchant' and self.type in DEBT_SIGN:
+            self.user.adjust_debt(
+                DEBT_SIGN[self.type] * ((self.amount or Decimal('0.00')) - previous_amount),
+                transaction=self,
+                reason=self.type,
+            )
 
     def delete(self, *args, **kwargs):
         """Reverse stock and debt changes when deleting a transaction."""
-        # Reverse stock changes for all items in this transaction
-        for item in self.items.all():
-            if item.product:
-                if self.type == 'take':
-                    item.product.stock += item.quantity
-                elif self.type == 'restore':
-                    item.product.stock -= item.quantity
-                item.product.save()
-
-        # Reverse debt changes for merchants
-        if self.user and self.user.user_type == 'merchant':
-            if self.type == 'take':
-                self.user.debt -= self.amount if self.amount else Decimal('0.00')
-            elif self.type == 'payment':
-                self.user.debt += self.amount if self.amount else Decimal('0.00')
-            self.user.save()
-
-        # Update products_count after deletion
-        if self.user:
-            self._update_user_products_count(exclude_self=True)
+        from base.services import delete_transactions
 
-        super().delete(*args, **kwargs)
+        result = delete_transactions(Transaction.objects.filter(pk=self.pk))
+        self.pk = None
+        return result
 
     class Meta:
         verbose_name = "معاملة"
         verbose_name_plural = "معاملات"
+        indexes = [
+            models.Index(fields=['date'], name='transaction_date'),
+            models.Index(fields=['type', 'date'], name='transaction_type_date'),
+            models.Index(fields=['user', 'date'], name='transaction_user_date'),
+        ]
 
 
 class TransactionItem(models.Model):
@@ -202,15 +416,22 @@ class TransactionItem(models.Model):
     quantity = models.IntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Copy of transaction.date so a product's history pages along one index
+    date = models.DateTimeField(editable=False)
 
+    @db_transaction.atomic
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        if self.date is None:
+            self.date = self.transaction.date
         old_quantity = 0
+        old_line = None
 
         if not is_new:
             try:
                 old_item = TransactionItem.objects.get(pk=self.pk)
                 old_quantity = old_item.quantity
+                old_line = (old_item.product_id, -old_item.quantity, -(old_item.total or Decimal('0.00')))
             except TransactionItem.DoesNotExist:
                 is_new = True
 
@@ -219,40 +440,728 @@ class TransactionItem(models.Model):
             self.price = self.product.price
             self.total = Decimal(self.price) * Decimal(self.quantity)
 
-            # Only adjust stock if quantity changed
-            quantity_diff = self.quantity - old_quantity
-            if quantity_diff != 0:
-                if self.transaction.type == 'take':
-                    self.product.stock -= quantity_diff
-                elif self.transaction.type == 'restore':
-                    self.product.stock += quantity_diff
-                self.product.save()
-
         super().save(*args, **kwargs)
 
-        # Update parent transaction totals
+        # Only adjust stock if quantity changed
+        quantity_diff = self.quantity - old_quantity
+        if self.product_id and quantity_diff and self.transaction.type in STOCK_SIGN:
+            StockMovement.apply(
+                {self.product_id: STOCK_SIGN[self.transaction.type] * quantity_diff},
+                transaction=self.transaction,
+                reason=self.transaction.type,
+            )
+
+        # Apply the quantity change to the user's products_count
+        user = self.transaction.user if self.transaction else None
+        if user:
+            user.adjust_products_count(
+                PRODUCTS_COUNT_SIGN.get(self.transaction.type, 0) * (self.quantity - old_quantity)
+            )
+
+        # Update parent transaction totals and rollups
         if self.transaction:
             self.transaction.update_totals()
+            lines = [(self.product_id, self.quantity, self.total or Decimal('0.00'))]
+            if old_line:
+                lines.append(old_line)
+            self.transaction.update_rollups(amount=sum(line[2] for line in lines), lines=lines)
 
+    @db_transaction.atomic
     def delete(self, *args, **kwargs):
         """Reverse stock changes when deleting an item."""
-        if self.product:
-            if self.transaction.type == 'take':
-                self.product.stock += self.quantity
-            elif self.transaction.type == 'restore':
-                self.product.stock -= self.quantity
-            self.product.save()
-
         transaction = self.transaction
+        if self.product_id and transaction.type in STOCK_SIGN:
+            StockMovement.apply(
+                {self.product_id: -STOCK_SIGN[transaction.type] * self.quantity},
+                transaction=transaction,
+                reason='reversal',
+            )
+
         super().delete(*args, **kwargs)
 
-        # Update parent transaction totals after deletion
+        # Remove the item's quantity from the user's products_count
+        if transaction and transaction.user:
+            transaction.user.adjust_products_count(
+                -PRODUCTS_COUNT_SIGN.get(transaction.type, 0) * self.quantity
+            )
+
+        # Update parent transaction totals and rollups after deletion
         if transaction:
             transaction.update_totals()
+            total = self.total or Decimal('0.00')
+            transaction.update_rollups(amount=-total, lines=[(self.product_id, -self.quantity, -total)])
 
     def __str__(self):
         return self.product.name if self.product else "Unknown Product"
 
     class Meta:
         verbose_name = "عنصر معاملة"
-        verbose_name_plural = "عناصر معاملات"
\ No newline at end of file
+        verbose_name_plural = "عناصر معاملات"
+        indexes = [
+            models.Index(fields=['product', 'transaction'], name='transactionitem_product_tx'),
+            models.Index(fields=['product', 'date', 'id'], name='transactionitem_product_date'),
+        ]
+
+
+MOVEMENT_REASONS = (
+    ('take', 'أخذ'),
+    ('restore', 'إرجاع'),
+    ('reversal', 'عكس معاملة'),
+    ('adjustment', 'تعديل يدوي'),
+)
+
+
+class StockMovement(models.Model):
+    """Append-only ledger entry for every change to a product's stock."""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_movements'
+    )
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_movements'
+    )
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=MOVEMENT_REASONS)
+    date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product_id} {self.quantity:+d} ({self.get_reason_display()})"
+
+    @classmethod
+    def apply(cls, deltas, transaction=None, reason='adjustment', date=None):
+        """
+        Move stock by signed per-product deltas and append the ledger rows.
+
+        Args:
+            deltas: Mapping of product_id to signed stock change
+            transaction: Transaction responsible for the change, if any
+            reason: One of the MOVEMENT_REASONS codes
+            date: Movement date (defaults to now)
+
+        Raises:
+            InsufficientStockError: If any product would go below zero, in
+                which case no stock is moved at all
+        """
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        try:
+            with db_transaction.atomic():
+                for batch in _batches(deltas):
+                    # Decrements only match rows that still hold enough stock
+                    guard = Q()
+                    for product_id, delta in batch.items():
+                        if delta < 0:
+                            guard |= Q(pk=product_id, stock__gte=-delta)
+                        else:
+                            guard |= Q(pk=product_id)
+
+                    updated = Product.objects.filter(guard).update(
+                        stock=F('stock') + Case(
+                            *[When(pk=product_id, then=Value(delta)) for product_id, delta in batch.items()],
+                            default=Value(0),
+                            output_field=models.IntegerField(),
+                        )
+                    )
+                    if updated != len(batch):
+                        raise _StockShortage()
+
+                cls.objects.bulk_create([
+                    cls(
+                        product_id=product_id,
+                        transaction=transaction,
+                        quantity=delta,
+                        reason=reason,
+                        date=date or timezone.now(),
+                    )
+                    for product_id, delta in deltas.items()
+                ])
+                if date is not None:
+                    # Back-dated movements invalidate any later checkpoint
+                    StockCheckpoint.objects.filter(product_id__in=deltas, date__gte=date).delete()
+        except _StockShortage:
+            decrements = [product_id for product_id, delta in deltas.items() if delta < 0]
+            products = Product.objects.in_bulk(decrements)
+            short = [
+                products[product_id] for product_id in decrements
+                if product_id in products and products[product_id].stock < -deltas[product_id]
+            ]
+            raise InsufficientStockError(short[0] if short else products.get(decrements[0]))
+
+    class Meta:
+        verbose_name = "حركة مخزون"
+        verbose_name_plural = "حركات المخزون"
+        indexes = [
+            models.Index(fields=['product', 'date'], name='stockmovement_product_date'),
+        ]
+
+
+class StockCheckpoint(models.Model):
+    """Snapshot of a product's stock level, covering all movements up to date."""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_checkpoints'
+    )
+    date = models.DateTimeField()
+    stock = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.date:%Y-%m-%d}: {self.stock}"
+
+    class Meta:
+        verbose_name = "لقطة مخزون"
+        verbose_name_plural = "لقطات المخزون"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='stockcheckpoint_product_date'),
+        ]
+
+
+DEBT_REASONS = (
+    ('take', 'أخذ'),
+    ('payment', 'دفع'),
+    ('reversal', 'عكس معاملة'),
+    ('adjustment', 'تعديل يدوي'),
+)
+
+
+class DebtEntry(models.Model):
+    """Append-only merchant debt ledger entry carrying the running balance."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='debt_entries'
+    )
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='debt_entries'
+    )
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    reason = models.CharField(max_length=10, choices=DEBT_REASONS)
+    date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user_id} {self.amount:+} = {self.balance}"
+
+    @classmethod
+    def record(cls, user, amount, transaction=None, reason='adjustment', date=None, latest=False):
+        """
+        Append a ledger entry and keep the running balances ordered by date.
+
+        Back-dated entries shift the balance of every later entry, which is a
+        single range update on the (user, date) index. Entries posted at now
+        (no date, or latest=True) have no later entries and skip it.
+        """
+        latest = latest or date is None
+        date = date or timezone.now()
+        previous = cls.objects.filter(user=user, date__lte=date).order_by(
+            '-date', '-id'
+        ).values_list('balance', flat=True).first() or Decimal('0.00')
+        if not latest:
+            cls.objects.filter(user=user, date__gt=date).update(balance=F('balance') + amount)
+        return cls.objects.create(
+            user=user,
+            transaction=transaction,
+            amount=amount,
+            balance=previous + amount,
+            reason=reason,
+            date=date,
+        )
+
+    @classmethod
+    def record_many(cls, rows, reason='adjustment'):
+        """
+        Append many back-dated ledger entries in a fixed number of statements per user.
+
+        Each entry goes after the existing entries of its date, as record()
+        would put it. One read of a user's entries from the earliest new date
+        gives the balances of the new entries, one UPDATE shifts every later
+        entry by the sum of the new amounts dated before it, and all new
+        entries are inserted by one bulk INSERT.
+
+        Args:
+            rows: Iterable of (user_id, date, amount)
+            reason: Reason stored on every new entry
+
+        Returns:
+            The created entries
+        """
+        by_user = {}
+        for user_id, date, amount in rows:
+            by_user.setdefault(user_id, []).append((date, amount))
+
+        created = []
+        for user_id, entries in by_user.items():
+            entries.sort(key=lambda entry: entry[0])
+            start = entries[0][0]
+            existing = list(cls.objects.filter(user_id=user_id, date__gte=start).order_by(
+                'date', 'id'
+            ).values_list('date', 'balance', 'amount'))
+            if existing:
+                balance = existing[0][1] - existing[0][2]
+            else:
+                balance = cls.objects.filter(user_id=user_id, date__lt=start).order_by(
+                    '-date', '-id'
+                ).values_list('balance', flat=True).first() or Decimal('0.00')
+
+            shift = Decimal('0.00')
+            position = 0
+            shifts = []
+            for date, amount in entries:
+                while position < len(existing) and existing[position][0] <= date:
+                    balance = existing[position][1] + shift
+                    position += 1
+                shift += amount
+                balance += amount
+                shifts.append(When(date__gt=date, then=Value(shift)))
+                created.append(cls(user_id=user_id, amount=amount, balance=balance, reason=reason, date=date))
+
+            # Latest date first, so each entry matches the sum of everything dated before it
+            cls.objects.filter(user_id=user_id, date__gt=start).update(balance=F('balance') + Case(
+                *reversed(shifts),
+                default=Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ))
+
+        return cls.objects.bulk_create(created)
+
+    class Meta:
+        verbose_name = "قيد دين"
+        verbose_name_plural = "قيود الديون"
+        indexes = [
+            models.Index(fields=['user', 'date', 'id'], name='debtentry_user_date'),
+        ]
+
+
+class DailyTransactionRollup(models.Model):
+    """Per-day transaction count and amount for each transaction type."""
+
+    day = models.DateField()
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupManager()
+
+    def __str__(self):
+        return f"{self.day} {self.type}: {self.count} / {self.amount}"
+
+    class Meta:
+        verbose_name = "ملخص يومي للمعاملات"
+        verbose_name_plural = "ملخصات يومية للمعاملات"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'type'], name='dailytransactionrollup_key'),
+        ]
+
+
+class DailyProductRollup(models.Model):
+    """Per-day item quantity and total for each product and transaction type."""
+
+    day = models.DateField()
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups'
+    )
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = ProductRollupManager()
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} {self.type}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "ملخص يومي للمنتج"
+        verbose_name_plural = "ملخصات يومية للمنتجات"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'type'], name='dailyproductrollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='dailyproductrollup_product'),
+        ]
+
+
+class DailyCategoryRollup(models.Model):
+    """Category x day x type cube of item quantity and total, kept in step with the product rollup."""
+
+    day = models.DateField()
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups'
+    )
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupManager()
+
+    def __str__(self):
+        return f"{self.day} {self.category_id} {self.type}: {self.quantity}"
+
+    @classmethod
+    def shift_product(cls, product_id, from_category_id, to_category_id):
+        """
+        Move a product's whole rollup history from one category to another.
+
+        Cached reports are invalidated from the product's earliest rollup day.
+
+        Args:
+            product_id: Product whose history moves
+            from_category_id: Category it is taken out of, or None
+            to_category_id: Category it is added to, or None to drop it
+        """
+        deltas = {}
+        for row in DailyProductRollup.objects.filter(product_id=product_id).values(
+            'day', 'type', 'quantity', 'total'
+        ):
+            for category_id, sign in ((from_category_id, -1), (to_category_id, 1)):
+                if category_id is not None:
+                    deltas[(row['day'], category_id, row['type'])] = {
+                        'quantity': sign * row['quantity'], 'total': sign * row['total'],
+                    }
+        if not deltas:
+            return
+        cls.objects.increment(('day', 'category_id', 'type'), deltas)
+        DataVersion.bump(min(day for day, _, _ in deltas))
+
+    class Meta:
+        verbose_name = "ملخص يومي للفئة"
+        verbose_name_plural = "ملخصات يومية للفئات"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'type'], name='dailycategoryrollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'day'], name='dailycategoryrollup_category'),
+        ]
+
+
+class DailyUserRollup(models.Model):
+    """Per-day transaction count, amount and item quantity for each partner."""
+
+    day = models.DateField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups'
+    )
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+
+    objects = RollupManager()
+
+    def __str__(self):
+        return f"{self.day} {self.user_id} {self.type}: {self.count} / {self.amount}"
+
+    class Meta:
+        verbose_name = "ملخص يومي للمستخدم"
+        verbose_name_plural = "ملخصات يومية للمستخدمين"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'type'], name='dailyuserrollup_key'),
+        ]
+
+
+class PeriodClose(models.Model):
+    """A closed period whose transactions were moved into the archive tables."""
+
+    cutoff = models.DateField(unique=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+    transactions = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.cutoff} ({self.transactions})"
+
+    class Meta:
+        verbose_name = "إغلاق فترة"
+        verbose_name_plural = "إغلاقات الفترات"
+        get_latest_by = 'cutoff'
+
+
+class ArchivedTransaction(models.Model):
+    """Transaction moved out of the live tables by a period close, keeping its id."""
+
+    period = models.ForeignKey(
+        PeriodClose,
+        on_delete=models.PROTECT,
+        related_name='archived_transactions'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_transactions'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    date = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.get_type_display()} - {self.amount}"
+
+    class Meta:
+        verbose_name = "معاملة مؤرشفة"
+        verbose_name_plural = "معاملات مؤرشفة"
+        indexes = [
+            models.Index(fields=['date'], name='archivedtx_date'),
+            models.Index(fields=['user', 'date'], name='archivedtx_user_date'),
+        ]
+
+
+class ArchivedTransactionItem(models.Model):
+    """Item of an archived transaction."""
+
+    transaction = models.ForeignKey(
+        ArchivedTransaction,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_items'
+    )
+    quantity = models.IntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+
+    def __str__(self):
+        return self.product.name if self.product else "Unknown Product"
+
+    class Meta:
+        verbose_name = "عنصر معاملة مؤرشفة"
+        verbose_name_plural = "عناصر معاملات مؤرشفة"
+        indexes = [
+            models.Index(fields=['product', 'transaction'], name='archiveditem_product_tx'),
+        ]
+
+
+class UserCarryForward(models.Model):
+    """Archived totals per partner and transaction type, carried into live reports."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='carry_forward'
+    )
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+
+    objects = RollupManager()
+
+    def __str__(self):
+        return f"{self.user_id} {self.type}: {self.count} / {self.amount}"
+
+    class Meta:
+        verbose_name = "رصيد مرحل للمستخدم"
+        verbose_name_plural = "أرصدة مرحلة للمستخدمين"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'type'], name='usercarryforward_key'),
+        ]
+
+
+class ProductCarryForward(models.Model):
+    """Archived item totals per product, partner and transaction type."""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='carry_forward'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='product_carry_forward'
+    )
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupManager()
+
+    def __str__(self):
+        return f"{self.product_id} {self.user_id} {self.type}: {self.quantity}"
+
+    class Meta:
+        verbose_name = "رصيد مرحل للمنتج"
+        verbose_name_plural = "أرصدة مرحلة للمنتجات"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user', 'type'], name='productcarryforward_key'),
+        ]
+
+
+class DataVersion(models.Model):
+    """
+    Counters bumped by every write that can change report results.
+
+    'current' moves on every write; 'history' only when a write lands on a
+    day before today, so cached reports over closed ranges stay valid.
+    """
+
+    CURRENT = 'current'
+    HISTORY = 'history'
+
+    name = models.CharField(max_length=20, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+    @classmethod
+    def bump(cls, day=None):
+        """
+        Invalidate cached reports affected by a write.
+
+        Args:
+            day: Earliest local day touched by the write (defaults to today)
+        """
+        names = [cls.CURRENT]
+        if day is not None and day < timezone.localdate():
+            names.append(cls.HISTORY)
+        if cls.objects.filter(name__in=names).update(version=F('version') + 1) < len(names):
+            for name in names:
+                cls.objects.get_or_create(name=name, defaults={'version': 1})
+
+    @classmethod
+    def current(cls):
+        """Return {name: version} for both counters."""
+        versions = {cls.CURRENT: 0, cls.HISTORY: 0}
+        versions.update(cls.objects.values_list('name', 'version'))
+        return versions
+
+    class Meta:
+        verbose_name = "إصدار البيانات"
+        verbose_name_plural = "إصدارات البيانات"
+
+
+REPORT_JOB_STATUSES = (
+    ('pending', 'في الانتظار'),
+    ('running', 'قيد التنفيذ'),
+    ('done', 'مكتمل'),
+    ('failed', 'فشل'),
+)
+
+
+class ReportJob(models.Model):
+    """A reports page computed in the background, kept so it can be viewed or downloaded later."""
+
+    start_day = models.DateField()
+    end_day = models.DateField()
+    # DataVersion counter the window depended on when the job was requested
+    version = models.PositiveBigIntegerField(default=0)
+    task_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=REPORT_JOB_STATUSES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.start_day} - {self.end_day} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "تقرير في الخلفية"
+        verbose_name_plural = "تقارير في الخلفية"
+        indexes = [
+            models.Index(fields=['start_day', 'end_day', 'version'], name='reportjob_window'),
+        ]
+
+
+class FiscalPeriod(models.Model):
+    """
+    One fiscal month of the persisted fiscal calendar.
+
+    Periods are contiguous and all start on the same day of the month; a
+    period is named after the calendar month holding most of its days.
+    """
+
+    start = models.DateField(unique=True)
+    end = models.DateField(unique=True)
+    year = models.PositiveSmallIntegerField()
+    number = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return self.label
+
+    @property
+    def label(self):
+        return f"{self.year}/{self.number:02d}"
+
+    class Meta:
+        verbose_name = "فترة مالية"
+        verbose_name_plural = "الفترات المالية"
+        ordering = ['start']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'number'], name='fiscalperiod_key'),
+        ]
+
+
+class FiscalDay(models.Model):
+    """Date dimension mapping every calendar day to its fiscal period."""
+
+    day = models.DateField(primary_key=True)
+    period = models.ForeignKey(
+        FiscalPeriod,
+        on_delete=models.CASCADE,
+        related_name='days'
+    )
+
+    def __str__(self):
+        return f"{self.day} ({self.period_id})"
+
+    class Meta:
+        verbose_name = "يوم مالي"
+        verbose_name_plural = "الأيام المالية"
+
+
+class ProductForecast(models.Model):
+    """
+    Latest demand forecast of a product, kept so unchanged products are not refitted.
+
+    mark is the high-water mark of the rollup history the fit saw;
+    fingerprint hashes the series itself, so a refresh only refits
+    products whose demand actually changed.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='forecast'
+    )
+    fitted_at = models.DateTimeField()
+    mark = models.CharField(max_length=64, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    # Future horizon of the fit: {'ds': [...], 'yhat': [...], 'yhat_lower': [...], 'yhat_upper': [...]}
+    forecast = models.JSONField(default=dict)
+    stock_out_lower = models.DateTimeField(null=True, blank=True)
+    stock_out_upper = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.product_id} ({self.fitted_at})"
+
+    class Meta:
+        verbose_name = "توقع المنتج"
+        verbose_name_plural = "توقعات المنتجات"
@@ -0,0 +1,160 @@
+"""Query plan checks for the hot read paths (SQLite).
+
+Runs the views, reports and chat tools that must stay fast as history
+grows, captures every SELECT they issue and flags any query whose plan
+reads a growing table with a full scan. Used by the check_query_plans
+command and the test suite.
+"""
+
+import re
+
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from base.forecasting import load_shard
+from base.views import reports, transactions, partners
+from chat import tools
+
+# Tables that grow with history and must never be read by a full table scan
+GUARDED_TABLES = {
+    'base_transaction',
+    'base_transactionitem',
+    'base_transaction_products',
+    'base_stockmovement',
+    'base_debtentry',
+    'base_dailytransactionrollup',
+    'base_dailyproductrollup',
+    'base_dailyuserrollup',
+    'base_fiscalday',
+    'base_product',
+    'base_user',
+}
+
+# Listings that intentionally return every row of a table
+ALLOWED_SCANS = {
+    'chat.get_products': {'base_product'},
+    'chat.get_users': {'base_user'},
+    'chat.get_products_by_category': {'base_product'},
+    'chat.get_categories': {'base_product'},
+    'chat.get_inventory_stats': {'base_product'},  # catalog valuation sums every product
+    'dashboard.products_list': {'base_product'},
+    'partners.partner_detail': {'base_product'},
+}
+
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$')
+
+LIMIT_RE = re.compile(r'\bLIMIT \d+')
+
+TABLE_COUNT_RE = re.compile(r'^SELECT COUNT\(\*\) AS "__count" FROM "(\w+)"$')
+
+# Unfiltered table totals known to be read in full, by label: pagination and headline counts
+ALLOWED_COUNTS = {
+    'transactions.transactions_view': {'base_transaction'},
+    'chat.get_inventory_stats': {'base_transaction'},
+}
+
+# Catalog size counted by the sidebar_stats context processor on every rendered page
+PAGE_COUNTS = {'base_product'}
+
+
+def full_scans(sql):
+    """Yield (table, plan detail) for every scan in the query plan that reads the whole table."""
+    limited = LIMIT_RE.search(sql) is not None
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        for row in cursor.fetchall():
+            detail = row[-1]
+            match = SCAN_RE.match(detail)
+            # An index scan walks the index in ORDER BY order, which only stops
+            # early at a LIMIT; any other scan reads every row
+            if match and not (limited and match.group(2).startswith((' USING INDEX', ' USING COVERING INDEX'))):
+                yield match.group(1), detail
+
+
+def scenarios(data):
+    """Yield (label, callable) pairs exercising the hot query paths."""
+    factory = RequestFactory()
+    merchant = data['merchants'][0]
+    product = data['products'][0]
+    today = timezone.localdate()
+    year_ago = today.replace(year=today.year - 1)
+    report_range = {'start_date': year_ago.isoformat(), 'end_date': today.isoformat()}
+    xhr = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+    yield 'reports.reports_view', lambda: reports.reports_view(factory.get('/reports/', report_range))
+    yield 'reports.merchant_report', lambda: reports.merchant_report(factory.get('/'), merchant.pk)
+    yield 'reports.merchant_report[statement]', lambda: reports.merchant_report(
+        factory.get('/', {**report_range, 'cursor': '0-0'}, **xhr), merchant.pk)
+    yield 'reports.merchant_report[statement]', lambda: reports.merchant_report(
+        factory.get('/', report_range), merchant.pk)
+    yield 'reports.product_report', lambda: reports.product_report(factory.get('/'), product.pk)
+    yield 'reports.period_comparison_json', lambda: reports.period_comparison_json(
+        factory.get('/', report_range))
+    yield 'reports.time_series_json', lambda: reports.time_series_json(
+        factory.get('/', {**report_range, 'resolution': 'month'}))
+    yield 'reports.category_cube', lambda: reports.category_cube(factory.get('/', report_range))
+    yield 'reports.category_cube[category]', lambda: reports.category_cube(
+        factory.get('/', {**report_range, 'category': product.category_id}))
+    yield 'reports.category_cube[product]', lambda: reports.category_cube(
+        factory.get('/', {**report_range, 'product': product.pk}))
+    yield 'reports.product_report[history]', lambda: reports.product_report(
+        factory.get('/', {'cursor': f'{int(timezone.now().timestamp()) * 10 ** 6}-{2 ** 31}'}, **xhr),
+        product.pk)
+
+    yield 'transactions.transactions_view', lambda: transactions.transactions_view(
+        factory.get('/transactions/'))
+    yield 'transactions.transactions_view[type]', lambda: transactions.transactions_view(
+        factory.get('/transactions/', {'type': 'take', 'page': 2}, **xhr))
+
+    yield 'partners.partners_view', lambda: partners.partners_view(
+        factory.get('/partners/merchant/', **xhr), 'merchant')
+    yield 'partners.partner_detail', lambda: partners.partner_detail(factory.get('/'), merchant.pk)
+
+    yield 'forecasting.load_shard', lambda: load_shard([p.pk for p in data['products'][:25]])
+
+    for name in (
+        'get_categories', 'get_products', 'get_users', 'get_merchants', 'get_representatives',
+        'get_transactions', 'get_transaction_items', 'get_inventory_stats',
+        'get_daily_transactions_summary', 'get_top_products_by_sales',
+        'get_top_merchants_by_debt', 'get_top_merchants_by_transactions',
+        'get_low_stock_alert', 'get_stock_predictions', 'get_products_by_category',
+        'get_monthly_revenue', 'get_monthly_payments', 'get_today_summary',
+    ):
+        yield f'chat.{name}', getattr(tools, name)
+    yield 'chat.get_user_transactions', lambda: tools.get_user_transactions(merchant.pk)
+    yield 'chat.get_product_transactions', lambda: tools.get_product_transactions(product.pk)
+
+
+def find_full_scans(data, verbose=None):
+    """
+    Run every scenario and collect its full table scans of guarded tables.
+
+    Args:
+        data: Dict returned by seed_dataset()
+        verbose: Optional callable given each checked (label, sql)
+
+    Returns:
+        (violations, checked) where violations is a list of
+        (label, table, plan detail, sql) and checked the number of SELECTs
+    """
+    violations = []
+    checked = 0
+    for label, run in scenarios(data):
+        with CaptureQueriesContext(connection) as ctx:
+            run()
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            count = TABLE_COUNT_RE.match(sql)
+            if count and count.group(1) in PAGE_COUNTS | ALLOWED_COUNTS.get(label, set()):
+                continue
+            checked += 1
+            for table, detail in full_scans(sql):
+                if table in GUARDED_TABLES and table not in ALLOWED_SCANS.get(label, set()):
+                    violations.append((label, table, detail, sql))
+            if verbose:
+                verbose(label, sql)
+    return violations, checked
@@ -0,0 +1,520 @@
+"""Report query layer for the reports page.
+
+Every section of the page is computed from the daily rollup tables of one
+date window in a fixed number of queries: one conditional-aggregation pass
+over the transaction rollup feeds the per-type totals, counts and trends,
+the per-fiscal-period totals and the KPI strip (report_summary), and one
+grouped pass per ranking source (partners, products) feeds all of its
+top-N sections.
+
+Computed values are cached by view, entity and date range. Keys embed a
+DataVersion counter, so writes invalidate them: windows that include today
+follow the 'current' counter, closed windows the 'history' counter, which
+only moves when a write lands on a past day. A page reads the counters once
+and passes them to every section.
+
+Fiscal periods and years come from the persisted calendar (base.fiscal).
+
+build_report computes the same page one fiscal period at a time as plain
+data for the background report job used on windows too long to serve
+in-request.
+"""
+
+from bisect import bisect_right
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from base.fiscal import fiscal_year_start, period_for, periods_between
+from base.models import (
+    Category, DailyCategoryRollup, DailyProductRollup, DailyTransactionRollup, DailyUserRollup,
+    DataVersion, Product, TRANSACTION_TYPES, User,
+)
+
+TYPES = [code for code, _ in TRANSACTION_TYPES]
+
+# Windows of the KPI strip, narrowest first
+KPI_WINDOWS = (
+    ('today', 'اليوم'),
+    ('week', 'هذا الأسبوع'),
+    ('month', 'هذا الشهر'),
+    ('year', 'هذه السنة'),
+)
+
+# Safety net for open windows; writes invalidate them long before this
+OPEN_WINDOW_TIMEOUT = 60 * 60
+
+
+def report_version(end_day, versions=None):
+    """
+    Get the DataVersion counter that results for a window ending on end_day depend on.
+
+    Args:
+        end_day: Last local day of the window, or None for up to now
+        versions: DataVersion.current() already read for this request, or None to read it
+
+    Returns:
+        The 'history' counter for closed windows, otherwise 'current'
+    """
+    versions = versions or DataVersion.current()
+    if end_day is not None and end_day < timezone.localdate():
+        return versions[DataVersion.HISTORY]
+    return versions[DataVersion.CURRENT]
+
+
+def cached_report(view, entity, start_day, end_day, compute, versions=None):
+    """
+    Return compute() through the report cache.
+
+    Args:
+        view: Name of the report section
+        entity: Id of the merchant/product the report is about, or None
+        start_day: First local day of the window, or None for all history
+        end_day: Last local day of the window, or None for up to now
+        compute: Callable producing a picklable result
+        versions: DataVersion.current() already read for this request, so a
+            page with several cached sections reads the counters once
+
+    Returns:
+        The cached or freshly computed result
+    """
+    closed = end_day is not None and end_day < timezone.localdate()
+    key = ':'.join(map(str, (
+        'report', view, entity or '-', start_day or '-', end_day or '-',
+        'history' if closed else 'current', report_version(end_day, versions),
+    )))
+
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        # Closed ranges only change when history is rewritten, which changes the key
+        cache.set(key, result, None if closed else OPEN_WINDOW_TIMEOUT)
+    return result
+
+
+def report_summary(start_day, end_day, period=None, versions=None):
+    """
+    Per-type totals, fiscal period totals and the KPI strip of the reports page in one cached pass.
+
+    The per-day transaction rollup is read once over the window together
+    with the KPI windows (back to the start of the fiscal year); the window
+    totals, the per-period totals and every KPI window are all summed from
+    those rows.
+
+    Args:
+        start_day: First local day of the window
+        end_day: Last local day of the window
+        period: Fiscal period containing today, if already looked up
+        versions: DataVersion.current() already read for this request, or None
+
+    Returns:
+        Dict with 'summary' (per-type 'totals' and 'counts', and
+        'daily_trends' as {day, type, total, count} rows ordered by day),
+        'periods' (a {period, start, end, totals} row per fiscal period
+        overlapping the window, clipped to it) and 'kpis' (as kpi_windows())
+    """
+    today = timezone.localdate()
+    starts = _kpi_starts(today, period or period_for(today))
+    first = min(start_day, *starts.values())
+    last = max(end_day, today)
+
+    def compute():
+        rows = _daily_totals(first, last)
+        window = [row for row in rows if start_day <= row['day'] <= end_day]
+        return {
+            'summary': _summarize(window),
+            'periods': _group_periods(window, start_day, end_day),
+            'kpis': _kpis(rows, starts, today),
+        }
+
+    # Keyed on the whole range read so the counter follows the KPI windows, which end today
+    return cached_report('page', f'{start_day}/{end_day}', first, last, compute, versions)
+
+
+def _daily_totals(start_day, end_day):
+    """Per-day rows of the transaction rollup with a <type>_total and <type>_count per type."""
+    aggregates = {}
+    for code in TYPES:
+        aggregates[f'{code}_total'] = Sum('amount', filter=Q(type=code))
+        aggregates[f'{code}_count'] = Sum('count', filter=Q(type=code))
+
+    return list(DailyTransactionRollup.objects.filter(
+        day__gte=start_day, day__lte=end_day
+    ).values('day').annotate(**aggregates).order_by('day'))
+
+
+def _summarize(rows):
+    totals = {code: Decimal('0.00') for code in TYPES}
+    counts = {code: 0 for code in TYPES}
+    daily_trends = []
+    for row in rows:
+        for code in TYPES:
+            total = row[f'{code}_total']
+            count = row[f'{code}_count']
+            if total is None and count is None:
+                continue
+            totals[code] += total or Decimal('0.00')
+            counts[code] += count or 0
+            daily_trends.append({'day': row['day'], 'type': code, 'total': total, 'count': count})
+
+    return {'totals': totals, 'counts': counts, 'daily_trends': daily_trends}
+
+
+def _group_periods(rows, start_day, end_day):
+    """Sum per-day rows into the fiscal periods of the persisted calendar overlapping the window."""
+    periods = periods_between(start_day, end_day)
+    starts = [period.start for period in periods]
+    totals = [{code: Decimal('0.00') for code in TYPES} for _ in periods]
+    for row in rows:
+        index = bisect_right(starts, row['day']) - 1
+        if index < 0:
+            continue
+        for code in TYPES:
+            totals[index][code] += row[f'{code}_total'] or Decimal('0.00')
+
+    return [
+        {
+            'period': period.label,
+            'start': max(period.start, start_day),
+            'end': min(period.end, end_day),
+            'totals': sums,
+        }
+        for period, sums in zip(periods, totals)
+    ]
+
+
+def kpi_windows(today=None, period=None):
+    """
+    Sales, payments, fees, restores and net for several windows ending today, in two queries.
+
+    One query finds the current fiscal period; one range read of the
+    transaction rollup over the widest window (the fiscal year) gives the
+    per-day rows every window is summed from. Weeks start on Monday,
+    'month' is the current fiscal period and 'year' the fiscal year it
+    belongs to.
+
+    Args:
+        today: Local day the windows end on (defaults to today)
+        period: Fiscal period containing today, if already looked up
+
+    Returns:
+        Dict keyed by the KPI_WINDOWS codes, in that order, each holding the
+        window 'label', 'start' and 'end', a {count, total} dict per type,
+        'count' (all types) and 'net' (payments minus fees)
+    """
+    today = today or timezone.localdate()
+    starts = _kpi_starts(today, period or period_for(today))
+    return _kpis(_daily_totals(min(starts.values()), today), starts, today)
+
+
+def _kpi_starts(today, period):
+    return {
+        'today': today,
+        'week': today - timedelta(days=today.weekday()),
+        'month': period.start,
+        'year': fiscal_year_start(period),
+    }
+
+
+def _kpis(rows, starts, today):
+    kpis = {}
+    for window, label in KPI_WINDOWS:
+        kpi = {'label': label, 'start': starts[window], 'end': today}
+        for code in TYPES:
+            kpi[code] = {'count': 0, 'total': Decimal('0.00')}
+        for row in rows:
+            if not starts[window] <= row['day'] <= today:
+                continue
+            for code in TYPES:
+                kpi[code]['count'] += row[f'{code}_count'] or 0
+                kpi[code]['total'] += row[f'{code}_total'] or Decimal('0.00')
+        kpi['count'] = sum(kpi[code]['count'] for code in TYPES)
+        kpi['net'] = kpi['payment']['total'] - kpi['fees']['total']
+        kpis[window] = kpi
+    return kpis
+
+
+def partner_rankings(start_day, end_day, merchants=5, representatives=5, versions=None):
+    """
+    Top merchants by sales and top representatives by quantity taken.
+
+    Both rankings come from one cached grouped pass over the partner
+    rollups; the ranked users are then loaded together so debts are current.
+
+    Returns:
+        Tuple (top_merchants, top_representatives) of annotated User lists
+    """
+    ranked = cached_report(
+        'partners', None, start_day, end_day,
+        lambda: _rank_partners(_partner_totals(start_day, end_day), merchants, representatives),
+        versions,
+    )
+    return _annotate_partners(ranked)
+
+
+def _annotate_partners(ranked):
+    users = User.objects.in_bulk([row['user_id'] for top in ranked.values() for row in top])
+    rankings = []
+    for top in (ranked['merchant'], ranked['representative']):
+        annotated = []
+        for row in top:
+            user = users.get(row['user_id'])
+            if user is None:
+                continue
+            user.total_sales = row['total_sales']
+            user.total_products = row['total_products']
+            annotated.append(user)
+        rankings.append(annotated)
+    return tuple(rankings)
+
+
+def _partner_totals(start_day, end_day):
+    return {
+        row['user_id']: row
+        for row in DailyUserRollup.objects.filter(
+            type='take',
+            day__gte=start_day,
+            day__lte=end_day,
+            user__user_type__in=['merchant', 'representative'],
+        ).values('user_id', 'user__user_type').annotate(
+            total_sales=Sum('amount'),
+            total_products=Sum('quantity'),
+        ).order_by()
+    }
+
+
+def _rank_partners(totals, merchants, representatives):
+    ranked = {'merchant': [], 'representative': []}
+    for row in totals.values():
+        ranked[row['user__user_type']].append(row)
+    ranked['merchant'] = sorted(ranked['merchant'], key=lambda row: row['total_sales'], reverse=True)[:merchants]
+    ranked['representative'] = sorted(
+        ranked['representative'], key=lambda row: row['total_products'], reverse=True
+    )[:representatives]
+    return ranked
+
+
+def product_rankings(start_day, end_day, products=10, versions=None):
+    """
+    Top products by quantity taken and the per-category performance.
+
+    Both sections come from one cached grouped pass over the product
+    rollups; the sold products are then loaded with their categories so
+    stock levels are current.
+
+    Returns:
+        Tuple (top_products, category_performance); categories carry
+        total_sales and total_quantity and are ordered by sales
+    """
+    totals = cached_report(
+        'products', None, start_day, end_day, lambda: _product_totals(start_day, end_day), versions
+    )
+    return _annotate_products(totals, products)
+
+
+def _product_totals(start_day, end_day):
+    return {
+        row['product_id']: row
+        for row in DailyProductRollup.objects.filter(
+            type='take', day__gte=start_day, day__lte=end_day
+        ).values('product_id').annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('total'),
+        ).order_by()
+    }
+
+
+def _annotate_products(totals, products):
+    sold = list(Product.objects.filter(pk__in=list(totals)).select_related('category'))
+    categories = {}
+    for product in sold:
+        product.total_quantity = totals[product.pk]['total_quantity'] or 0
+        product.total_revenue = totals[product.pk]['total_revenue'] or Decimal('0.00')
+        category = categories.setdefault(product.category_id, product.category)
+        category.total_sales = getattr(category, 'total_sales', Decimal('0.00')) + product.total_revenue
+        category.total_quantity = getattr(category, 'total_quantity', 0) + product.total_quantity
+
+    top_products = sorted(sold, key=lambda product: product.total_quantity, reverse=True)[:products]
+    category_performance = sorted(categories.values(), key=lambda category: category.total_sales, reverse=True)
+    return top_products, category_performance
+
+
+def cube_drilldown(start_day, end_day, category_id=None, product_id=None):
+    """
+    One level of the category -> products -> days drill-down, read from the rollups only.
+
+    Without a category the rows are the categories from the category cube;
+    with a category they are its products, and with a product they are the
+    product's days, both from the product rollup. Each level is a grouped
+    range read of at most days x categories (or products) rows.
+
+    Args:
+        start_day: First local day of the window
+        end_day: Last local day of the window
+        category_id: Category to list the products of
+        product_id: Product to list the days of (takes precedence)
+
+    Returns:
+        Dict with the 'level' name and 'data' rows; every row carries
+        quantity and total (a float rounded to 2 places) per transaction
+        type under 'types'
+    """
+    if product_id is not None:
+        level, key = 'days', 'day'
+        rows = DailyProductRollup.objects.filter(product_id=product_id)
+    elif category_id is not None:
+        level, key = 'products', 'product_id'
+        rows = DailyProductRollup.objects.filter(product__category_id=category_id)
+    else:
+        level, key = 'categories', 'category_id'
+        rows = DailyCategoryRollup.objects.all()
+
+    def compute():
+        grouped = {}
+        for row in rows.filter(day__gte=start_day, day__lte=end_day).values(key, 'type').annotate(
+            quantity=Sum('quantity'), total=Sum('total')
+        ).order_by(key):
+            grouped.setdefault(row[key], {})[row['type']] = {
+                'quantity': row['quantity'] or 0,
+                # Serialized like time_series(): a float rounded to 2 places
+                'total': round(float(row['total'] or 0), 2),
+            }
+        return grouped
+
+    entity = f'{category_id or "-"}/{product_id or "-"}'
+    grouped = cached_report('cube', entity, start_day, end_day, compute)
+
+    if level == 'days':
+        return {'level': level, 'data': [
+            {'day': day, 'types': types} for day, types in grouped.items()
+        ]}
+
+    if level == 'products':
+        names = Product.objects.filter(category_id=category_id)
+    else:
+        names = Category.objects.filter(pk__in=list(grouped))
+    names = dict(names.values_list('pk', 'name'))
+    data = [
+        {'id': pk, 'name': names[pk], 'types': types}
+        for pk, types in grouped.items() if pk in names
+    ]
+    data.sort(key=lambda row: row['types'].get('take', {}).get('total', 0), reverse=True)
+    return {'level': level, 'data': data}
+
+
+def _period_chunks(start_day, end_day):
+    """Split the window at the fiscal period boundaries of the persisted calendar."""
+    return [
+        (max(period.start, start_day), min(period.end, end_day))
+        for period in periods_between(start_day, end_day)
+    ]
+
+
+def _merge_totals(target, rows, fields):
+    for key, row in rows.items():
+        if key not in target:
+            target[key] = dict(row)
+            continue
+        for field in fields:
+            target[key][field] = (target[key][field] or 0) + (row[field] or 0)
+
+
+def build_report(start_day, end_day, progress=None):
+    """
+    Compute the full reports page for a window as plain, JSON-ready data.
+
+    The window is aggregated one fiscal period at a time so long ranges
+    report real progress; the per-period partial sums are merged and ranked
+    once at the end exactly like the interactive page does.
+
+    Args:
+        start_day: First local day of the window
+        end_day: Last local day of the window
+        progress: Optional callable(current, total) called after each period
+
+    Returns:
+        Dict with the same keys as the reports_view context, with users,
+        products and categories flattened to the fields the page shows
+    """
+    chunks = _period_chunks(start_day, end_day)
+    totals = {code: Decimal('0.00') for code in TYPES}
+    counts = {code: 0 for code in TYPES}
+    daily_trends = []
+    daily_rows = []
+    partner_totals = {}
+    product_totals = {}
+
+    for index, (chunk_start, chunk_end) in enumerate(chunks, start=1):
+        rows = _daily_totals(chunk_start, chunk_end)
+        daily_rows.extend(rows)
+        summary = _summarize(rows)
+        for code in TYPES:
+            totals[code] += summary['totals'][code]
+            counts[code] += summary['counts'][code]
+        daily_trends.extend(summary['daily_trends'])
+        _merge_totals(partner_totals, _partner_totals(chunk_start, chunk_end), ('total_sales', 'total_products'))
+        _merge_totals(product_totals, _product_totals(chunk_start, chunk_end), ('total_quantity', 'total_revenue'))
+        if progress is not None:
+            progress(index, len(chunks))
+
+    top_merchants, top_representatives = _annotate_partners(_rank_partners(partner_totals, 5, 5))
+    top_products, category_performance = _annotate_products(product_totals, 10)
+    low_stock_products = Product.objects.filter(stock__lte=10).select_related('category').order_by('stock')[:10]
+
+    def partner(user):
+        return {
+            'id': user.pk,
+            'username': user.username,
+            'get_full_name': user.get_full_name(),
+            'debt': user.debt,
+            'total_sales': user.total_sales,
+            'total_products': user.total_products,
+        }
+
+    return {
+        'start_date': start_day,
+        'end_date': end_day,
+        'total_sales': totals['take'],
+        'total_payments': totals['payment'],
+        'total_fees': totals['fees'],
+        'total_restores': totals['restore'],
+        'net_profit': totals['payment'] - totals['fees'],
+        'total_debt': User.objects.filter(
+            user_type='merchant'
+        ).aggregate(total=Sum('debt'))['total'] or Decimal('0.00'),
+        'transaction_counts': counts,
+        'top_merchants': [partner(user) for user in top_merchants],
+        'top_representatives': [partner(user) for user in top_representatives],
+        'top_products': [
+            {
+                'id': product.pk,
+                'name': product.name,
+                'stock': product.stock,
+                'total_quantity': product.total_quantity,
+                'total_revenue': product.total_revenue,
+            }
+            for product in top_products
+        ],
+        'category_performance': [
+            {
+                'name': category.name,
+                'total_quantity': category.total_quantity,
+                'total_sales': category.total_sales,
+            }
+            for category in category_performance
+        ],
+        'low_stock_products': [
+            {
+                'id': product.pk,
+                'name': product.name,
+                'stock': product.stock,
+                'category': {'name': product.category.name if product.category else '-'},
+            }
+            for product in low_stock_products
+        ],
+        'daily_trends': daily_trends,
+        'period_summary': _group_periods(daily_rows, start_day, end_day),
+    }
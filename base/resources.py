@@ -1,9 +1,13 @@
 """Django Import/Export resources for data import and export."""
 
+import re
+
+from django.utils import timezone
 from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
 
-from .models import Transaction, TransactionItem, User, Product
+from .models import PostingError, Transaction, TransactionItem, User, Product
+from .services import add_transaction_items, post_transaction
 
 
 # Arabic translation mappings for transaction types
@@ -16,6 +20,39 @@ TRANSACTION_TYPE_TO_ARABIC = {
 
 TRANSACTION_TYPE_FROM_ARABIC = {v: k for k, v in TRANSACTION_TYPE_TO_ARABIC.items()}
 
+# Items column written by TransactionResource.export(): "name (xN), name (xN)"
+ITEMS_COLUMN = 'العناصر'
+ITEM_RE = re.compile(r'\s*(.+?) \(x(\d+)\)\s*(?:,|$)')
+
+
+def parse_items(text):
+    """
+    Parse an exported items cell into (product, quantity) lines.
+
+    Args:
+        text: Cell value, '-' or empty for a transaction without items
+
+    Returns:
+        List of (Product, quantity) pairs, resolved by name in one query
+
+    Raises:
+        PostingError: If the cell is malformed or names an unknown product
+    """
+    text = str(text or '').strip()
+    if text in ('', '-'):
+        return []
+    matches = ITEM_RE.findall(text)
+    if not matches:
+        raise PostingError(f'صيغة العناصر غير صالحة: {text}')
+
+    products = {}
+    for product in Product.objects.filter(name__in={name for name, _ in matches}):
+        products.setdefault(product.name, product)
+    missing = sorted({name for name, _ in matches} - set(products))
+    if missing:
+        raise PostingError(f'المنتج غير موجود: {", ".join(missing)}')
+    return [(products[name], int(quantity)) for name, quantity in matches]
+
 
 class TransactionResource(resources.ModelResource):
     """Resource for importing/exporting Transaction data."""
@@ -61,6 +98,35 @@ class TransactionResource(resources.ModelResource):
                 row['نوع المعاملة']
             )
     
+    def import_instance(self, instance, row, **kwargs):
+        """Keep the row's items column so the transaction is posted with its items."""
+        super().import_instance(instance, row, **kwargs)
+        instance._import_lines = parse_items(row.get(ITEMS_COLUMN))
+
+    def do_instance_save(self, instance, is_create):
+        """
+        Post new transactions with their items through the posting service.
+
+        Take/restore rows without an items column are posted empty; their
+        items can then be imported with TransactionItemResource.
+        """
+        if not is_create:
+            return super().do_instance_save(instance, is_create)
+        date = instance.date or None
+        if isinstance(date, str):
+            date = Transaction._meta.get_field('date').to_python(date)
+        if date is not None and timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        post_transaction(
+            instance.user,
+            instance.type,
+            lines=getattr(instance, '_import_lines', []),
+            amount=instance.amount,
+            date=date,
+            instance=instance,
+            allow_empty=True,
+        )
+    
     def get_export_headers(self, selected_fields=None):
         """Return Arabic headers for export."""
         return ['رقم المعاملة', 'المستخدم', 'نوع المعاملة', 'التاريخ', 'المجموع']
@@ -116,3 +182,14 @@ class TransactionItemResource(resources.ModelResource):
         fields = ('id', 'transaction_id', 'product', 'quantity', 'price')
         import_id_fields = ['id']
         skip_unchanged = True
+
+    def do_instance_save(self, instance, is_create):
+        """Add new items to their transaction through the posting service."""
+        if not is_create:
+            return super().do_instance_save(instance, is_create)
+        if instance.product is None:
+            raise PostingError('يجب اختيار منتج')
+        item, = add_transaction_items(instance.transaction, [(instance.product, instance.quantity)])
+        instance.pk = item.pk
+        instance.price = item.price
+        instance.total = item.total
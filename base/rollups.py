@@ -0,0 +1,128 @@
+"""Rebuilding of the daily rollup tables from raw transactions."""
+
+from datetime import date, datetime, time
+
+from django.apps import apps as global_apps
+from django.db import transaction as db_transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from base.models import DataVersion
+
+
+def rebuild_rollups(apps=global_apps):
+    """
+    Recreate every daily rollup row from the Transaction and TransactionItem tables.
+
+    Days before the latest period close are archived, so their rollup rows
+    are kept as they are and only later days are rebuilt. Every cached
+    report is invalidated, closed windows included.
+
+    Args:
+        apps: App registry to load models from (historical registry in migrations)
+
+    Returns:
+        Dict with the number of rows written per rollup table
+    """
+    Transaction = apps.get_model('base', 'Transaction')
+    TransactionItem = apps.get_model('base', 'TransactionItem')
+    DailyTransactionRollup = apps.get_model('base', 'DailyTransactionRollup')
+    DailyProductRollup = apps.get_model('base', 'DailyProductRollup')
+    DailyUserRollup = apps.get_model('base', 'DailyUserRollup')
+
+    transactions = Transaction.objects.annotate(day=TruncDate('date'))
+    items = TransactionItem.objects.annotate(day=TruncDate('transaction__date'))
+    rollups = {
+        DailyTransactionRollup: DailyTransactionRollup.objects.all(),
+        DailyProductRollup: DailyProductRollup.objects.all(),
+        DailyUserRollup: DailyUserRollup.objects.all(),
+    }
+
+    try:
+        DailyCategoryRollup = apps.get_model('base', 'DailyCategoryRollup')
+    except LookupError:
+        DailyCategoryRollup = None
+    if DailyCategoryRollup:
+        rollups[DailyCategoryRollup] = DailyCategoryRollup.objects.all()
+
+    try:
+        PeriodClose = apps.get_model('base', 'PeriodClose')
+    except LookupError:
+        PeriodClose = None
+    cutoff = PeriodClose and PeriodClose.objects.order_by('-cutoff').values_list('cutoff', flat=True).first()
+    if cutoff:
+        start = timezone.make_aware(datetime.combine(cutoff, time.min))
+        transactions = transactions.filter(date__gte=start)
+        items = items.filter(transaction__date__gte=start)
+        rollups = {model: queryset.filter(day__gte=cutoff) for model, queryset in rollups.items()}
+
+    transaction_rows = [
+        DailyTransactionRollup(day=row['day'], type=row['type'], count=row['count'], amount=row['amount'] or 0)
+        for row in transactions.values('day', 'type').annotate(count=Count('id'), amount=Sum('amount'))
+    ]
+
+    product_rows = [
+        DailyProductRollup(
+            day=row['day'],
+            product_id=row['product_id'],
+            type=row['transaction__type'],
+            quantity=row['quantity'] or 0,
+            total=row['total'] or 0,
+        )
+        for row in items.filter(product__isnull=False).values(
+            'day', 'product_id', 'transaction__type'
+        ).annotate(quantity=Sum('quantity'), total=Sum('total'))
+    ]
+
+    # The category cube is the product rollup regrouped by each product's category
+    category_rows = [
+        DailyCategoryRollup(
+            day=row['day'],
+            category_id=row['product__category_id'],
+            type=row['transaction__type'],
+            quantity=row['quantity'] or 0,
+            total=row['total'] or 0,
+        )
+        for row in items.filter(product__isnull=False).values(
+            'day', 'product__category_id', 'transaction__type'
+        ).annotate(quantity=Sum('quantity'), total=Sum('total'))
+    ] if DailyCategoryRollup else []
+
+    # Counts and amounts come from transactions, quantities from their items
+    user_rows = {}
+    for row in transactions.filter(user__isnull=False).values('day', 'user_id', 'type').annotate(
+        count=Count('id'), amount=Sum('amount')
+    ):
+        user_rows[(row['day'], row['user_id'], row['type'])] = DailyUserRollup(
+            day=row['day'], user_id=row['user_id'], type=row['type'],
+            count=row['count'], amount=row['amount'] or 0,
+        )
+    for row in items.filter(transaction__user__isnull=False).values(
+        'day', 'transaction__user_id', 'transaction__type'
+    ).annotate(quantity=Sum('quantity')):
+        key = (row['day'], row['transaction__user_id'], row['transaction__type'])
+        if key in user_rows:
+            user_rows[key].quantity = row['quantity'] or 0
+
+    with db_transaction.atomic():
+        for model, rows in (
+            (DailyTransactionRollup, transaction_rows),
+            (DailyProductRollup, product_rows),
+            (DailyUserRollup, list(user_rows.values())),
+            (DailyCategoryRollup, category_rows),
+        ):
+            if model is None:
+                continue
+            rollups[model].delete()
+            model.objects.bulk_create(rows, batch_size=1000)
+        # Migrations run on the historical registry, before any report is cached
+        if apps is global_apps:
+            DataVersion.bump(date.min)
+
+    return {
+        'transactions': len(transaction_rows),
+        'products': len(product_rows),
+        'users': len(user_rows),
+        'categories': len(category_rows),
+    }
@@ -0,0 +1,359 @@
+"""Transaction posting services.
+
+All stock, debt and counter bookkeeping for a posted transaction happens
+here in a fixed number of queries, independent of the number of lines.
+"""
+
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import models, transaction as db_transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base.models import (
+    DailyProductRollup,
+    DailyTransactionRollup,
+    DailyUserRollup,
+    DataVersion,
+    DEBT_SIGN,
+    DebtEntry,
+    InsufficientStockError,
+    PostingError,
+    PRODUCTS_COUNT_SIGN,
+    STOCK_SIGN,
+    Product,
+    StockMovement,
+    Transaction,
+    TransactionItem,
+    User,
+)
+
+PRODUCT_TYPES = ('take', 'restore')
+
+
+def _normalize_lines(lines):
+    """Convert (product, quantity) pairs into (product_id, quantity) ints."""
+    normalized = []
+    for product, quantity in lines:
+        try:
+            product_id = product.pk if isinstance(product, Product) else int(product)
+        except (TypeError, ValueError):
+            raise PostingError('المنتج غير صالح')
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            raise PostingError('الكمية غير صالحة')
+        if quantity <= 0:
+            raise PostingError('يجب أن تكون الكمية أكبر من صفر')
+        normalized.append((product_id, quantity))
+    return normalized
+
+
+def _build_items(lines):
+    """
+    Validate lines against one IN fetch of their products and build unsaved items.
+
+    Returns:
+        (items, quantities, categories) where quantities maps product_id to
+        its total quantity and categories maps it to its category_id
+
+    Raises:
+        PostingError: If the lines are invalid or a product does not exist
+    """
+    lines = _normalize_lines(lines)
+
+    # One IN query for every product referenced by the lines
+    products = Product.objects.in_bulk({product_id for product_id, _ in lines})
+    missing = {product_id for product_id, _ in lines} - set(products)
+    if missing:
+        raise PostingError(f'المنتج غير موجود: {", ".join(map(str, sorted(missing)))}')
+
+    quantities = OrderedDict()
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    items = []
+    for product_id, quantity in lines:
+        price = products[product_id].price
+        items.append(TransactionItem(
+            product_id=product_id,
+            quantity=quantity,
+            price=price,
+            total=Decimal(price) * Decimal(quantity),
+        ))
+    categories = {product_id: product.category_id for product_id, product in products.items()}
+    return items, quantities, categories
+
+
+def _post_items(transaction, items, quantities, date=None):
+    """Insert items of a saved take/restore transaction and move stock for them."""
+    for item in items:
+        item.transaction = transaction
+        item.date = transaction.date
+    TransactionItem.objects.bulk_create(items)
+    # Items appended to an existing transaction may repeat one of its products
+    Transaction.products.through.objects.bulk_create([
+        Transaction.products.through(transaction_id=transaction.pk, product_id=product_id)
+        for product_id in quantities
+    ], ignore_conflicts=True)
+
+    StockMovement.apply(
+        {product_id: STOCK_SIGN[transaction.type] * quantity for product_id, quantity in quantities.items()},
+        transaction=transaction,
+        reason=transaction.type,
+        date=date,
+    )
+
+
+def post_transaction(user, type, lines=(), amount=None, date=None, instance=None, allow_empty=False):
+    """
+    Post a transaction with all of its items in one atomic unit.
+
+    Args:
+        user: Partner the transaction belongs to (None for fees)
+        type: One of the TRANSACTION_TYPES codes
+        lines: Iterable of (product or product_id, quantity) pairs for take/restore
+        amount: Amount for payment/fees transactions
+        date: Optional transaction date (defaults to now)
+        instance: Optional unsaved Transaction to post instead of a new one
+        allow_empty: Accept a take/restore without lines, whose items are
+            added later with add_transaction_items() (used by the importer)
+
+    Returns:
+        The saved Transaction
+
+    Raises:
+        PostingError: If the lines are invalid or a product does not exist
+        InsufficientStockError: If a take exceeds the available stock; stock is
+            decremented by a conditional update so concurrent takes cannot oversell
+    """
+    lines = list(lines) if type in PRODUCT_TYPES else []
+    if type in PRODUCT_TYPES and not lines and not allow_empty:
+        raise PostingError('يجب اختيار منتج')
+    items, quantities, categories = _build_items(lines)
+
+    if type in PRODUCT_TYPES:
+        amount = sum((item.total for item in items), Decimal('0.00'))
+    elif amount is not None:
+        amount = Decimal(str(amount))
+
+    with db_transaction.atomic():
+        transaction = instance or Transaction()
+        transaction.user = user
+        transaction.type = type
+        transaction.amount = amount
+        transaction.save(update_totals=False)
+        if date is not None:
+            Transaction.objects.filter(pk=transaction.pk).update(date=date)
+            transaction.date = date
+
+        if items:
+            _post_items(transaction, items, quantities, date=date)
+
+        if user is not None:
+            # Postings at now have no later ledger entries to shift
+            _apply_user_totals(transaction, items, amount or Decimal('0.00'), latest=date is None)
+
+        transaction.update_rollups(
+            count=1,
+            amount=amount or Decimal('0.00'),
+            lines=[(item.product_id, item.quantity, item.total) for item in items],
+            categories=categories,
+        )
+
+    return transaction
+
+
+def add_transaction_items(transaction, lines):
+    """
+    Append items to an already posted take/restore transaction in one atomic unit.
+
+    Stock, the transaction amount, the user's debt and products_count and the
+    rollups all move by the added lines only, as if they had been posted
+    with the transaction.
+
+    Args:
+        transaction: Saved take or restore Transaction
+        lines: Iterable of (product or product_id, quantity) pairs
+
+    Returns:
+        The created TransactionItems
+
+    Raises:
+        PostingError: If the transaction is not a take/restore or the lines are invalid
+        InsufficientStockError: If a take exceeds the available stock
+    """
+    if transaction.type not in PRODUCT_TYPES:
+        raise PostingError('لا يمكن إضافة منتجات لهذا النوع من المعاملات')
+    items, quantities, categories = _build_items(lines)
+    if not items:
+        return []
+    added = sum((item.total for item in items), Decimal('0.00'))
+
+    with db_transaction.atomic():
+        _post_items(transaction, items, quantities, date=transaction.date)
+        Transaction.objects.filter(pk=transaction.pk).update(
+            amount=Coalesce(F('amount'), Value(Decimal('0.00'))) + added
+        )
+        transaction.amount = (transaction.amount or Decimal('0.00')) + added
+
+        if transaction.user is not None:
+            _apply_user_totals(transaction, items, added)
+
+        transaction.update_rollups(
+            amount=added,
+            lines=[(item.product_id, item.quantity, item.total) for item in items],
+            categories=categories,
+        )
+    return items
+
+
+def _apply_user_totals(transaction, items, amount, latest=False):
+    """
+    Apply the debt and products_count deltas of posting `items` and `amount` for the transaction's user.
+
+    latest is passed to DebtEntry.record() for transactions posted at now.
+    """
+    user = transaction.user
+
+    debt_delta = Decimal('0.00')
+    if user.user_type == 'merchant':
+        debt_delta = DEBT_SIGN.get(transaction.type, 0) * amount
+
+    count_delta = PRODUCTS_COUNT_SIGN.get(transaction.type, 0) * sum(
+        item.quantity for item in items
+    )
+    User.objects.filter(pk=user.pk).update(
+        debt=F('debt') + debt_delta,
+        products_count=F('products_count') + count_delta,
+    )
+    if debt_delta:
+        DebtEntry.record(
+            user, debt_delta, transaction=transaction, reason=transaction.type, date=transaction.date,
+            latest=latest,
+        )
+    user.debt += debt_delta
+    user.products_count += count_delta
+
+
+def delete_transactions(queryset):
+    """
+    Delete many transactions and reverse their effects in a few set-based statements.
+
+    Stock is restored by one grouped update, every affected user gets a single
+    debt and products_count delta and a few statements of ledger reversals,
+    and the rollups are decremented per key, all inside one atomic block so
+    an interruption leaves nothing half-reversed.
+
+    Args:
+        queryset: Transaction queryset selecting the rows to delete
+
+    Returns:
+        The (count, per-model counts) tuple from QuerySet.delete()
+
+    Raises:
+        InsufficientStockError: If reversing a restore would take a product
+            below zero, in which case nothing is deleted
+    """
+    with db_transaction.atomic():
+        rows = {
+            row['pk']: row
+            for row in queryset.values('pk', 'user_id', 'user__user_type', 'type', 'amount', 'date')
+        }
+        if not rows:
+            return 0, {}
+        ids = Transaction.objects.filter(pk__in=queryset.values('pk')).values('pk')
+
+        # One grouped read of every line, netted per transaction and product
+        lines = TransactionItem.objects.filter(transaction__in=ids).values(
+            'transaction_id', 'product_id'
+        ).annotate(quantity=Sum('quantity'), total=Sum('total')).order_by()
+
+        stock_deltas = {}
+        user_deltas = {}
+        reversals = []
+        transaction_rollups = {}
+        product_rollups = {}
+        user_rollups = {}
+
+        for row in rows.values():
+            amount = row['amount'] or Decimal('0.00')
+            row['day'] = timezone.localdate(row['date'])
+            deltas = transaction_rollups.setdefault(
+                (row['day'], row['type']), {'count': 0, 'amount': Decimal('0.00')}
+            )
+            deltas['count'] -= 1
+            deltas['amount'] -= amount
+            if row['user_id']:
+                deltas = user_rollups.setdefault(
+                    (row['day'], row['user_id'], row['type']),
+                    {'count': 0, 'amount': Decimal('0.00'), 'quantity': 0},
+                )
+                deltas['count'] -= 1
+                deltas['amount'] -= amount
+                if row['user__user_type'] == 'merchant' and row['type'] in DEBT_SIGN:
+                    user_delta = user_deltas.setdefault(row['user_id'], {'debt': Decimal('0.00'), 'count': 0})
+                    user_delta['debt'] -= DEBT_SIGN[row['type']] * amount
+                    if amount:
+                        reversals.append((row['user_id'], row['date'], -DEBT_SIGN[row['type']] * amount))
+
+        for line in lines:
+            row = rows[line['transaction_id']]
+            quantity = line['quantity'] or 0
+            total = line['total'] or Decimal('0.00')
+            if line['product_id']:
+                stock_deltas[line['product_id']] = (
+                    stock_deltas.get(line['product_id'], 0) - STOCK_SIGN.get(row['type'], 0) * quantity
+                )
+                deltas = product_rollups.setdefault(
+                    (row['day'], line['product_id'], row['type']), {'quantity': 0, 'total': Decimal('0.00')}
+                )
+                deltas['quantity'] -= quantity
+                deltas['total'] -= total
+            if row['user_id']:
+                user_rollups[(row['day'], row['user_id'], row['type'])]['quantity'] -= quantity
+                user_delta = user_deltas.setdefault(row['user_id'], {'debt': Decimal('0.00'), 'count': 0})
+                user_delta['count'] -= PRODUCTS_COUNT_SIGN.get(row['type'], 0) * quantity
+
+        StockMovement.apply(stock_deltas, reason='reversal')
+        _apply_user_deltas(user_deltas, reversals)
+
+        DataVersion.bump(min(row['day'] for row in rows.values()))
+
+        DailyTransactionRollup.objects.increment(('day', 'type'), transaction_rollups)
+        DailyProductRollup.objects.increment(('day', 'product_id', 'type'), product_rollups)
+        DailyUserRollup.objects.increment(('day', 'user_id', 'type'), user_rollups)
+
+        return Transaction.objects.filter(pk__in=list(rows)).delete()
+
+
+def _apply_user_deltas(user_deltas, reversals):
+    """
+    Apply per-user debt and products_count deltas in one UPDATE plus the debt ledger rows.
+
+    Args:
+        user_deltas: Mapping of user_id to {'debt', 'count'} deltas
+        reversals: (user_id, date, amount) debt reversals, one per deleted
+            transaction, each recorded in the ledger at the transaction's own
+            date so the running balances after it stay correct
+    """
+    user_deltas = {
+        user_id: deltas for user_id, deltas in user_deltas.items() if deltas['debt'] or deltas['count']
+    }
+
+    if user_deltas:
+        User.objects.filter(pk__in=list(user_deltas)).update(
+            debt=F('debt') + Case(
+                *[When(pk=user_id, then=Value(deltas['debt'])) for user_id, deltas in user_deltas.items()],
+                default=Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            products_count=F('products_count') + Case(
+                *[When(pk=user_id, then=Value(deltas['count'])) for user_id, deltas in user_deltas.items()],
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ),
+        )
+    DebtEntry.record_many(reversals, reason='reversal')
@@ -18,6 +18,9 @@ class InfiniteScroll {
     this.createRowHtml = options.createRowHtml;
     this.baseUrl = options.baseUrl || window.location.href;
 
+    // Query parameter carrying the next page; cursor-paginated lists use "cursor"
+    this.pageParam = options.pageParam || "page";
+
     // Scroll container
     this.scrollContainer = document.querySelector("main.overflow-y-auto");
 
@@ -60,7 +63,7 @@ class InfiniteScroll {
 
     // Build URL with current filters
     const currentUrl = new URL(this.baseUrl);
-    currentUrl.searchParams.set("page", this.nextPage);
+    currentUrl.searchParams.set(this.pageParam, this.nextPage);
 
     // Add delay for better UX
     setTimeout(() => {
@@ -78,7 +81,8 @@ class InfiniteScroll {
 
             // Update state
             this.hasNext = data.has_next;
-            this.nextPage = data.next_page_number;
+            this.nextPage =
+              "next_cursor" in data ? data.next_cursor : data.next_page_number;
 
             // Show end message
             if (!this.hasNext && this.endOfList) {
@@ -0,0 +1,70 @@
+"""Point-in-time stock queries over the movement ledger."""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base.models import Product, StockCheckpoint, StockMovement
+
+# Lower bound used when a product has no checkpoint before the requested date
+LEDGER_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def stock_as_of(product_ids, when):
+    """
+    Get the stock level of many products at a point in time.
+
+    Each product starts from its nearest checkpoint at or before `when` and
+    adds only the movements recorded after it, so the cost is bounded by
+    the checkpoint interval rather than the full history.
+
+    Args:
+        product_ids: Iterable of product IDs, or None for all products
+        when: Aware datetime to evaluate the stock at
+
+    Returns:
+        Dict mapping product_id to stock level
+    """
+    checkpoints = StockCheckpoint.objects.filter(
+        product=OuterRef('pk'), date__lte=when
+    ).order_by('-date')
+
+    movements = StockMovement.objects.filter(
+        product=OuterRef('pk'),
+        date__lte=when,
+        date__gt=Coalesce(OuterRef('checkpoint_date'), Value(LEDGER_START)),
+    ).values('product').annotate(total=Sum('quantity')).values('total')
+
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+
+    rows = products.annotate(
+        checkpoint_date=Subquery(checkpoints.values('date')[:1]),
+        checkpoint_stock=Coalesce(
+            Subquery(checkpoints.values('stock')[:1]), Value(0), output_field=IntegerField()
+        ),
+    ).annotate(
+        moved=Coalesce(Subquery(movements), Value(0), output_field=IntegerField()),
+    ).values_list('pk', 'checkpoint_stock', 'moved')
+
+    return {pk: checkpoint_stock + moved for pk, checkpoint_stock, moved in rows}
+
+
+def create_stock_checkpoints(when=None):
+    """
+    Write a checkpoint row for every product at `when` (defaults to now).
+
+    Returns:
+        Number of checkpoints created
+    """
+    when = when or timezone.now()
+    levels = stock_as_of(None, when)
+    StockCheckpoint.objects.filter(date=when).delete()
+    StockCheckpoint.objects.bulk_create([
+        StockCheckpoint(product_id=product_id, date=when, stock=stock)
+        for product_id, stock in levels.items()
+    ], batch_size=1000)
+    return len(levels)
@@ -1,84 +1,83 @@
 """Celery tasks for background processing."""
 
-import pandas as pd
-from celery import shared_task
+from celery import chord, group, shared_task
+from django.utils import timezone
 
-from base.models import TransactionItem, Product
+from base.forecasting import (
+    demand_marks, drop_unchanged, forecast_shard, load_shard, refresh_stock_out, save_forecasts, shards,
+    stale_products,
+)
+from base.models import ReportJob
+from base.reporting import build_report
+from base.stock import create_stock_checkpoints
 
 
-def forecast_stock(product_id, days=30):
+@shared_task(bind=True)
+def estimate_stock_out_task(self):
     """
-    Forecast stock using Prophet time series prediction.
-    
-    Args:
-        product_id: ID of the product to forecast
-        days: Number of days to forecast ahead
-        
-    Returns:
-        DataFrame with forecast data or None if insufficient data
-    """
-    # Need at least 2 data points for Prophet
-    if TransactionItem.objects.filter(product_id=product_id).count() < 2:
-        return None
-    
-    # Import Prophet here to avoid loading it unnecessarily
-    from prophet import Prophet
-    
-    # Load transaction data
-    qs = TransactionItem.objects.filter(product_id=product_id).order_by("transaction__date")
-    df = pd.DataFrame(list(qs.values("transaction__date", "quantity")))
-    df.rename(columns={"transaction__date": "ds", "quantity": "y"}, inplace=True)
-    
-    # Remove timezone as Prophet requires timezone-naive datetimes
-    if not df.empty:
-        df['ds'] = pd.to_datetime(df['ds']).dt.tz_localize(None)
-    
-    # Create and fit model
-    model = Prophet()
-    model.fit(df)
-    
-    # Generate forecast
-    future = model.make_future_dataframe(periods=days)
-    forecast = model.predict(future)
-    
-    return forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]]
-
-
-def estimate_stock_out(product_id=-1, forecast_df=None):
-    """
-    Estimate when products will run out of stock.
-    
-    Args:
-        product_id: Specific product ID or -1 for all products
-        forecast_df: Pre-computed forecast DataFrame
+    Celery task to run stock estimation.
+
+    Fans the products whose demand changed since their last fit out as one
+    forecast_shard_task per shard and replaces itself with the chord, so its
+    result resolves once apply_forecasts_task has stored every shard.
     """
-    if product_id != -1 and forecast_df is not None:
-        return None
-    
-    products = Product.objects.all()
-    
-    for product in products:
-        # Skip products with insufficient transaction data
-        if TransactionItem.objects.filter(product_id=product.id).count() < 2:
-            continue
-        
-        forecast_df = forecast_stock(product.id)
-        if forecast_df is None:
-            continue
-        
-        # Calculate cumulative demand and find stock-out date
-        total = 0
-        for _, row in forecast_df.iterrows():
-            total += max(row['yhat'], 0)
-            
-            if total >= product.stock:
-                product.estimated_stock_out = row['ds']
-                product.save()
-                break
+    product_shards = shards(stale_products(demand_marks()))
+    if not product_shards:
+        return apply_forecasts_task([])
+    return self.replace(chord(
+        group(forecast_shard_task.s(product_ids) for product_ids in product_shards),
+        apply_forecasts_task.s(),
+    ))
+
+
+@shared_task
+def forecast_shard_task(product_ids):
+    """Celery task to refit one shard of products, skipping those whose series is unchanged."""
+    return forecast_shard(drop_unchanged(load_shard(product_ids)))
+
+
+@shared_task
+def apply_forecasts_task(shard_results):
+    """Celery chord callback storing every shard's fits and refreshing all stock-out dates."""
+    results = {}
+    for shard in shard_results:
+        results.update(shard)
+    refitted = save_forecasts(results)
+    updated = refresh_stock_out(demand_marks())
+    return {
+        'status': 'done',
+        'result': f'Process completed successfully! ({refitted} refitted, {updated} products updated)',
+    }
 
 
 @shared_task
-def estimate_stock_out_task():
-    """Celery task to run stock estimation."""
-    estimate_stock_out()
-    return {'status': 'done', 'result': 'Process completed successfully!'}
\ No newline at end of file
+def checkpoint_stock_task():
+    """Celery task to snapshot every product's stock level."""
+    created = create_stock_checkpoints()
+    return {'status': 'done', 'result': f'Created {created} stock checkpoints'}
+
+
+@shared_task(bind=True)
+def generate_report_task(self, job_id):
+    """Celery task to compute a reports page in the background and store it on its ReportJob."""
+    job = ReportJob.objects.get(pk=job_id)
+    ReportJob.objects.filter(pk=job_id).update(status='running')
+
+    def progress(current, total):
+        self.update_state(state='PROGRESS', meta={'current': current, 'total': total})
+        ReportJob.objects.filter(pk=job_id).update(progress=round(current / total * 100))
+
+    try:
+        result = build_report(job.start_day, job.end_day, progress=progress)
+    except Exception as error:
+        ReportJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(error), finished_at=timezone.now()
+        )
+        raise
+
+    job.result = result
+    job.status = 'done'
+    job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'progress', 'finished_at'])
+    return {'status': 'done', 'result': f'Report {job_id} is ready'}
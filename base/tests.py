@@ -1,3 +1,688 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import warnings
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.db import close_old_connections, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from tablib import Dataset
+
+from base.analytics import period_comparison
+from base.archive import close_period
+from base.debt import debt_statement, decode_cursor, encode_cursor, statement_page
+from base.fiscal import build_calendar, period_for
+from base.forecasters import BAND_Z, DemandMatrix, get_forecaster
+from base.forecasting import demand_marks, estimate_stock_out, shards, stock_out_indices
+from base.management.commands._bench import seed_catalog, seed_dataset
+from base.models import (
+    Category, DataVersion, DebtEntry, InsufficientStockError, PostingError, Product, ReportJob,
+    StockCheckpoint, StockMovement, Transaction, TransactionItem, User,
+)
+from base.query_plans import find_full_scans, full_scans
+from base.reporting import kpi_windows, report_summary
+from base.resources import TransactionItemResource, TransactionResource
+from base.services import delete_transactions, post_transaction
+from base.stock import create_stock_checkpoints, stock_as_of
+from base.tasks import generate_report_task
+from base.views import reports
+from base.views.partners import partner_detail
+
+
+class CatalogMixin:
+    """A category with two priced products and one merchant."""
+
+    def setUp(self):
+        # Report cache keys embed DataVersion counters, which restart with every test
+        cache.clear()
+        self.category = Category.objects.create(name='هواتف')
+        self.phone = Product.objects.create(
+            name='هاتف (أ), خاص', price=Decimal('2.50'), stock=100, category=self.category
+        )
+        self.charger = Product.objects.create(
+            name='شاحن', price=Decimal('4.00'), stock=100, category=self.category
+        )
+        self.merchant = User.objects.create(username='merchant', user_type='merchant')
+
+    def refresh(self):
+        for instance in (self.phone, self.charger, self.merchant):
+            instance.refresh_from_db()
+
+
+class ImportRoundTripTests(CatalogMixin, TestCase):
+    def test_exported_transactions_import_with_their_items(self):
+        take = post_transaction(self.merchant, 'take', [(self.phone, 3), (self.charger, 2)])
+        post_transaction(self.merchant, 'payment', amount=5)
+        transactions = Transaction.objects.filter(user=self.merchant).order_by('pk')
+        exported = TransactionResource().export(transactions).csv
+        date = take.date
+        delete_transactions(transactions)
+
+        result = TransactionResource().import_data(Dataset().load(exported, format='csv'), dry_run=False)
+
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.totals['new'], 2)
+        take = Transaction.objects.get(user=self.merchant, type='take')
+        self.assertEqual(take.amount, Decimal('15.50'))
+        self.assertEqual(take.date, date)
+        self.assertEqual(
+            sorted(take.items.values_list('product__name', 'quantity')),
+            [('شاحن', 2), ('هاتف (أ), خاص', 3)],
+        )
+        self.refresh()
+        self.assertEqual((self.phone.stock, self.charger.stock), (97, 98))
+        self.assertEqual(self.merchant.debt, Decimal('10.50'))
+        self.assertEqual(self.merchant.products_count, 5)
+
+    def test_item_rows_post_through_the_service(self):
+        take = post_transaction(self.merchant, 'take', allow_empty=True)
+        items = Dataset(headers=['رقم المعاملة', 'المنتج', 'الكمية', 'السعر'])
+        items.append([take.pk, 'شاحن', 5, ''])
+
+        result = TransactionItemResource().import_data(items, dry_run=False)
+
+        self.assertFalse(result.has_errors())
+        take.refresh_from_db()
+        self.refresh()
+        self.assertEqual(take.amount, Decimal('20.00'))
+        self.assertEqual(self.charger.stock, 95)
+        self.assertEqual(self.merchant.debt, Decimal('20.00'))
+
+    def test_unknown_product_is_a_row_error(self):
+        rows = Dataset(headers=['رقم المعاملة', 'المستخدم', 'نوع المعاملة', 'التاريخ', 'العناصر', 'المجموع'])
+        rows.append(['', 'merchant', 'سحب', '', 'غير موجود (x1)', ''])
+
+        result = TransactionResource().import_data(rows, dry_run=False)
+
+        self.assertTrue(result.has_errors())
+        self.assertFalse(Transaction.objects.exists())
+
+
+class PostingTests(CatalogMixin, TestCase):
+    def test_back_dated_posting_shifts_later_balances(self):
+        post_transaction(self.merchant, 'take', [(self.phone, 2)])
+        post_transaction(self.merchant, 'payment', amount=1, date=timezone.now() - timedelta(days=3))
+
+        balances = list(DebtEntry.objects.filter(user=self.merchant).order_by('date').values_list('balance', flat=True))
+        self.assertEqual(balances, [Decimal('-1.00'), Decimal('4.00')])
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.debt, Decimal('4.00'))
+
+    def test_deleting_reverses_debt_at_the_transaction_date(self):
+        now = timezone.now()
+        take = post_transaction(self.merchant, 'take', [(self.charger, 2)], date=now - timedelta(days=5))
+        post_transaction(self.merchant, 'payment', amount=3, date=now - timedelta(days=2))
+
+        delete_transactions(Transaction.objects.filter(pk=take.pk))
+
+        entries = DebtEntry.objects.filter(user=self.merchant).order_by('date', 'id')
+        self.assertEqual(
+            [(entry.reason, entry.date, entry.balance) for entry in entries],
+            [
+                ('take', take.date, Decimal('8.00')),
+                ('reversal', take.date, Decimal('0.00')),
+                ('payment', now - timedelta(days=2), Decimal('-3.00')),
+            ],
+        )
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.debt, Decimal('-3.00'))
+
+    def test_bulk_delete_keeps_running_balances(self):
+        now = timezone.now()
+        takes = []
+        for days in (9, 7, 5, 3, 1):
+            takes.append(post_transaction(self.merchant, 'take', [(self.phone, days)], date=now - timedelta(days=days)))
+            post_transaction(self.merchant, 'payment', amount=1, date=now - timedelta(days=days - 0.5))
+        deleted = Transaction.objects.filter(pk__in=[takes[0].pk, takes[2].pk, takes[3].pk])
+
+        # The ledger takes one read, one shift and one insert however many are deleted
+        with self.assertNumQueries(28):
+            delete_transactions(deleted)
+
+        balance = Decimal('0.00')
+        for entry in DebtEntry.objects.filter(user=self.merchant).order_by('date', 'id'):
+            balance += entry.amount
+            self.assertEqual(entry.balance, balance)
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.debt, balance)
+        self.assertEqual(balance, Decimal('15.00'))
+
+    def test_invalid_lines_are_posting_errors(self):
+        for lines in ([('abc', 1)], [(None, 1)], [(self.phone, 'two')], [(self.phone, 0)]):
+            with self.subTest(lines=lines), self.assertRaises(PostingError):
+                post_transaction(self.merchant, 'take', lines)
+
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_posting_reuses_the_loaded_products(self):
+        with self.assertNumQueries(22):
+            post_transaction(self.merchant, 'take', [(self.phone, 1), (self.charger, 1)])
+
+
+class StockAsOfTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        # Opening stock of 100 entered ten days ago
+        StockMovement.objects.update(date=self.now - timedelta(days=10))
+        post_transaction(self.merchant, 'take', [(self.phone, 3)], date=self.now - timedelta(days=5))
+        post_transaction(self.merchant, 'restore', [(self.phone, 1)], date=self.now - timedelta(days=2))
+
+    def test_stock_at_a_past_date_from_the_ledger(self):
+        levels = stock_as_of([self.phone.pk, self.charger.pk], self.now - timedelta(days=3))
+
+        self.assertEqual(levels, {self.phone.pk: 97, self.charger.pk: 100})
+        self.assertEqual(stock_as_of([self.phone.pk], self.now - timedelta(days=11)), {self.phone.pk: 0})
+        self.assertEqual(stock_as_of([self.phone.pk], self.now), {self.phone.pk: 98})
+
+    def test_checkpoint_replaces_the_movements_before_it(self):
+        checkpoint = self.now - timedelta(days=4)
+
+        self.assertEqual(create_stock_checkpoints(checkpoint), 2)
+
+        self.assertEqual(StockCheckpoint.objects.get(product=self.phone, date=checkpoint).stock, 97)
+        # Dates before the checkpoint still come from the ledger alone
+        self.assertEqual(stock_as_of([self.phone.pk], self.now - timedelta(days=6)), {self.phone.pk: 100})
+        # Movements up to the checkpoint are no longer read after it
+        StockMovement.objects.filter(date__lte=checkpoint).delete()
+        self.assertEqual(stock_as_of([self.phone.pk], checkpoint), {self.phone.pk: 97})
+        self.assertEqual(stock_as_of([self.phone.pk], self.now), {self.phone.pk: 98})
+
+    def test_checkpoints_at_the_same_date_are_replaced(self):
+        checkpoint = self.now - timedelta(days=1)
+        create_stock_checkpoints(checkpoint)
+        create_stock_checkpoints(checkpoint)
+
+        self.assertEqual(StockCheckpoint.objects.filter(date=checkpoint).count(), 2)
+
+
+class ConcurrentTakeTests(CatalogMixin, TransactionTestCase):
+    def test_concurrent_takes_never_oversell(self):
+        Product.objects.filter(pk=self.phone.pk).update(stock=10)
+        threads = 8
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def take():
+            try:
+                barrier.wait()
+                post_transaction(self.merchant, 'take', [(self.phone.pk, 2)])
+                results.append('posted')
+            except InsufficientStockError:
+                results.append('refused')
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=take) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.refresh()
+        self.assertEqual(sorted(results), ['posted'] * 5 + ['refused'] * 3)
+        self.assertEqual(self.phone.stock, 0)
+        sold = TransactionItem.objects.filter(product=self.phone).aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(sold, 10)
+        self.assertEqual(Transaction.objects.filter(type='take').count(), 5)
+
+
+class DebtStatementTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        for days, quantity in ((5, 2), (4, 1), (3, 3), (2, 1)):
+            post_transaction(self.merchant, 'take', [(self.phone, quantity)], date=self.now - timedelta(days=days))
+        post_transaction(self.merchant, 'payment', amount=4, date=self.now - timedelta(days=1))
+
+    def test_cursor_round_trip_before_the_epoch(self):
+        row = DebtEntry(id=7, date=datetime(1969, 12, 31, 23, 59, 59, 5, tzinfo=dt_timezone.utc))
+
+        self.assertEqual(decode_cursor(encode_cursor(row)), (row.date, 7))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+
+    def test_pages_continue_the_running_balance(self):
+        start, end = self.now - timedelta(days=10), self.now
+        entries, cursor = [], None
+        while True:
+            page, cursor = statement_page(self.merchant, start, end, cursor, size=2)
+            entries.extend(page)
+            if cursor is None:
+                break
+
+        self.assertEqual([entry.amount for entry in entries],
+                         [Decimal('5.00'), Decimal('2.50'), Decimal('7.50'), Decimal('2.50'), Decimal('-4.00')])
+        balance = Decimal('0.00')
+        for entry in entries:
+            balance += entry.amount
+            self.assertEqual(entry.balance, balance)
+
+    def test_statement_balances(self):
+        # The window starts after the first take and ends before the payment
+        statement = debt_statement(self.merchant, self.now - timedelta(days=4, hours=1), self.now - timedelta(days=2))
+
+        self.assertEqual(statement['opening_balance'], Decimal('5.00'))
+        self.assertEqual(statement['closing_balance'], Decimal('17.50'))
+        self.assertEqual(statement['total_taken'], Decimal('12.50'))
+        self.assertEqual(statement['total_paid'], Decimal('0.00'))
+        self.assertEqual(statement['entries'].count(), 3)
+
+
+class ProductHistoryTests(CatalogMixin, TestCase):
+    @mock.patch.object(reports, 'HISTORY_PAGE_SIZE', 2)
+    def test_pages_follow_transaction_dates(self):
+        now = timezone.now()
+        for days in (1, 3, 0, 2):
+            post_transaction(self.merchant, 'take', [(self.phone, days + 1)], date=now - timedelta(days=days))
+
+        quantities = []
+        cursor = None
+        while True:
+            items, cursor = reports.product_history_page(self.phone, cursor)
+            quantities += [item.quantity for item in items]
+            if cursor is None:
+                break
+
+        self.assertEqual(quantities, [1, 2, 3, 4])
+
+
+class CategoryCubeTests(CatalogMixin, TestCase):
+    def test_moving_a_product_invalidates_cached_history(self):
+        post_transaction(self.merchant, 'take', [(self.phone, 2)], date=timezone.now() - timedelta(days=5))
+        before = DataVersion.current()
+
+        self.phone.category = Category.objects.create(name='اكسسوارات')
+        self.phone.save()
+
+        after = DataVersion.current()
+        self.assertGreater(after[DataVersion.HISTORY], before[DataVersion.HISTORY])
+        self.assertGreater(after[DataVersion.CURRENT], before[DataVersion.CURRENT])
+
+    def test_rebuilding_rollups_invalidates_cached_history(self):
+        before = DataVersion.current()
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+
+        after = DataVersion.current()
+        self.assertGreater(after[DataVersion.HISTORY], before[DataVersion.HISTORY])
+
+    def test_totals_are_rounded_floats(self):
+        post_transaction(self.merchant, 'take', [(self.phone, 3), (self.charger, 1)])
+        today = timezone.localdate().isoformat()
+
+        response = reports.category_cube(RequestFactory().get('/', {'start_date': today, 'end_date': today}))
+
+        row, = json.loads(response.content)['data']
+        self.assertEqual(row['types']['take'], {'quantity': 4, 'total': 11.5})
+
+
+class ReportPageTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        post_transaction(self.merchant, 'take', [(self.phone, 4), (self.charger, 1)])
+        post_transaction(self.merchant, 'payment', amount=6)
+
+    def test_page_query_count(self):
+        # Fiscal period, versions, one transaction rollup pass, the period list,
+        # debt, two per ranking, four for the comparison, low stock and the sidebar
+        with self.assertNumQueries(17):
+            reports.reports_view(RequestFactory().get('/reports/'))
+        # Warm: only the uncached reads of current users, products and stock
+        with self.assertNumQueries(9):
+            reports.reports_view(RequestFactory().get('/reports/'))
+
+    def test_summary_periods_and_kpis_share_one_pass(self):
+        today = timezone.localdate()
+
+        page = report_summary(today, today)
+
+        self.assertEqual(page['summary']['totals']['take'], Decimal('14.00'))
+        self.assertEqual(page['summary']['counts'], {'take': 1, 'payment': 1, 'fees': 0, 'restore': 0})
+        self.assertEqual(sum(row['totals']['take'] for row in page['periods']), Decimal('14.00'))
+        for kpi in page['kpis'].values():
+            self.assertEqual(kpi['take'], {'count': 1, 'total': Decimal('14.00')})
+            self.assertEqual(kpi['net'], Decimal('6.00'))
+
+
+class PeriodComparisonTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for day, lines in (
+            (datetime(2026, 3, 10, 12), [(self.phone, 4)]),
+            (datetime(2026, 2, 10, 12), [(self.phone, 2), (self.charger, 1)]),
+        ):
+            post_transaction(self.merchant, 'take', lines, date=timezone.make_aware(day))
+
+    def test_deltas_against_previous_month_and_last_year(self):
+        comparison = period_comparison(date(2026, 3, 1), date(2026, 3, 31))
+
+        self.assertEqual(comparison['windows']['previous'], {'start': date(2026, 2, 1), 'end': date(2026, 2, 28)})
+        phone, charger = comparison['products']
+        self.assertEqual((phone['name'], phone['current'], phone['previous']), (self.phone.name, 10.0, 5.0))
+        self.assertEqual((phone['growth'], phone['rank'], phone['previous_rank']), (100.0, 1, 1))
+        self.assertEqual((charger['current'], charger['previous'], charger['growth']), (0.0, 4.0, -100.0))
+        self.assertEqual(charger['previous_rank'], 2)
+        category, = comparison['categories']
+        self.assertEqual((category['current'], category['previous'], category['growth']), (10.0, 9.0, 11.11))
+        merchant, = comparison['merchants']
+        self.assertEqual((merchant['current'], merchant['previous'], merchant['growth']), (10.0, 9.0, 11.11))
+
+    def test_zero_baseline_has_no_percentage(self):
+        comparison = period_comparison(date(2026, 3, 1), date(2026, 3, 31))
+
+        for row in comparison['products'] + comparison['categories'] + comparison['merchants']:
+            # Nothing was sold a year earlier
+            self.assertEqual(row['year_ago'], 0.0)
+            self.assertIsNone(row['yoy'])
+
+        comparison = period_comparison(date(2026, 2, 1), date(2026, 2, 28))
+        # January had no sales either
+        self.assertEqual([row['growth'] for row in comparison['products']], [None, None])
+
+
+@override_settings(REPORT_ASYNC_THRESHOLD=1)
+class ReportJobTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        post_transaction(self.merchant, 'take', [(self.phone, 4), (self.charger, 1)])
+        post_transaction(self.merchant, 'payment', amount=6)
+        today = timezone.localdate()
+        self.request = RequestFactory().get('/reports/', {
+            'start_date': today.replace(year=today.year - 1).isoformat(), 'end_date': today.isoformat(),
+        })
+
+    def test_large_window_is_queued(self):
+        with mock.patch.object(generate_report_task, 'delay', return_value=mock.Mock(id='task')) as delay:
+            response = reports.reports_view(self.request)
+            again = reports.reports_view(self.request)
+
+        job = ReportJob.objects.get()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f'/reports/jobs/{job.pk}/')
+        self.assertEqual(again.url, response.url)
+        delay.assert_called_once_with(job.pk)
+        self.assertEqual(job.task_id, 'task')
+
+    def test_unreachable_queue_serves_the_page_inline(self):
+        with mock.patch.object(generate_report_task, 'delay', side_effect=OperationalError):
+            response = reports.reports_view(self.request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_completed_job_renders_and_downloads(self):
+        with mock.patch.object(generate_report_task, 'delay', return_value=mock.Mock(id='task')):
+            reports.reports_view(self.request)
+        job = ReportJob.objects.get()
+
+        with mock.patch.object(generate_report_task, 'update_state'):
+            generate_report_task(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('done', 100))
+        self.assertEqual(reports.report_job(RequestFactory().get('/'), job.pk).status_code, 200)
+
+        download = reports.report_job(RequestFactory().get('/', {'download': 1}), job.pk)
+        self.assertIn('attachment', download['Content-Disposition'])
+        result = json.loads(download.content)
+        self.assertEqual(Decimal(result['total_sales']), Decimal('14.00'))
+        self.assertEqual(Decimal(result['net_profit']), Decimal('6.00'))
+        self.assertEqual([row['username'] for row in result['top_merchants']], ['merchant'])
+
+
+class KpiWindowTests(CatalogMixin, TestCase):
+    # A Thursday inside the fiscal period of 2026-02-20 to 2026-03-19
+    today = date(2026, 3, 5)
+
+    def setUp(self):
+        super().setUp()
+        # Periods start on the 20th, so each one spans a month boundary and
+        # the fiscal year 2026 starts on 2025-12-20
+        build_calendar(first_day=20, start_year=2025, end_year=2026)
+        for day in (
+            date(2025, 12, 19), date(2025, 12, 20), date(2026, 2, 19), date(2026, 2, 20),
+            date(2026, 3, 1), date(2026, 3, 2), date(2026, 3, 5),
+        ):
+            noon = timezone.make_aware(datetime.combine(day, time(12)))
+            post_transaction(self.merchant, 'take', [(self.phone, 1)], date=noon)
+        post_transaction(self.merchant, 'payment', amount=3, date=timezone.make_aware(datetime(2026, 3, 5, 12)))
+
+    def test_window_edges(self):
+        kpis = kpi_windows(self.today)
+
+        self.assertEqual(list(kpis), ['today', 'week', 'month', 'year'])
+        self.assertEqual(
+            {window: kpi['start'] for window, kpi in kpis.items()},
+            {'today': self.today, 'week': date(2026, 3, 2), 'month': date(2026, 2, 20), 'year': date(2025, 12, 20)},
+        )
+        self.assertEqual(
+            {window: kpi['take']['count'] for window, kpi in kpis.items()},
+            {'today': 1, 'week': 2, 'month': 4, 'year': 6},
+        )
+        self.assertEqual(kpis['month']['take']['total'], Decimal('10.00'))
+        for kpi in kpis.values():
+            self.assertEqual(kpi['end'], self.today)
+            self.assertEqual(kpi['count'], kpi['take']['count'] + 1)
+            self.assertEqual(kpi['net'], Decimal('3.00'))
+
+    def test_reports_page_strip_matches(self):
+        with mock.patch.object(timezone, 'localdate', return_value=self.today):
+            page = report_summary(date(2026, 3, 1), self.today)
+
+        self.assertEqual(page['kpis'], kpi_windows(self.today))
+        self.assertEqual([row['period'] for row in page['periods']], [period_for(self.today).label])
+        self.assertEqual(page['summary']['counts']['take'], 3)
+
+
+class TimeSeriesTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        noon = timezone.make_aware(datetime(2026, 3, 3, 12))
+        post_transaction(self.merchant, 'take', [(self.phone, 2)], date=noon)
+        post_transaction(self.merchant, 'take', [(self.charger, 1)], date=noon + timedelta(days=7))
+
+    def series(self, start, end, resolution, points=120):
+        response = reports.time_series_json(RequestFactory().get('/', {
+            'start_date': start, 'end_date': end, 'resolution': resolution, 'points': points,
+        }))
+        return response.status_code, json.loads(response.content)
+
+    def test_days_are_gap_filled(self):
+        _, series = self.series('2026-03-02', '2026-03-15', 'day')
+
+        self.assertEqual(len(series['buckets']), 14)
+        self.assertEqual(series['series']['take']['totals'], [0, 5, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0])
+        self.assertEqual(series['series']['take']['counts'], [0, 1, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(series['series']['payment']['totals'], [0] * 14)
+
+    def test_weeks_start_on_monday(self):
+        # The window starts on Tuesday 2026-03-03, so its first week is clipped
+        _, series = self.series('2026-03-03', '2026-03-15', 'week')
+
+        self.assertEqual(series['buckets'], [
+            {'start': '2026-03-03', 'end': '2026-03-08'},
+            {'start': '2026-03-09', 'end': '2026-03-15'},
+        ])
+        self.assertEqual(series['series']['take']['totals'], [5, 4])
+
+    def test_months_follow_the_fiscal_calendar(self):
+        _, series = self.series('2026-02-20', '2026-03-15', 'month')
+
+        self.assertEqual(series['buckets'], [
+            {'start': '2026-02-20', 'end': '2026-02-28'},
+            {'start': '2026-03-01', 'end': '2026-03-15'},
+        ])
+        self.assertEqual(series['series']['take']['totals'], [0, 9])
+
+    def test_buckets_are_merged_down_to_the_points_asked(self):
+        _, series = self.series('2026-03-02', '2026-03-15', 'day', points=5)
+
+        self.assertEqual(series['step'], 3)
+        self.assertEqual(len(series['buckets']), 5)
+        self.assertEqual(series['series']['take']['totals'], [5, 0, 4, 0, 0])
+
+    def test_start_after_end_is_rejected(self):
+        status, body = self.series('2026-03-15', '2026-03-02', 'day')
+
+        self.assertEqual(status, 400)
+        self.assertFalse(body['success'])
+
+
+class PeriodCloseTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        old = timezone.now() - timedelta(days=40)
+        post_transaction(self.merchant, 'take', [(self.phone, 4), (self.charger, 1)], date=old)
+        post_transaction(self.merchant, 'restore', [(self.phone, 1)], date=old)
+        post_transaction(self.merchant, 'take', [(self.charger, 2)])
+        close_period(self.today - timedelta(days=10))
+
+    def test_repair_command_keeps_archived_quantities(self):
+        User.objects.filter(pk=self.merchant.pk).update(products_count=0)
+
+        call_command('recalculate_products_count', stdout=io.StringIO())
+
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.products_count, 6)
+
+    def test_partner_detail_counts_archived_transactions(self):
+        response = partner_detail(RequestFactory().get('/'), self.merchant.pk)
+
+        self.assertEqual(Transaction.objects.filter(user=self.merchant).count(), 1)
+        self.assertContains(response, '(منها 2 مؤرشفة)')
+
+
+class StockOutTests(SimpleTestCase):
+    def test_zero_negative_and_outlasting_stock(self):
+        demand = [[1, 1, 1, 1], [2, 2, 2, 2], [1, 1, 1, 1], [1, 1, 1, 1]]
+
+        self.assertEqual(stock_out_indices(demand, [3, -20, 0, 50]).tolist(), [2, 0, 0, 4])
+
+
+class ShardTests(SimpleTestCase):
+    def test_every_product_lands_in_exactly_one_shard(self):
+        product_ids = list(range(1, 54))
+        for size in (1, 10, 53, 100):
+            with self.subTest(size=size):
+                split = shards(product_ids, size)
+                self.assertEqual([pk for shard in split for pk in shard], product_ids)
+                self.assertTrue(all(0 < len(shard) <= size for shard in split))
+                self.assertEqual(len(split), -(-len(product_ids) // size))
+
+    @override_settings(FORECAST_SHARD_SIZE=4)
+    def test_default_size_comes_from_the_settings(self):
+        self.assertEqual([len(shard) for shard in shards(range(10))], [4, 4, 2])
+        self.assertEqual(shards([]), [])
+
+
+class SmoothingForecasterTests(SimpleTestCase):
+    # Demand of 2 on the first day and 4 three days later; the second row has none
+    demand = DemandMatrix([1, 2], '2026-01-01', [[2, 0, 0, 4], [0, 0, 0, 0]])
+
+    def forecast(self, name):
+        ds, forecasts = get_forecaster(name).forecast(self.demand.take([1]), 3)
+        return ds[0], forecasts[0]
+
+    def test_croston_and_sba_rates(self):
+        # Size 2 -> 2.2 and interval 1 -> 1.2 once the second demand lands; the
+        # in-sample errors are against a prediction of 2 (1.9 for SBA) on days 2-4
+        for name, rate, error_std in (
+            ('croston', 2.2 / 1.2, 2.0),
+            ('sba', 2.2 / 1.2 * 0.95, ((1.9 ** 2 * 2 + 2.1 ** 2) / 3) ** 0.5),
+        ):
+            with self.subTest(name):
+                ds, forecasts = self.forecast(name)
+                self.assertEqual(ds.astype('datetime64[D]').astype(str).tolist(),
+                                 ['2026-01-05', '2026-01-06', '2026-01-07'])
+                for yhat, lower, upper in forecasts:
+                    self.assertAlmostEqual(yhat, rate)
+                    self.assertAlmostEqual(upper - yhat, BAND_Z * error_std)
+                    self.assertAlmostEqual(lower, max(rate - BAND_Z * error_std, 0))
+
+    def test_ses_rate(self):
+        _, forecasts = self.forecast('ses')
+
+        # 2 -> 1.8 -> 1.62 -> 1.858
+        self.assertAlmostEqual(forecasts[0][0], 1.858)
+
+    def test_rows_without_demand_have_no_rate(self):
+        rate, _ = get_forecaster('sba').smooth(self.demand.quantities, self.demand.active())
+
+        self.assertEqual(rate[1], 0)
+
+
+# Prophet, the default backend, is an optional dependency
+@override_settings(FORECAST_BACKEND='sba')
+class ForecastMarkTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        for days in (42, 41, 40):
+            post_transaction(self.merchant, 'take', [(self.phone, 30)], date=now - timedelta(days=days))
+        post_transaction(self.merchant, 'restore', [(self.phone, 5)], date=now - timedelta(days=40))
+        close_period(timezone.localdate() - timedelta(days=10))
+
+    def test_archived_history_is_still_forecast(self):
+        self.assertIn(self.phone.pk, demand_marks())
+
+        with warnings.catch_warnings():
+            # Naive datetimes written to a DateTimeField warn under USE_TZ
+            warnings.simplefilter('error', RuntimeWarning)
+            run = estimate_stock_out(workers=1)
+
+        self.phone.refresh_from_db()
+        self.assertEqual(run['refitted'], 1)
+        self.assertIsNotNone(self.phone.estimated_stock_out)
+        self.assertEqual(timezone.localtime(self.phone.estimated_stock_out).time(), time.min)
+
+    def test_unchanged_demand_is_not_refitted(self):
+        first = estimate_stock_out(workers=1)
+        second = estimate_stock_out(workers=1)
+
+        self.assertEqual(first['refitted'], 1)
+        self.assertEqual(second, {'refitted': 0, 'updated': first['updated']})
+
+        post_transaction(self.merchant, 'take', [(self.phone, 1)])
+        self.assertEqual(estimate_stock_out(workers=1)['refitted'], 1)
+
+    def test_net_restores_setting_moves_the_marks(self):
+        with override_settings(FORECAST_NET_RESTORES=False):
+            takes = demand_marks()
+        with override_settings(FORECAST_NET_RESTORES=True):
+            net = demand_marks()
+
+        self.assertNotEqual(takes[self.phone.pk], net[self.phone.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite only')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # A seeded history large enough for the planner to pick the plans it
+        # picks in production, next to a catalog without history as in a live database
+        cls.data = seed_dataset(transactions=8000)
+        seed_catalog(300)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_avoid_full_table_scans(self):
+        violations, checked = find_full_scans(self.data)
+
+        self.assertGreater(checked, 0)
+        self.assertEqual(
+            [f'{label}: full scan of {table} ({detail})' for label, table, detail, _ in violations], []
+        )
+
+    def test_index_walks_pass_only_under_a_limit(self):
+        sql = 'SELECT "id", "amount" FROM "base_transaction" ORDER BY "date" DESC'
+
+        self.assertEqual([table for table, _ in full_scans(sql)], ['base_transaction'])
+        self.assertEqual(list(full_scans(f'{sql} LIMIT 50')), [])
@@ -32,6 +32,11 @@ urlpatterns = [
     path('reports/', reports.reports_view, name='reports'),
     path('reports/merchant/<int:merchant_id>/', reports.merchant_report, name='merchant_report'),
     path('reports/product/<int:product_id>/', reports.product_report, name='product_report'),
+    path('reports/cube/', reports.category_cube, name='category_cube'),
+    path('reports/comparison/', reports.period_comparison_json, name='period_comparison'),
+    path('reports/series/', reports.time_series_json, name='time_series'),
+    path('reports/jobs/<int:job_id>/', reports.report_job, name='report_job'),
+    path('reports/jobs/<int:job_id>/status/', reports.report_job_status, name='report_job_status'),
 
     # Partners (generic routes)
     path('partners/<str:partner_type>/', partners.partners_view, name='partners'),
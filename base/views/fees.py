@@ -5,7 +5,7 @@ from decimal import Decimal
 from django.shortcuts import redirect
 from django.contrib import messages
 
-from base.models import Transaction
+from base.services import post_transaction
 from base.forms import FeesForm
 
 
@@ -22,11 +22,7 @@ def add_fees(request):
         amount = form.cleaned_data['amount']
         
         # Create the fees transaction
-        Transaction.objects.create(
-            user=None,  # Fees don't have a user
-            amount=amount,
-            type='fees'
-        )
+        post_transaction(None, 'fees', amount=amount)  # Fees don't have a user
         
         messages.success(request, f'تم إضافة منصرف بقيمة {amount} ج.س بنجاح')
     else:
@@ -7,6 +7,7 @@ from django.core.paginator import Paginator
 
 from base.models import Category, Product, User, Transaction
 from base.forms import CategoryForm, ProductForm, FeesForm
+from base.reporting import kpi_windows
 
 
 def dashboard(request):
@@ -19,6 +20,9 @@ def dashboard(request):
         'total_representatives': User.objects.filter(user_type='representative').count(),
     }
     
+    # Today, this week, this month and this year in two queries
+    context['kpis'] = kpi_windows()
+    
     # Get recent items
     context['recent_products'] = Product.objects.select_related('category').order_by('-created_at')[:5]
     context['recent_categories'] = Category.objects.order_by('-created_at')[:5]
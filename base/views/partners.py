@@ -3,15 +3,17 @@
 from decimal import Decimal
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q
+from django.db.models import Q, Sum
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
 from django.db import transaction as db_transaction
 from django.core.paginator import Paginator
 
+from base.archive import with_carry_forward
 from base.models import User, Product, Transaction, TransactionItem
 from base.forms import UserForm
+from base.services import post_transaction, PostingError
 
 ITEMS_PER_PAGE = 10
 
@@ -154,7 +156,21 @@ def partner_detail(request, partner_id):
     partner = get_object_or_404(User, id=partner_id)
     products = Product.objects.all()
     transactions = Transaction.objects.filter(user=partner).prefetch_related('items__product')
-    partner_products = TransactionItem.objects.filter(transaction__user=partner)
+
+    # Totals include the periods moved to the archive by close_period
+    archived_count = partner.carry_forward.aggregate(count=Sum('count'))['count'] or 0
+    partner_products = with_carry_forward(
+        TransactionItem.objects.filter(transaction__user=partner).values('product__name').annotate(
+            taken=Sum('quantity', filter=Q(transaction__type='take')),
+            restored=Sum('quantity', filter=Q(transaction__type='restore')),
+        ).order_by(),
+        partner.product_carry_forward.values('product__name').annotate(
+            taken=Sum('quantity', filter=Q(type='take')),
+            restored=Sum('quantity', filter=Q(type='restore')),
+        ).order_by(),
+        'product__name',
+        ('taken', 'restored'),
+    )
     
     # Prepare products list for dropdowns
     products_list = list(products.values('id', 'name', 'stock'))
@@ -166,6 +182,8 @@ def partner_detail(request, partner_id):
     return render(request, 'partners/partner-detail.html', {
         'partner': partner,
         'partner_transactions': transactions.order_by('-date'),
+        'transactions_count': transactions.count() + archived_count,
+        'archived_count': archived_count,
         'partner_products': partner_products,
         'products': products,
         'products_list': products_list,
@@ -182,7 +200,7 @@ def _handle_partner_transaction(request, partner, partner_id):
     if transaction_type == 'payment' and partner.user_type == 'merchant':
         amount = request.POST.get('amount')
         if amount and amount != "":
-            Transaction.objects.create(user=partner, type='payment', amount=Decimal(amount))
+            post_transaction(partner, 'payment', amount=Decimal(amount))
             messages.success(request, 'تم سداد المبلغ بنجاح')
         else:
             messages.error(request, 'يجب إدخال المبلغ')
@@ -198,26 +216,18 @@ def _handle_partner_transaction(request, partner, partner_id):
             messages.error(request, 'يجب اختيار منتج')
             return redirect('base:partner_detail', partner_id)
         
-        transaction = Transaction.objects.create(user=partner, type=transaction_type)
+        lines = [
+            (product_id, quantities[i])
+            for i, product_id in enumerate(product_ids)
+            if product_id != "skip" and quantities[i]
+        ]
         
-        for i, product_id in enumerate(product_ids):
-            if product_id == "skip" or not quantities[i]:
-                continue
-                
-            product = Product.objects.get(id=product_id)
-            quantity = Decimal(quantities[i])
-            
-            # Check stock for 'take'
-            if transaction_type == 'take' and product.stock < quantity:
-                messages.error(request, f'الكمية المطلوبة من {product.name} غير متوفرة')
-                transaction.delete()
-                return redirect('base:partner_detail', partner_id)
-            
-            TransactionItem.objects.create(
-                transaction=transaction,
-                product=product,
-                quantity=quantity,
-            )
+        # Validation, stock checks and stock/debt updates happen in one posting
+        try:
+            post_transaction(partner, transaction_type, lines)
+        except PostingError as e:
+            messages.error(request, str(e))
+            return redirect('base:partner_detail', partner_id)
         
         messages.success(request, 'تم إضافة المعاملة بنجاح')
         return redirect('base:partner_detail', partner_id)
@@ -1,43 +1,89 @@
 """Report generation views."""
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 
-from django.shortcuts import render, get_object_or_404
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncDate
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import redirect, render, get_object_or_404
+from django.db.models import Sum, F
 from django.utils import timezone
+from kombu.exceptions import OperationalError
 
-from base.models import Transaction, TransactionItem, Product, User, Category
-from base.constants import FirstDayOfMonth
+from base.models import DataVersion, ReportJob, Transaction, TransactionItem, Product, User
+from base.analytics import MAX_POINTS, RESOLUTIONS, period_comparison, time_series
+from base.archive import with_carry_forward
+from base.debt import debt_statement, decode_cursor, encode_cursor, statement_page
+from base.fiscal import period_for
+from base.reporting import (
+    cached_report, cube_drilldown, report_summary, report_version, partner_rankings, product_rankings,
+)
+from base.stock import LEDGER_START
+from base.tasks import generate_report_task
 
+# Lines per page of the product history
+HISTORY_PAGE_SIZE = 20
 
-def reports_view(request):
-    """Display comprehensive reports with date filtering."""
-    # Parse date range
+# ReportJob statuses in the Celery state names the progress polling expects
+JOB_STATES = {
+    'pending': 'PENDING',
+    'running': 'PROGRESS',
+    'done': 'SUCCESS',
+    'failed': 'FAILURE',
+}
+
+
+def _report_window(request, period=None):
+    """
+    Parse the start_date/end_date filter, defaulting to the current fiscal period.
+
+    period is the fiscal period containing today when the caller already
+    looked it up; otherwise it is only read when no start_date is given.
+    """
     end_date = timezone.now()
-    start_date = end_date.replace(day=FirstDayOfMonth.get())
     
     if request.GET.get('start_date'):
         start_date = datetime.strptime(request.GET.get('start_date'), '%Y-%m-%d')
         start_date = timezone.make_aware(start_date)
+    else:
+        period = period or period_for(timezone.localdate(end_date))
+        start_date = timezone.make_aware(datetime.combine(period.start, datetime.min.time()))
     if request.GET.get('end_date'):
         end_date = datetime.strptime(request.GET.get('end_date'), '%Y-%m-%d')
         end_date = timezone.make_aware(end_date)
     
-    # Date filter for transactions
-    date_filter = {'date__gte': start_date, 'date__lte': end_date}
+    return start_date, end_date
+
+
+def reports_view(request):
+    """Display comprehensive reports with date filtering."""
+    # Parse date range; the current fiscal period also anchors the KPI strip
+    period = period_for(timezone.localdate())
+    start_date, end_date = _report_window(request, period)
+    
+    # Rollup rows are keyed by local day, so filter whole days
+    start_day = timezone.localdate(start_date)
+    end_day = timezone.localdate(end_date)
+    
+    # Every cached section is keyed on the same counters, read once
+    versions = DataVersion.current()
+    
+    # Totals, counts and trends per type, per fiscal period and for the KPI strip in one pass
+    page = report_summary(start_day, end_day, period, versions)
+    summary = page['summary']
     
-    # Calculate totals
-    def get_transaction_total(trans_type):
-        return Transaction.objects.filter(
-            type=trans_type, **date_filter
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    # Long windows are computed by a background job instead of inside the request
+    if sum(summary['counts'].values()) > settings.REPORT_ASYNC_THRESHOLD:
+        job = start_report_job(start_day, end_day, versions)
+        if job is not None:
+            return redirect('base:report_job', job_id=job.pk)
     
-    total_sales = get_transaction_total('take')
-    total_payments = get_transaction_total('payment')
-    total_fees = get_transaction_total('fees')
-    total_restores = get_transaction_total('restore')
+    totals = summary['totals']
+    
+    total_sales = totals['take']
+    total_payments = totals['payment']
+    total_fees = totals['fees']
+    total_restores = totals['restore']
     
     # Net profit calculation (payments - fees)
     net_profit = total_payments - total_fees
@@ -48,73 +94,22 @@ def reports_view(request):
     ).aggregate(total=Sum('debt'))['total'] or Decimal('0.00')
     
     # Transaction counts
-    transaction_counts = {
-        trans_type: Transaction.objects.filter(type=trans_type, **date_filter).count()
-        for trans_type in ['take', 'payment', 'restore', 'fees']
-    }
+    transaction_counts = summary['counts']
     
-    # Top merchants by sales
-    top_merchants = User.objects.filter(
-        user_type='merchant',
-        transactions__type='take',
-        transactions__date__gte=start_date,
-        transactions__date__lte=end_date
-    ).annotate(
-        total_sales=Sum('transactions__amount')
-    ).order_by('-total_sales')[:5]
-    
-    # Top products by quantity sold
-    top_products = Product.objects.filter(
-        transaction_items__transaction__type='take',
-        transaction_items__transaction__date__gte=start_date,
-        transaction_items__transaction__date__lte=end_date
-    ).annotate(
-        total_quantity=Sum('transaction_items__quantity'),
-        total_revenue=Sum('transaction_items__total')
-    ).order_by('-total_quantity')[:10]
+    # Top merchants by sales and representative performance
+    top_merchants, top_representatives = partner_rankings(start_day, end_day, versions=versions)
+    
+    # Top products by quantity sold and category performance
+    top_products, category_performance = product_rankings(start_day, end_day, versions=versions)
     
     # Daily transaction trends
-    daily_trends = Transaction.objects.filter(
-        **date_filter
-    ).annotate(
-        day=TruncDate('date')
-    ).values('day', 'type').annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('day')
-    
-    # Category performance
-    category_performance = Category.objects.annotate(
-        total_sales=Sum(
-            'product__transaction_items__total',
-            filter=Q(
-                product__transaction_items__transaction__type='take',
-                product__transaction_items__transaction__date__gte=start_date,
-                product__transaction_items__transaction__date__lte=end_date
-            )
-        ),
-        total_quantity=Sum(
-            'product__transaction_items__quantity',
-            filter=Q(
-                product__transaction_items__transaction__type='take',
-                product__transaction_items__transaction__date__gte=start_date,
-                product__transaction_items__transaction__date__lte=end_date
-            )
-        )
-    ).filter(total_sales__isnull=False).order_by('-total_sales')
+    daily_trends = summary['daily_trends']
+    
+    # Sales against the previous period and the same period last year
+    comparison = period_comparison(start_day, end_day, versions)
     
     # Low stock products
-    low_stock_products = Product.objects.filter(stock__lte=10).order_by('stock')[:10]
-    
-    # Representative performance
-    top_representatives = User.objects.filter(
-        user_type='representative',
-        transactions__type='take',
-        transactions__date__gte=start_date,
-        transactions__date__lte=end_date
-    ).annotate(
-        total_products=Sum('transactions__items__quantity')
-    ).order_by('-total_products')[:5]
+    low_stock_products = Product.objects.filter(stock__lte=10).select_related('category').order_by('stock')[:10]
     
     return render(request, 'reports.html', {
         'start_date': start_date,
@@ -132,36 +127,237 @@ def reports_view(request):
         'category_performance': category_performance,
         'low_stock_products': low_stock_products,
         'top_representatives': top_representatives,
+        'period_summary': page['periods'],
+        'comparison': comparison,
+        'kpis': page['kpis'],
+    })
+
+
+def period_comparison_json(request):
+    """
+    JSON period-over-period comparison for every product, category and merchant.
+    
+    Query parameters: start_date/end_date as on the reports page, and an
+    optional entity=products|categories|merchants to return only one list.
+    """
+    start_date, end_date = _report_window(request)
+    comparison = period_comparison(timezone.localdate(start_date), timezone.localdate(end_date))
+    
+    entity = request.GET.get('entity')
+    if entity:
+        if entity not in ('products', 'categories', 'merchants'):
+            return JsonResponse({'success': False, 'error': 'نوع غير صالح'}, status=400)
+        comparison = {'windows': comparison['windows'], entity: comparison[entity]}
+    
+    return JsonResponse({'success': True, **comparison})
+
+
+def time_series_json(request):
+    """
+    JSON chart series per transaction type, gap-filled and downsampled server-side.
+    
+    Query parameters: start_date/end_date as on the reports page,
+    resolution=day|week|month and points, the maximum number of buckets.
+    """
+    start_date, end_date = _report_window(request)
+    if start_date > end_date:
+        return JsonResponse({'success': False, 'error': 'تاريخ البداية بعد تاريخ النهاية'}, status=400)
+    
+    resolution = request.GET.get('resolution', 'day')
+    if resolution not in RESOLUTIONS:
+        return JsonResponse({'success': False, 'error': 'دقة غير صالحة'}, status=400)
+    try:
+        points = int(request.GET.get('points', MAX_POINTS))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'عدد نقاط غير صالح'}, status=400)
+    if not 1 <= points <= 1000:
+        return JsonResponse({'success': False, 'error': 'عدد النقاط يجب أن يكون بين 1 و 1000'}, status=400)
+    
+    series = time_series(timezone.localdate(start_date), timezone.localdate(end_date), resolution, points)
+    return JsonResponse({'success': True, **series})
+
+
+def category_cube(request):
+    """
+    JSON drill-down over the category cube: categories, a category's products, a product's days.
+    
+    Query parameters: start_date/end_date as on the reports page, then
+    category=<id> for its products or product=<id> for its days.
+    """
+    start_date, end_date = _report_window(request)
+    
+    try:
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+        product_id = int(request.GET['product']) if request.GET.get('product') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'معرف غير صالح'}, status=400)
+    
+    result = cube_drilldown(
+        timezone.localdate(start_date), timezone.localdate(end_date),
+        category_id=category_id, product_id=product_id,
+    )
+    return JsonResponse({'success': True, **result})
+
+
+def start_report_job(start_day, end_day, versions=None):
+    """
+    Queue a background report for the window, reusing a job for the same data.
+
+    A job requested earlier for the same window is reused as long as the
+    DataVersion counter it was computed against has not moved.
+
+    Args:
+        start_day: First local day of the window
+        end_day: Last local day of the window
+        versions: DataVersion.current() already read for this request, or None
+
+    Returns:
+        The ReportJob, or None if the task queue is unreachable
+    """
+    version = report_version(end_day, versions)
+    job = ReportJob.objects.filter(
+        start_day=start_day, end_day=end_day, version=version
+    ).exclude(status='failed').order_by('-created_at').first()
+    if job is not None:
+        return job
+    
+    job = ReportJob.objects.create(start_day=start_day, end_day=end_day, version=version)
+    try:
+        task = generate_report_task.delay(job.pk)
+    except OperationalError:
+        job.delete()
+        return None
+    ReportJob.objects.filter(pk=job.pk).update(task_id=task.id)
+    return job
+
+
+def report_job(request, job_id):
+    """Show a background report, its progress while running, or download it as JSON."""
+    job = get_object_or_404(ReportJob, id=job_id)
+    
+    if job.status != 'done':
+        return render(request, 'reports.html', {
+            'job': job,
+            'start_date': job.start_day,
+            'end_date': job.end_day,
+        })
+    
+    if request.GET.get('download'):
+        response = JsonResponse(job.result, json_dumps_params={'ensure_ascii': False})
+        response['Content-Disposition'] = f'attachment; filename="report-{job.start_day}-{job.end_day}.json"'
+        return response
+    
+    return render(request, 'reports.html', {
+        **job.result,
+        'job': job,
+        'start_date': job.start_day,
+        'end_date': job.end_day,
     })
 
 
+def report_job_status(request, job_id):
+    """Get the status of a background report job."""
+    job = get_object_or_404(ReportJob, id=job_id)
+    
+    response = {'state': JOB_STATES[job.status], 'progress': job.progress}
+    if job.status == 'failed':
+        response['error'] = job.error
+    
+    return JsonResponse(response)
+
+
 def merchant_report(request, merchant_id):
-    """Detailed report for a specific merchant."""
+    """Detailed report for a specific merchant, or a debt statement for a date range."""
     merchant = get_object_or_404(User, id=merchant_id, user_type='merchant')
     
-    # Get all transactions for this merchant
-    transactions = Transaction.objects.filter(user=merchant).order_by('-date')
+    # Statement mode narrows the report to a period; without dates it covers all history
+    statement_mode = bool(request.GET.get('start_date') or request.GET.get('end_date'))
+    start_date = LEDGER_START
+    end_date = timezone.now()
+    if request.GET.get('start_date'):
+        start_date = timezone.make_aware(datetime.strptime(request.GET.get('start_date'), '%Y-%m-%d'))
+    if request.GET.get('end_date'):
+        # The end date is inclusive of the whole day
+        end_date = timezone.make_aware(
+            datetime.strptime(request.GET.get('end_date'), '%Y-%m-%d') + timedelta(days=1)
+        ) - timedelta(microseconds=1)
     
-    # Calculate totals
-    total_taken = transactions.filter(type='take').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    total_paid = transactions.filter(type='payment').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    # Ledger lines, one keyset page at a time
+    entries, next_cursor = statement_page(merchant, start_date, end_date, request.GET.get('cursor'))
     
-    # Products taken by merchant
-    products_taken = TransactionItem.objects.filter(
-        transaction__user=merchant,
-        transaction__type='take'
-    ).values('product__name').annotate(
-        total_quantity=Sum('quantity'),
-        total_amount=Sum('total')
-    ).order_by('-total_quantity')
+    # Handle AJAX requests for infinite scroll
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return get_statement_json(entries, next_cursor)
     
-    return render(request, 'merchant_report.html', {
+    context = {
         'merchant': merchant,
-        'transactions': transactions,
-        'total_taken': total_taken,
-        'total_paid': total_paid,
+        'entries': entries,
+        'next_cursor': next_cursor,
         'current_debt': merchant.debt,
-        'products_taken': products_taken,
+        'statement_mode': statement_mode,
+        'start_date': start_date if statement_mode and request.GET.get('start_date') else None,
+        'end_date': end_date if statement_mode and request.GET.get('end_date') else None,
+    }
+    
+    if statement_mode:
+        # Opening and closing balances are index seeks, the totals one range read
+        context['statement'] = debt_statement(merchant, start_date, end_date)
+        return render(request, 'merchant_report.html', context)
+    
+    def compute():
+        transactions = Transaction.objects.filter(user=merchant)
+        
+        # Calculate totals, including periods moved to the archive
+        carried = dict(merchant.carry_forward.values_list('type', 'amount'))
+        total_taken = transactions.filter(type='take').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        total_paid = transactions.filter(type='payment').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        
+        # Products taken by merchant
+        products_taken = with_carry_forward(
+            TransactionItem.objects.filter(
+                transaction__user=merchant,
+                transaction__type='take'
+            ).values('product__name').annotate(
+                total_quantity=Sum('quantity'),
+                total_amount=Sum('total')
+            ).order_by(),
+            merchant.product_carry_forward.filter(type='take').values('product__name').annotate(
+                total_quantity=Sum('quantity'),
+                total_amount=Sum('total')
+            ).order_by(),
+            'product__name',
+            ('total_quantity', 'total_amount'),
+        )
+        return {
+            'total_taken': total_taken + carried.get('take', 0),
+            'total_paid': total_paid + carried.get('payment', 0),
+            'products_taken': products_taken,
+        }
+    
+    context.update(cached_report('merchant', merchant.pk, None, None, compute))
+    return render(request, 'merchant_report.html', context)
+
+
+def get_statement_json(entries, next_cursor):
+    """Return a page of merchant ledger lines as JSON for infinite scroll."""
+    data = []
+    for entry in entries:
+        date = timezone.localtime(entry.date)
+        data.append({
+            'id': entry.id,
+            'date': date.strftime('%Y/%m/%d'),
+            'time': date.strftime('%I:%M %p'),
+            'reason': entry.reason,
+            'reason_display': entry.get_reason_display(),
+            'amount': str(entry.amount),
+            'balance': str(entry.balance),
+        })
+    
+    return JsonResponse({
+        'success': True,
+        'data': data,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor,
     })
 
 
@@ -169,37 +365,129 @@ def product_report(request, product_id):
     """Detailed report for a specific product."""
     product = get_object_or_404(Product, id=product_id)
     
-    # Transaction history for this product
-    transaction_items = TransactionItem.objects.filter(
-        product=product
-    ).select_related('transaction', 'transaction__user').order_by('-transaction__date')
+    # Transaction history, one keyset page at a time
+    history, next_cursor = product_history_page(product, request.GET.get('cursor'))
     
-    # Calculate totals
-    total_taken = transaction_items.filter(
-        transaction__type='take'
-    ).aggregate(total=Sum('quantity'))['total'] or 0
+    # Handle AJAX requests for infinite scroll
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return get_product_history_json(history, next_cursor)
     
-    total_restored = transaction_items.filter(
-        transaction__type='restore'
-    ).aggregate(total=Sum('quantity'))['total'] or 0
+    def compute():
+        # Per-customer, per-type sums in one pass; the totals and the top
+        # customers are both folded from these rows
+        rows = TransactionItem.objects.filter(
+            product=product, transaction__type__in=['take', 'restore']
+        ).values(customer=F('transaction__user'), type=F('transaction__type')).annotate(
+            quantity=Sum('quantity'), total=Sum('total')
+        ).order_by()
+        
+        # Periods moved to the archive are carried forward per customer and type
+        carried = product.carry_forward.values('type', customer=F('user')).annotate(
+            quantity=Sum('quantity'), total=Sum('total')
+        ).order_by()
+        
+        total_taken = 0
+        total_restored = 0
+        total_revenue = Decimal('0.00')
+        customer_quantities = {}
+        for row in list(rows) + list(carried):
+            if row['type'] == 'take':
+                total_taken += row['quantity'] or 0
+                total_revenue += row['total'] or Decimal('0.00')
+                if row['customer'] is not None:
+                    customer_quantities[row['customer']] = (
+                        customer_quantities.get(row['customer'], 0) + (row['quantity'] or 0)
+                    )
+            else:
+                total_restored += row['quantity'] or 0
+        
+        customer_totals = [
+            {'customer': customer, 'total_quantity': quantity}
+            for customer, quantity in sorted(
+                customer_quantities.items(), key=lambda item: item[1], reverse=True
+            )[:5]
+        ]
+        return {
+            'total_taken': total_taken,
+            'total_restored': total_restored,
+            'total_revenue': total_revenue,
+            'customer_totals': customer_totals,
+        }
     
-    total_revenue = transaction_items.filter(
-        transaction__type='take'
-    ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+    totals = cached_report('product', product.pk, None, None, compute)
     
-    # Top customers for this product
-    top_customers = User.objects.filter(
-        transactions__items__product=product,
-        transactions__type='take'
-    ).annotate(
-        total_quantity=Sum('transactions__items__quantity')
-    ).order_by('-total_quantity')[:5]
+    # Customers are loaded fresh so names and types are current
+    customers = User.objects.in_bulk([row['customer'] for row in totals['customer_totals']])
+    top_customers = []
+    for row in totals['customer_totals']:
+        customer = customers.get(row['customer'])
+        if customer is not None:
+            customer.total_quantity = row['total_quantity']
+            top_customers.append(customer)
     
     return render(request, 'product_report.html', {
         'product': product,
-        'transaction_items': transaction_items,
-        'total_taken': total_taken,
-        'total_restored': total_restored,
-        'total_revenue': total_revenue,
+        'transaction_items': history,
+        'next_cursor': next_cursor,
+        'total_taken': totals['total_taken'],
+        'total_restored': totals['total_restored'],
+        'total_revenue': totals['total_revenue'],
         'top_customers': top_customers,
     })
+
+
+def product_history_page(product, cursor=None):
+    """
+    Get one page of a product's transaction lines, newest first.
+    
+    Pages are keyed on the line's (date, id) rather than an offset, so every
+    page is a short range read of the (product, date, id) index no matter
+    how deep the history goes. The date is the transaction's, copied onto
+    each line when it is posted.
+    
+    Args:
+        product: Product whose history is listed
+        cursor: Opaque cursor from the previous page, or None for the first page
+    
+    Returns:
+        Tuple (items, next_cursor); next_cursor is None on the last page
+    """
+    items = TransactionItem.objects.filter(product=product)
+    
+    position = decode_cursor(cursor)
+    if position is not None:
+        date, item_id = position
+        items = items.filter(date__lte=date).exclude(date=date, id__gte=item_id)
+    
+    items = list(items.select_related('transaction', 'transaction__user').order_by(
+        '-date', '-id'
+    )[:HISTORY_PAGE_SIZE + 1])
+    
+    if len(items) <= HISTORY_PAGE_SIZE:
+        return items, None
+    items = items[:HISTORY_PAGE_SIZE]
+    return items, encode_cursor(items[-1])
+
+
+def get_product_history_json(items, next_cursor):
+    """Return a page of product history as JSON for infinite scroll."""
+    data = []
+    for item in items:
+        user = item.transaction.user
+        date = timezone.localtime(item.transaction.date)
+        data.append({
+            'id': item.id,
+            'date': date.strftime('%Y/%m/%d'),
+            'time': date.strftime('%I:%M %p'),
+            'customer_name': (user.get_full_name() or user.username) if user else None,
+            'type': item.transaction.type,
+            'quantity': item.quantity,
+            'total': str(item.total),
+        })
+    
+    return JsonResponse({
+        'success': True,
+        'data': data,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor,
+    })
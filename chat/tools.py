@@ -3,11 +3,16 @@
 import json
 from datetime import datetime, timedelta
 from decimal import Decimal
-from django.db.models import Sum, Count, Avg, F, Q
-from django.db.models.functions import TruncDate, TruncMonth
+from django.db.models import Sum, Count, Avg, F, Q, Prefetch, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
 from django.utils import timezone
 
-from base.models import Category, Product, User, Transaction, TransactionItem, TRANSACTION_TYPES
+from base.archive import with_carry_forward
+from base.reporting import kpi_windows
+from base.models import (
+    Category, Product, User, Transaction, TransactionItem, TRANSACTION_TYPES,
+    ProductCarryForward, UserCarryForward,
+)
 
 
 # ==================== Basic Data Getters ====================
@@ -112,7 +117,9 @@ def get_representatives():
 
 def get_transactions():
     """الحصول على المعاملات الأخيرة (آخر 100 معاملة)."""
-    transactions = Transaction.objects.select_related('user').prefetch_related('items__product').order_by('-date')[:100]
+    transactions = Transaction.objects.select_related('user').prefetch_related(
+        Prefetch('items', queryset=TransactionItem.objects.select_related('product'))
+    ).order_by('-date')[:100]
     return json.dumps([{
         'id': t.id, 
         'type': t.type,
@@ -166,8 +173,8 @@ def get_inventory_stats():
     merchants_with_debt = merchants.filter(debt__gt=0).count()
     
     today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
+    # Today, this week, this month and this year from one rollup scan
+    kpis = kpi_windows()
     
     stats = {
         # المنتجات
@@ -186,15 +193,31 @@ def get_inventory_stats():
         
         # المعاملات
         'total_transactions': Transaction.objects.count(),
-        'transactions_today': Transaction.objects.filter(date__date=today).count(),
-        'transactions_this_week': Transaction.objects.filter(date__date__gte=week_ago).count(),
-        'transactions_this_month': Transaction.objects.filter(date__date__gte=month_ago).count(),
+        'transactions_today': kpis['today']['count'],
+        'transactions_this_week': kpis['week']['count'],
+        'transactions_this_month': kpis['month']['count'],
+        'transactions_this_year': kpis['year']['count'],
         
         # أنواع المعاملات
         'take_transactions_count': Transaction.objects.filter(type='take').count(),
         'payment_transactions_count': Transaction.objects.filter(type='payment').count(),
         'restore_transactions_count': Transaction.objects.filter(type='restore').count(),
         'fees_transactions_count': Transaction.objects.filter(type='fees').count(),
+        
+        # المؤشرات حسب الفترة
+        'windows': {
+            window: {
+                'label': kpi['label'],
+                'start': kpi['start'].strftime('%Y-%m-%d'),
+                'transactions': kpi['count'],
+                'sales': str(kpi['take']['total']),
+                'payments': str(kpi['payment']['total']),
+                'fees': str(kpi['fees']['total']),
+                'restores': str(kpi['restore']['total']),
+                'net': str(kpi['net']),
+            }
+            for window, kpi in kpis.items()
+        },
     }
     return json.dumps(stats, ensure_ascii=False)
 
@@ -227,20 +250,30 @@ def get_daily_transactions_summary():
 
 def get_top_products_by_sales():
     """الحصول على أكثر المنتجات مبيعاً (سحباً من المخزون)."""
-    top_products = TransactionItem.objects.filter(
-        transaction__type='take'
-    ).values(
-        'product__id', 'product__name', 'product__category__name'
-    ).annotate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum('total'),
-        transactions_count=Count('transaction', distinct=True)
-    ).order_by('-total_quantity')[:20]
+    fields = ('total_quantity', 'total_revenue', 'transactions_count')
+    top_products = with_carry_forward(
+        TransactionItem.objects.filter(
+            transaction__type='take', product__isnull=False
+        ).values('product_id').annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('total'),
+            transactions_count=Count('transaction', distinct=True)
+        ).order_by(),
+        # Archived periods are added from the carry-forward rows
+        ProductCarryForward.objects.filter(type='take').values('product_id').annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('total'),
+            transactions_count=Sum('count')
+        ).order_by(),
+        'product_id',
+        fields,
+    )[:20]
+    products = Product.objects.select_related('category').in_bulk([p['product_id'] for p in top_products])
     
     return json.dumps([{
-        'product_id': p['product__id'],
-        'product_name': p['product__name'],
-        'category': p['product__category__name'],
+        'product_id': p['product_id'],
+        'product_name': products[p['product_id']].name,
+        'category': products[p['product_id']].category.name,
         'total_quantity_sold': p['total_quantity'],
         'total_revenue': str(p['total_revenue']) if p['total_revenue'] else '0',
         'transactions_count': p['transactions_count']
@@ -266,11 +299,17 @@ def get_top_merchants_by_debt():
 
 def get_top_merchants_by_transactions():
     """الحصول على التجار الأكثر نشاطاً في المعاملات."""
+    # Archived periods are added from the carry-forward rows
+    carried = UserCarryForward.objects.filter(user=OuterRef('pk')).values('user')
     merchants = User.objects.filter(
         user_type='merchant'
     ).annotate(
-        transactions_count=Count('transactions'),
-        total_amount=Sum('transactions__amount')
+        transactions_count=Count('transactions') + Coalesce(
+            Subquery(carried.annotate(total=Sum('count')).values('total')), 0
+        ),
+        total_amount=Coalesce(Sum('transactions__amount'), Decimal('0')) + Coalesce(
+            Subquery(carried.annotate(total=Sum('amount')).values('total')), Decimal('0')
+        ),
     ).order_by('-transactions_count')[:20]
     
     return json.dumps([{
@@ -394,7 +433,9 @@ def get_user_transactions(user_id: int = None):
     except User.DoesNotExist:
         return json.dumps({'error': f'لم يتم العثور على مستخدم بالمعرف {user_id}'}, ensure_ascii=False)
     
-    transactions = Transaction.objects.filter(user=user).prefetch_related('items__product').order_by('-date')[:50]
+    transactions = Transaction.objects.filter(user=user).prefetch_related(
+        Prefetch('items', queryset=TransactionItem.objects.select_related('product'))
+    ).order_by('-date')[:50]
     
     return json.dumps({
         'user_id': user.id,
@@ -444,31 +485,19 @@ def get_product_transactions(product_id: int = None):
 
 def get_today_summary():
     """الحصول على ملخص اليوم (المعاملات والإحصائيات)."""
-    today = timezone.now().date()
-    
-    today_transactions = Transaction.objects.filter(date__date=today)
+    today = timezone.localdate()
+    kpi = kpi_windows(today)['today']
     
     summary = {
         'date': today.strftime('%Y-%m-%d'),
         'date_arabic': today.strftime('%d/%m/%Y'),
-        'total_transactions': today_transactions.count(),
-        'take_transactions': {
-            'count': today_transactions.filter(type='take').count(),
-            'total_amount': str(today_transactions.filter(type='take').aggregate(total=Sum('amount'))['total'] or 0)
-        },
-        'payment_transactions': {
-            'count': today_transactions.filter(type='payment').count(),
-            'total_amount': str(today_transactions.filter(type='payment').aggregate(total=Sum('amount'))['total'] or 0)
-        },
-        'restore_transactions': {
-            'count': today_transactions.filter(type='restore').count(),
-            'total_amount': str(today_transactions.filter(type='restore').aggregate(total=Sum('amount'))['total'] or 0)
-        },
-        'fees_transactions': {
-            'count': today_transactions.filter(type='fees').count(),
-            'total_amount': str(today_transactions.filter(type='fees').aggregate(total=Sum('amount'))['total'] or 0)
-        }
+        'total_transactions': kpi['count'],
     }
+    for code in ('take', 'payment', 'restore', 'fees'):
+        summary[f'{code}_transactions'] = {
+            'count': kpi[code]['count'],
+            'total_amount': str(kpi[code]['total']),
+        }
     
     return json.dumps(summary, ensure_ascii=False)
 
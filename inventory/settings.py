@@ -83,10 +83,44 @@ WSGI_APPLICATION = 'inventory.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Production profile, opt-in for the server process: WAL journaling lets
+# readers run alongside a writer, and persistent connections keep the PRAGMAs
+# and page cache between requests.
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', 'False').lower() in ('true', '1', 't')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)) if SQLITE_PRODUCTION else 0,
+        'CONN_HEALTH_CHECKS': SQLITE_PRODUCTION,
+        # A file, not the shared in-memory database, so tests can post from several threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Applied to every new SQLite connection by base.db.configure_sqlite
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,  # ms to wait for a lock before "database is locked"
+    'mmap_size': 268435456,  # 256 MB
+    'cache_size': -65536,  # 64 MB (negative values are KiB)
+    'temp_store': 'memory',
+} if SQLITE_PRODUCTION else {}
+
+# Report cache. Entries are keyed by base.models.DataVersion, so writes
+# invalidate them; set CACHE_URL (e.g. redis://localhost:6379/1) to share
+# the cache between worker processes.
+CACHE_URL = os.environ.get('CACHE_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports',
     }
 }
 
@@ -142,5 +176,19 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0' # Where to store results
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Reports over windows with more transactions than this are computed by
+# base.tasks.generate_report_task instead of inside the request
+REPORT_ASYNC_THRESHOLD = int(os.environ.get('REPORT_ASYNC_THRESHOLD', 200000))
+
+# Stock-out forecasts are fitted in shards of this many products, one Celery
+# subtask per shard, or on this many local processes outside Celery
+FORECAST_SHARD_SIZE = int(os.environ.get('FORECAST_SHARD_SIZE', 25))
+FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', os.cpu_count() or 1))
+# Demand forecasting backend: 'prophet' (one model per product, needs prophet)
+# or 'sba', 'croston' or 'ses' (NumPy, all products of a shard in one batch)
+FORECAST_BACKEND = os.environ.get('FORECAST_BACKEND', 'prophet')
+# Subtract restored quantities from a day's demand; otherwise only takes count
+FORECAST_NET_RESTORES = os.environ.get('FORECAST_NET_RESTORES', 'True').lower() in ('true', '1', 't')
+
 
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
\ No newline at end of file